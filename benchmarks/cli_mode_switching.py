@@ -0,0 +1,111 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Benchmark for the command mode transitions of the pooled CLI sessions
+
+Checks out the same pooled session many times with CLI and ModeCachingCLI and counts
+round trips to the device (commands sent by the session, including prompt probes).
+
+Usage: python benchmarks/cli_mode_switching.py [checkouts_count] [round_trip_latency]
+"""
+
+import logging
+import re
+import sys
+import time
+
+from cloudshell.cli.cli import CLI
+from cloudshell.cli.command_mode import CommandMode
+from cloudshell.cli.session_manager_impl import SessionManagerImpl
+from cloudshell.cli.session_pool_manager import SessionPoolManager
+
+from cloudshell.devices.cli_mode_cache import ModeCachingCLI
+
+
+class SimulatedSession(object):
+    """Session to the switch which counts round trips"""
+
+    session_type = "SIMULATED"
+    PROMPTS = {"default": "Switch>", "enable": "Switch#", "config": "Switch(config)#"}
+    TRANSITIONS = {("default", "enable"): "enable",
+                   ("enable", "configure terminal"): "config",
+                   ("enable", "disable"): "default",
+                   ("config", "end"): "enable"}
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.mode = "default"
+        self.round_trips = 0
+        self.new_session = True
+
+    def connect(self, prompt, logger):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def active(self):
+        return True
+
+    def reconnect(self, prompt, logger, timeout=None):
+        self.mode = "default"
+
+    def hardware_expect(self, command, expected_string, logger, action_map=None, error_map=None, **kwargs):
+        self.round_trips += 1
+        time.sleep(self.latency)
+        self.mode = self.TRANSITIONS.get((self.mode, command), self.mode)
+        return self.PROMPTS[self.mode]
+
+    def probe_for_prompt(self, expected_string, logger):
+        return self.hardware_expect("", expected_string, logger)
+
+    def match_prompt(self, prompt, match_string, logger):
+        return bool(re.search(prompt, match_string, re.DOTALL))
+
+
+def create_command_modes():
+    default_mode = CommandMode(r"Switch>\s*$")
+    enable_mode = CommandMode(r"Switch#\s*$", enter_command="enable", exit_command="disable",
+                              parent_mode=default_mode)
+    config_mode = CommandMode(r"Switch\(config\)#\s*$", enter_command="configure terminal", exit_command="end",
+                              parent_mode=enable_mode)
+    return enable_mode, config_mode
+
+
+def run(cli_class, checkouts_count, latency, logger):
+    """Run alternating config and enable mode checkouts, one command in each
+
+    :return: round trips count and seconds spent
+    """
+    enable_mode, config_mode = create_command_modes()
+    session = SimulatedSession(latency)
+    cli = cli_class(session_pool=SessionPoolManager(session_manager=SessionManagerImpl()))
+    start_time = time.time()
+
+    for checkout in xrange(checkouts_count):
+        # most of the driver commands run several checkouts in the same mode in a row
+        command_mode = config_mode if checkout % 4 else enable_mode
+        with cli.get_session(session, command_mode, logger) as cli_service:
+            cli_service.send_command("show running-config")
+
+    return session.round_trips, time.time() - start_time
+
+
+def main(checkouts_count, latency):
+    logger = logging.getLogger("cli_mode_switching")
+    logger.addHandler(logging.NullHandler())
+
+    print("Checkouts: {}, round trip latency: {}s".format(checkouts_count, latency))
+    print("{:<16}{:>14}{:>22}{:>12}".format("CLI", "round trips", "round trips/checkout", "seconds"))
+    for cli_class in (CLI, ModeCachingCLI):
+        round_trips, duration = run(cli_class, checkouts_count, latency, logger)
+        print("{:<16}{:>14}{:>22.2f}{:>12.3f}".format(cli_class.__name__,
+                                                      round_trips,
+                                                      float(round_trips) / checkouts_count,
+                                                      duration))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000,
+                  float(sys.argv[2]) if len(sys.argv) > 2 else 0.0))
@@ -0,0 +1,207 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Benchmark for ConnectivityRunner.apply_connectivity_changes with the simulated switch
+
+VLAN flows emulate CLI command latency and failure rate without a real device.
+For the each request size reports throughput, flow latency percentiles, peak threads and peak RSS.
+
+Usage: python benchmarks/connectivity_benchmark.py [--sizes 1,10,100,1000,10000] [--latency 0.005]
+                                                   [--failure-rate 0.01] [--concurrency 8] [--ports 48]
+                                                   [--no-vlan-ranges]
+"""
+
+import argparse
+import json
+import logging
+import random
+import resource
+import threading
+import time
+
+from cloudshell.devices.flows.cli_action_flows import AddVlanFlow, RemoveVlanFlow
+from cloudshell.devices.runners.connectivity_metrics import ConnectivityMetricsSink
+from cloudshell.devices.runners.connectivity_runner import ConnectivityRunner
+
+
+class ResourceConfig(object):
+    def __init__(self, sessions_concurrency_limit):
+        self.sessions_concurrency_limit = str(sessions_concurrency_limit)
+
+
+class CliHandler(object):
+    def __init__(self, sessions_concurrency_limit):
+        self.resource_config = ResourceConfig(sessions_concurrency_limit)
+
+
+class SimulatedSwitch(object):
+    """Emulates CLI command latency and random command failures"""
+
+    def __init__(self, command_latency, failure_rate, seed=0):
+        self._command_latency = command_latency
+        self._failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def send_commands(self, commands_count):
+        time.sleep(self._command_latency * commands_count)
+        with self._lock:
+            failed = self._random.random() < self._failure_rate
+        if failed:
+            raise Exception("Simulated command failure")
+
+
+class SimulatedAddVlanFlow(AddVlanFlow):
+    # interface, switchport mode, switchport allowed vlan, exit
+    COMMANDS_COUNT = 4
+
+    def __init__(self, cli_handler, logger, switch):
+        super(SimulatedAddVlanFlow, self).__init__(cli_handler, logger)
+        self._switch = switch
+
+    def execute_flow(self, vlan_range, port_mode, port_name, qnq, c_tag):
+        self._switch.send_commands(self.COMMANDS_COUNT)
+        return "VLAN {} added to {}".format(vlan_range, port_name)
+
+
+class SimulatedRemoveVlanFlow(RemoveVlanFlow):
+    # interface, no switchport allowed vlan, exit
+    COMMANDS_COUNT = 3
+
+    def __init__(self, cli_handler, logger, switch):
+        super(SimulatedRemoveVlanFlow, self).__init__(cli_handler, logger)
+        self._switch = switch
+
+    def execute_flow(self, vlan_range, port_name, port_mode, action_map=None, error_map=None):
+        self._switch.send_commands(self.COMMANDS_COUNT)
+        return "VLAN {} removed from {}".format(vlan_range, port_name)
+
+
+class BenchmarkConnectivityRunner(ConnectivityRunner):
+    def __init__(self, logger, cli_handler, switch, metrics_sink):
+        super(BenchmarkConnectivityRunner, self).__init__(logger, cli_handler, metrics_sink=metrics_sink)
+        self._switch = switch
+
+    @property
+    def add_vlan_flow(self):
+        return SimulatedAddVlanFlow(self.cli_handler, self._logger, self._switch)
+
+    @property
+    def remove_vlan_flow(self):
+        return SimulatedRemoveVlanFlow(self.cli_handler, self._logger, self._switch)
+
+
+class LatencySink(ConnectivityMetricsSink):
+    """Keeps wait and execution times of the all flows"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = []
+
+    def record(self, flow_metrics):
+        with self._lock:
+            self.latencies.append(flow_metrics.wait_time + flow_metrics.execution_time)
+
+
+class PeakThreadsSampler(threading.Thread):
+    def __init__(self, interval=0.005):
+        super(PeakThreadsSampler, self).__init__()
+        self.daemon = True
+        self.peak_threads = threading.active_count()
+        self._interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+            time.sleep(self._interval)
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+def create_request(actions_count, ports_count):
+    """Generate request with the remove and set VLAN actions spread over the ports"""
+    actions = []
+    for action_number in range(actions_count):
+        port = action_number % ports_count
+        action_type = "removeVlan" if action_number % 3 == 0 else "setVlan"
+        vlan_id = str(2 + action_number // ports_count % 3999)
+        actions.append({"actionId": "action-{}".format(action_number),
+                        "type": action_type,
+                        "actionTarget": {"fullName": "Switch/Chassis 0/Port {}".format(port),
+                                         "fullAddress": "192.168.1.1/0/{}".format(port)},
+                        "connectionParams": {"vlanId": vlan_id, "mode": "Trunk", "vlanServiceAttributes": []},
+                        "connectorAttributes": []})
+
+    return json.dumps({"driverRequest": {"actions": actions}})
+
+
+def percentile(values, percent):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(int(len(values) * percent / 100.0), len(values) - 1)]
+
+
+def run_benchmark(actions_count, command_latency, failure_rate, concurrency, ports_count, vlan_ranges=True):
+    logger = logging.getLogger("connectivity_benchmark")
+    logger.addHandler(logging.NullHandler())
+    latency_sink = LatencySink()
+    runner = BenchmarkConnectivityRunner(logger=logger,
+                                         cli_handler=CliHandler(concurrency),
+                                         switch=SimulatedSwitch(command_latency, failure_rate),
+                                         metrics_sink=latency_sink)
+    # without ranges the each VLAN is configured by the separate flow
+    runner.IS_VLAN_RANGE_SUPPORTED = vlan_ranges
+    request = create_request(actions_count, ports_count)
+    sampler = PeakThreadsSampler()
+    sampler.start()
+
+    start_time = time.time()
+    response = json.loads(runner.apply_connectivity_changes(request))
+    elapsed_time = time.time() - start_time
+
+    sampler.stop()
+    failed_count = sum(1 for action_result in response["driverResponse"]["actionResults"]
+                       if not action_result["success"])
+
+    return {"actions": actions_count,
+            "flows": len(latency_sink.latencies),
+            "failed": failed_count,
+            "elapsed": elapsed_time,
+            "throughput": actions_count / elapsed_time,
+            "p50": percentile(latency_sink.latencies, 50),
+            "p90": percentile(latency_sink.latencies, 90),
+            "p99": percentile(latency_sink.latencies, 99),
+            "peak_threads": sampler.peak_threads,
+            "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1,10,100,1000,10000", help="comma separated numbers of actions")
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds per simulated CLI command")
+    parser.add_argument("--failure-rate", type=float, default=0.01, help="probability of the flow failure")
+    parser.add_argument("--concurrency", type=int, default=8, help="Sessions Concurrency Limit attribute value")
+    parser.add_argument("--ports", type=int, default=48, help="number of the switch ports")
+    parser.add_argument("--no-vlan-ranges", action="store_true", help="configure the each VLAN by the separate flow")
+    args = parser.parse_args()
+
+    row_format = "{actions:>8} {flows:>8} {failed:>7} {elapsed:>9.3f} {throughput:>11.1f} " \
+                 "{p50:>8.4f} {p90:>8.4f} {p99:>8.4f} {peak_threads:>8} {peak_rss:>10}"
+    print("{:>8} {:>8} {:>7} {:>9} {:>11} {:>8} {:>8} {:>8} {:>8} {:>10}".format(
+        "actions", "flows", "failed", "time, s", "actions/s", "p50, s", "p90, s", "p99, s", "threads", "RSS, KB"))
+
+    for actions_count in [int(size) for size in args.sizes.split(",")]:
+        result = run_benchmark(actions_count=actions_count,
+                               command_latency=args.latency,
+                               failure_rate=args.failure_rate,
+                               concurrency=args.concurrency,
+                               ports_count=args.ports,
+                               vlan_ranges=not args.no_vlan_ranges)
+        print(row_format.format(**result))
+
+
+if __name__ == "__main__":
+    main()
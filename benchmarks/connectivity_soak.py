@@ -0,0 +1,98 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Soak benchmark for ConnectivityRunner.apply_connectivity_changes
+
+Sends the same request with the same action ids many times through one runner instance
+and checks that number of live objects and process memory stay flat.
+
+Usage: python benchmarks/connectivity_soak.py [requests_count]
+"""
+
+import gc
+import json
+import logging
+import resource
+import sys
+
+from cloudshell.devices.flows.cli_action_flows import AddVlanFlow, RemoveVlanFlow
+from cloudshell.devices.runners.connectivity_runner import ConnectivityRunner
+
+WARM_UP_REQUESTS_COUNT = 100
+ALLOWED_OBJECTS_GROWTH = 1000
+
+
+class ResourceConfig(object):
+    sessions_concurrency_limit = "4"
+
+
+class CliHandler(object):
+    resource_config = ResourceConfig()
+
+
+class SoakAddVlanFlow(AddVlanFlow):
+    def execute_flow(self, vlan_range, port_mode, port_name, qnq, c_tag):
+        return "VLAN {} added to {}".format(vlan_range, port_name)
+
+
+class SoakRemoveVlanFlow(RemoveVlanFlow):
+    def execute_flow(self, vlan_range, port_name, port_mode, action_map=None, error_map=None):
+        return "VLAN {} removed from {}".format(vlan_range, port_name)
+
+
+class SoakConnectivityRunner(ConnectivityRunner):
+    @property
+    def add_vlan_flow(self):
+        return SoakAddVlanFlow(self.cli_handler, self._logger)
+
+    @property
+    def remove_vlan_flow(self):
+        return SoakRemoveVlanFlow(self.cli_handler, self._logger)
+
+
+def create_request(ports_count=8):
+    actions = []
+    for port in range(ports_count):
+        for action_type, vlan_id in (("removeVlan", "10-20"), ("setVlan", "30,40-45")):
+            actions.append({"actionId": "{}-{}".format(action_type, port),
+                            "type": action_type,
+                            "actionTarget": {"fullName": "Switch/Chassis 0/Port {}".format(port),
+                                             "fullAddress": "192.168.1.1/0/{}".format(port)},
+                            "connectionParams": {"vlanId": vlan_id, "mode": "Trunk", "vlanServiceAttributes": []},
+                            "connectorAttributes": []})
+
+    return json.dumps({"driverRequest": {"actions": actions}})
+
+
+def get_memory_usage():
+    """Live objects count and max RSS in KB"""
+    gc.collect()
+    return len(gc.get_objects()), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def main(requests_count):
+    logger = logging.getLogger("connectivity_soak")
+    logger.addHandler(logging.NullHandler())
+    runner = SoakConnectivityRunner(logger=logger, cli_handler=CliHandler())
+    request = create_request()
+
+    for _ in range(WARM_UP_REQUESTS_COUNT):
+        runner.apply_connectivity_changes(request)
+
+    start_objects, start_rss = get_memory_usage()
+    for _ in range(requests_count):
+        runner.apply_connectivity_changes(request)
+    end_objects, end_rss = get_memory_usage()
+
+    print("Requests: {}".format(requests_count))
+    print("Live objects: {} -> {} ({:+d})".format(start_objects, end_objects, end_objects - start_objects))
+    print("Max RSS, KB: {} -> {} ({:+d})".format(start_rss, end_rss, end_rss - start_rss))
+
+    if end_objects - start_objects > ALLOWED_OBJECTS_GROWTH:
+        print("FAILED: memory is growing between requests")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000))
@@ -0,0 +1,78 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Benchmark for the ApplyConnectivityChanges request decoding
+
+Compares jsonpickle + JsonRequestDeserializer + hasattr based validation with ConnectivityRequestDecoder.
+
+Usage: python benchmarks/request_decoding.py [actions_count] [repeat]
+"""
+
+import json
+import sys
+import timeit
+
+import jsonpickle
+
+from cloudshell.devices.json_request_helper import JsonRequestDeserializer, ConnectivityRequestDecoder
+from cloudshell.devices.runners.connectivity_runner import ConnectivityRunner
+
+
+class BenchmarkConnectivityRunner(ConnectivityRunner):
+    add_vlan_flow = None
+    remove_vlan_flow = None
+
+
+def create_request(actions_count):
+    actions = []
+    for action_number in range(actions_count):
+        actions.append({"connectionId": "connection-{}".format(action_number),
+                        "actionId": "action-{}".format(action_number),
+                        "type": "setVlan" if action_number % 2 else "removeVlan",
+                        "actionTarget": {"fullName": "Switch/Chassis 0/Port {}".format(action_number),
+                                         "fullAddress": "192.168.1.1/0/{}".format(action_number),
+                                         "type": "actionTarget"},
+                        "connectionParams": {"vlanId": "10-20,30",
+                                             "mode": "Trunk",
+                                             "type": "setVlanParameter",
+                                             "vlanServiceAttributes": [
+                                                 {"attributeName": "QNQ", "attributeValue": "False",
+                                                  "type": "vlanServiceAttribute"},
+                                                 {"attributeName": "CTag", "attributeValue": "",
+                                                  "type": "vlanServiceAttribute"}]},
+                        "connectorAttributes": [],
+                        "customActionAttributes": []})
+
+    return json.dumps({"driverRequest": {"actions": actions}})
+
+
+def main(actions_count, repeat):
+    runner = BenchmarkConnectivityRunner(logger=None, cli_handler=None)
+    decoder = ConnectivityRequestDecoder(runner.APPLY_CONNECTIVITY_CHANGES_ACTION_REQUIRED_ATTRIBUTE_LIST)
+    request = create_request(actions_count)
+
+    def decode_legacy():
+        holder = JsonRequestDeserializer(jsonpickle.decode(request))
+        for action in holder.driverRequest.actions:
+            runner._validate_request_action(action)
+
+    def decode_fast():
+        decoder.decode(request)
+
+    legacy_time = min(timeit.repeat(decode_legacy, number=1, repeat=repeat))
+    fast_time = min(timeit.repeat(decode_fast, number=1, repeat=repeat))
+
+    print("Actions: {}".format(actions_count))
+    print("jsonpickle + JsonRequestDeserializer: {:.3f} ms".format(legacy_time * 1000))
+    print("ConnectivityRequestDecoder: {:.3f} ms".format(fast_time * 1000))
+    print("Speedup: {:.1f}x".format(legacy_time / fast_time))
+
+    if fast_time >= legacy_time:
+        print("FAILED: ConnectivityRequestDecoder is not faster than the legacy decoding")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500,
+                  int(sys.argv[2]) if len(sys.argv) > 2 else 20))
@@ -0,0 +1,95 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Benchmark for the driver responses serialization
+
+Compares jsonpickle.encode with serialize_to_json for the ApplyConnectivityChanges response
+and the orchestration save result, fails if outputs differ or serialize_to_json is not faster.
+
+Usage: python benchmarks/response_encoding.py [actions_count] [repeat]
+"""
+
+import datetime
+import sys
+import timeit
+
+import jsonpickle
+from cloudshell.core.driver_response import DriverResponse
+from cloudshell.core.driver_response_root import DriverResponseRoot
+from cloudshell.networking.apply_connectivity.models.connectivity_result import ConnectivitySuccessResponse, \
+    ConnectivityErrorResponse
+from cloudshell.shell.core.interfaces.save_restore import OrchestrationSaveResult, OrchestrationSavedArtifactInfo, \
+    OrchestrationRestoreRules, OrchestrationSavedArtifact
+
+from cloudshell.devices.networking_utils import serialize_to_json
+
+
+class ActionTarget(object):
+    def __init__(self, full_name):
+        self.fullName = full_name
+
+
+class Action(object):
+    def __init__(self, action_id, port_name):
+        self.type = "setVlan"
+        self.actionId = action_id
+        self.actionTarget = ActionTarget(port_name)
+
+
+def create_connectivity_response(actions_count):
+    action_results = []
+    for action_number in range(actions_count):
+        action = Action("action-{}".format(action_number), "Switch/Chassis 0/Port {}".format(action_number))
+        if action_number % 10:
+            action_results.append(ConnectivitySuccessResponse(
+                action, "Add Vlan 10-20 configuration successfully completed"))
+        else:
+            action_results.append(ConnectivityErrorResponse(
+                action, "Add Vlan 10-20 configuration failed.\nAdd Vlan configuration details:\nsome error"))
+
+    driver_response = DriverResponse()
+    driver_response.actionResults = action_results
+    driver_response_root = DriverResponseRoot()
+    driver_response_root.driverResponse = driver_response
+    return driver_response_root
+
+
+def create_save_result():
+    saved_artifact_info = OrchestrationSavedArtifactInfo(
+        resource_name="switch",
+        created_date=datetime.datetime.now(),
+        restore_rules=OrchestrationRestoreRules(requires_same_resource=True),
+        saved_artifact=OrchestrationSavedArtifact(artifact_type="tftp", identifier="//192.168.1.2/switch-running"))
+    return OrchestrationSaveResult(saved_artifacts_info=saved_artifact_info)
+
+
+def compare(name, result, repeat, number):
+    """Print timings of the both encoders, return True if outputs are equal and serialize_to_json is faster"""
+    expected = str(jsonpickle.encode(result, unpicklable=False))
+    if serialize_to_json(result) != expected:
+        print("{}: FAILED, output differs from jsonpickle.encode".format(name))
+        return False
+
+    jsonpickle_time = min(timeit.repeat(lambda: jsonpickle.encode(result, unpicklable=False),
+                                        number=number, repeat=repeat)) / number
+    encoder_time = min(timeit.repeat(lambda: serialize_to_json(result), number=number, repeat=repeat)) / number
+
+    print("{}: jsonpickle.encode {:.3f} ms, serialize_to_json {:.3f} ms, speedup {:.1f}x".format(
+        name, jsonpickle_time * 1000, encoder_time * 1000, jsonpickle_time / encoder_time))
+
+    if encoder_time >= jsonpickle_time:
+        print("{}: FAILED, serialize_to_json is not faster than jsonpickle.encode".format(name))
+        return False
+
+    return True
+
+
+def main(actions_count, repeat):
+    success = compare("ApplyConnectivityChanges response, {} actions".format(actions_count),
+                      create_connectivity_response(actions_count), repeat=repeat, number=1)
+    success = compare("Orchestration save result", create_save_result(), repeat=repeat, number=100) and success
+    return 0 if success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500,
+                  int(sys.argv[2]) if len(sys.argv) > 2 else 20))
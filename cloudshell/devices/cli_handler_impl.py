@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 from abc import abstractproperty
+from threading import Thread
 
 from cloudshell.cli.cli import CLI
 from cloudshell.cli.cli_service_impl import CommandModeContextManager
@@ -9,9 +10,14 @@ from cloudshell.cli.command_mode import CommandMode
 from cloudshell.cli.session.ssh_session import SSHSession
 from cloudshell.cli.session.telnet_session import TelnetSession
 from cloudshell.devices.cli_handler_interface import CliHandlerInterface
+from cloudshell.devices.cli_transport_cache import TRANSPORT_PREFERENCE_CACHE
+from cloudshell.devices.credentials_cache import PASSWORD_CACHE
 
 
 class CliHandlerImpl(CliHandlerInterface):
+    # session type which connected to the device in "auto" mode is tried first, shared by all handlers in the process
+    TRANSPORT_PREFERENCE_CACHE = TRANSPORT_PREFERENCE_CACHE
+
     def __init__(self, cli, resource_config, logger, api):
         """
         Helps to create cli handler
@@ -27,7 +33,6 @@ class CliHandlerImpl(CliHandlerInterface):
         self.resource_config = resource_config
         self._logger = logger
         self._api = api
-        self._password = None
 
     @abstractproperty
     def enable_mode(self):
@@ -55,10 +60,11 @@ class CliHandlerImpl(CliHandlerInterface):
 
     @property
     def password(self):
-        if not self._password:
-            password = self.resource_config.password
-            self._password = self._api.DecryptPassword(password).Value
-        return self._password
+        return PASSWORD_CACHE.decrypt_password(self._api, self.resource_config.password)
+
+    def invalidate_password(self):
+        """Forget decrypted password of the resource, so it is decrypted again after the password rotation"""
+        PASSWORD_CACHE.invalidate(self.resource_config.password)
 
     @property
     def resource_address(self):
@@ -105,9 +111,50 @@ class CliHandlerImpl(CliHandlerInterface):
         elif self.cli_type.lower() == TelnetSession.SESSION_TYPE.lower():
             new_sessions = self._telnet_session()
         else:
-            new_sessions = [self._ssh_session(), self._telnet_session()]
+            new_sessions = self._order_sessions([self._ssh_session(), self._telnet_session()])
         return new_sessions
 
+    def _order_sessions(self, sessions):
+        """Put session type which connected to the device last time first and track which one will connect
+
+        :param list sessions: sessions which will be tried one by one to connect to the device
+        :rtype: list
+        """
+        device = (self.resource_address, self.port)
+        sessions = self.TRANSPORT_PREFERENCE_CACHE.order_sessions(device, sessions)
+        failed_types = []
+
+        for session in sessions:
+            session.on_session_start = self._track_transport(device=device,
+                                                             session_type=session.session_type,
+                                                             failed_types=list(failed_types),
+                                                             on_session_start=session.on_session_start)
+            failed_types.append(session.session_type)
+
+        return sessions
+
+    def _track_transport(self, device, session_type, failed_types, on_session_start):
+        """Wrap on_session_start callback to record session type which logged in to the device.
+        Session itself is not referenced here, sessions with __del__ in the reference cycle are never collected
+
+        :param device: device key
+        :param str session_type: type of the session the callback is for
+        :param list[str] failed_types: session types tried before this one, they failed if this one is started
+        :param on_session_start: original callback
+        """
+        transport_cache = self.TRANSPORT_PREFERENCE_CACHE
+
+        def on_session_start_tracked(session, logger):
+            for failed_type in failed_types:
+                transport_cache.record_failure(device, failed_type)
+            transport_cache.record_success(device, session_type)
+            logger.debug("{} session connected to {}, it will be tried first next time".format(session_type,
+                                                                                                  device[0]))
+            if on_session_start and callable(on_session_start):
+                on_session_start(session, logger)
+
+        return on_session_start_tracked
+
     def get_cli_service(self, command_mode):
         """Use cli.get_session to open CLI connection and switch into required mode
 
@@ -116,3 +163,41 @@ class CliHandlerImpl(CliHandlerInterface):
         :rtype: CommandModeContextManager
         """
         return self._cli.get_session(self._new_sessions(), command_mode, self._logger)
+
+    def warm_up_sessions(self, sessions_count=1, command_mode=None):
+        """Open CLI sessions ahead of time (e.g. during driver initialize) and return them to the session pool
+        already switched into the command mode, so the first command doesn't wait for connection and login.
+        Sessions are kept between driver commands only if CLI uses shared session pool (driver_helper.get_shared_cli)
+
+        :param int sessions_count: number of sessions to open in parallel, shouldn't exceed session pool size,
+            otherwise extra sessions wait for the free one during the pool timeout
+        :param CommandMode command_mode: mode to switch sessions into, enable_mode by default
+        :return: number of opened sessions
+        :rtype: int
+        """
+        command_mode = command_mode or self.enable_mode
+        session_contexts = []
+
+        def open_session():
+            session_context = self.get_cli_service(command_mode)
+            try:
+                session_context.__enter__()
+            except Exception:
+                self._logger.warning("Failed to warm up CLI session", exc_info=True)
+            else:
+                session_contexts.append(session_context)
+
+        threads = [Thread(target=open_session, name="CLI warm-up {}".format(number))
+                   for number in xrange(sessions_count)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        for session_context in session_contexts:
+            session_context.__exit__(None, None, None)
+
+        self._logger.info("{} of {} CLI sessions are warmed up".format(len(session_contexts), sessions_count))
+        return len(session_contexts)
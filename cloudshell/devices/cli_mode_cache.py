@@ -0,0 +1,145 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import logging
+import re
+import time
+
+from cloudshell.cli.cli import CLI
+from cloudshell.cli.cli_service_impl import CliServiceImpl
+from cloudshell.cli.command_mode_helper import CommandModeHelper
+from cloudshell.cli.session_pool_context_manager import SessionPoolContextManager
+from cloudshell.cli.session_pool_manager import SessionPoolManager
+
+
+class ModeCachingCliService(CliServiceImpl):
+    """CLI service which keeps current command mode on the session, so the next checkout of the pooled session
+    doesn't probe the prompt and run mode actions again, only switches mode if another one is requested"""
+
+    # seconds since the last successful command after which cached mode isn't trusted,
+    # device can leave the mode by itself, e.g. on the config session timeout
+    COMMAND_MODE_CACHE_TTL = 60
+    CACHED_MODE_ATTRIBUTE = "cached_command_mode"
+
+    def __init__(self, session, requested_command_mode, logger, timer=time.time):
+        """
+        :param session:
+        :param CommandMode requested_command_mode:
+        :param logger:
+        :param timer: function returning current time in seconds
+        """
+        self._timer = timer
+        self._command_mode = None
+        super(ModeCachingCliService, self).__init__(session, requested_command_mode, logger)
+
+    @property
+    def command_mode(self):
+        return self._command_mode
+
+    @command_mode.setter
+    def command_mode(self, command_mode):
+        # mode is switched only after successful enter/exit commands, see CommandMode.step_up and step_down
+        self._command_mode = command_mode
+        setattr(self.session, self.CACHED_MODE_ATTRIBUTE, (command_mode, self._timer()))
+
+    @classmethod
+    def clear_cached_mode(cls, session):
+        """Forget command mode of the session, so it is determined by the prompt on the next checkout
+
+        :param session:
+        """
+        setattr(session, cls.CACHED_MODE_ATTRIBUTE, None)
+
+    def _get_cached_mode(self, requested_command_mode):
+        """Get cached mode if it is not expired and belongs to the same modes tree as requested mode
+
+        :param CommandMode requested_command_mode:
+        :rtype: CommandMode
+        """
+        cached_mode = getattr(self.session, self.CACHED_MODE_ATTRIBUTE, None)
+        if not cached_mode:
+            return None
+
+        command_mode, updated_at = cached_mode
+        if self._timer() - updated_at >= self.COMMAND_MODE_CACHE_TTL:
+            return None
+
+        if command_mode not in CommandModeHelper.defined_modes_by_prompt(requested_command_mode).values():
+            return None
+
+        return command_mode
+
+    def _initialize(self, requested_command_mode):
+        cached_mode = self._get_cached_mode(requested_command_mode)
+        if cached_mode is None:
+            self.clear_cached_mode(self.session)
+            super(ModeCachingCliService, self)._initialize(requested_command_mode)
+        else:
+            self._logger.debug("Session is already in the {} mode".format(cached_mode.prompt))
+            self.command_mode = cached_mode
+            self._change_mode(requested_command_mode)
+
+    def send_command(self, command, expected_string=None, action_map=None, error_map=None, logger=None,
+                     remove_prompt=False, *args, **kwargs):
+        try:
+            output = super(ModeCachingCliService, self).send_command(command, expected_string, action_map,
+                                                                     error_map, logger, remove_prompt,
+                                                                     *args, **kwargs)
+        except Exception:
+            # failed command could leave the device in any mode, it will be determined by the prompt next time
+            self.clear_cached_mode(self.session)
+            raise
+
+        if getattr(self.session, self.CACHED_MODE_ATTRIBUTE, None):
+            if re.search(self.command_mode.prompt, output or "", re.DOTALL):
+                self.command_mode = self.command_mode
+            else:
+                # command could leave the mode, e.g. custom "end" or "exit", prompt is checked on the next checkout
+                self.clear_cached_mode(self.session)
+
+        return output
+
+    def reconnect(self, timeout=None):
+        command_mode = self.command_mode
+        self.clear_cached_mode(self.session)
+        prompts_re = r"|".join(CommandModeHelper.defined_modes_by_prompt(command_mode).keys())
+        self.session.reconnect(prompts_re, self._logger, timeout)
+        self._initialize(command_mode)
+
+
+class ModeCachingSessionPoolContextManager(SessionPoolContextManager):
+    """Session pool context manager which uses ModeCachingCliService"""
+
+    def _initialize_cli_service(self, session, prompt):
+        try:
+            return ModeCachingCliService(session, self._command_mode, self._logger)
+        except Exception:
+            ModeCachingCliService.clear_cached_mode(session)
+            session.reconnect(prompt, self._logger)
+            return ModeCachingCliService(session, self._command_mode, self._logger)
+
+
+class ModeCachingCLI(CLI):
+    """CLI which skips mode transitions if the pooled session is already in the requested command mode"""
+
+    def __init__(self, session_pool=None):
+        """
+        :param SessionPoolManager session_pool:
+        """
+        super(ModeCachingCLI, self).__init__(session_pool=session_pool or SessionPoolManager())
+
+    def get_session(self, new_sessions, command_mode, logger=None):
+        """Get session from the pool or create new
+
+        :param new_sessions:
+        :param CommandMode command_mode:
+        :param logger:
+        :rtype: ModeCachingSessionPoolContextManager
+        """
+        if not isinstance(new_sessions, list):
+            new_sessions = [new_sessions]
+
+        if not logger:
+            logger = logging.getLogger("cloudshell_cli")
+
+        return ModeCachingSessionPoolContextManager(self._session_pool, new_sessions, command_mode, logger)
@@ -0,0 +1,419 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import logging
+import re
+import time
+from threading import Condition, Event, Lock, Thread
+
+from cloudshell.cli.cli import CLI
+from cloudshell.cli.session_manager_impl import SessionManagerImpl
+from cloudshell.cli.session_pool_manager import SessionPoolManager, SessionPoolException
+from cloudshell.devices.cli_mode_cache import ModeCachingCLI, ModeCachingCliService
+
+
+class SharedSessionPoolManager(SessionPoolManager):
+    """Session pool of the one device shared between driver commands.
+    Idle sessions are closed and number of the open sessions is limited by the registry"""
+
+    # any output from the device means that session is alive
+    KEEPALIVE_EXPECTED_STRING = r".+"
+
+    def __init__(self, registry, max_pool_size=SessionPoolManager.MAX_POOL_SIZE,
+                 pool_timeout=SessionPoolManager.POOL_TIMEOUT):
+        """
+        :param CliSessionPoolRegistry registry:
+        :param int max_pool_size: max number of the device sessions
+        :param int pool_timeout: seconds to wait for the free session
+        """
+        # each pool needs its own session manager, default one is shared by all SessionPoolManager objects
+        super(SharedSessionPoolManager, self).__init__(session_manager=SessionManagerImpl(),
+                                                       max_pool_size=max_pool_size,
+                                                       pool_timeout=pool_timeout)
+        self._registry = registry
+        # id of the open session -> time when it was returned to the pool or None if it is in use
+        self._idle_since = {}
+        # id of the idle session -> time when it was successfully probed last time
+        self._probed_at = {}
+        # number of the new sessions waiting for the slot in the registry
+        self._opening_count = 0
+
+    @property
+    def max_pool_size(self):
+        return self._pool.maxsize
+
+    @max_pool_size.setter
+    def max_pool_size(self, value):
+        with self._session_condition:
+            self._max_pool_size = value
+            self._pool.maxsize = value
+            self._session_condition.notify_all()
+
+    @property
+    def open_sessions_count(self):
+        return len(self._idle_since)
+
+    def return_session(self, session, logger):
+        with self._session_condition:
+            self._idle_since[id(session)] = self._registry.timer()
+            super(SharedSessionPoolManager, self).return_session(session, logger)
+
+    def remove_session(self, session, logger):
+        with self._session_condition:
+            super(SharedSessionPoolManager, self).remove_session(session, logger)
+            self._close_session(session, logger)
+
+    def get_session(self, new_sessions, prompt, logger):
+        """Get session from the pool or create new one. Slot for the new session is reserved in the registry
+        without holding the pool lock, so sessions can be returned to this pool and evicted from it meanwhile
+
+        :rtype: cloudshell.cli.session.session.Session
+        """
+        end_time = time.time() + self._pool_timeout
+
+        while True:
+            with self._session_condition:
+                while True:
+                    session = self._get_idle_session(new_sessions, logger)
+                    if session is not None:
+                        return session
+
+                    if self._session_manager.existing_sessions_count() + self._opening_count < self._pool.maxsize:
+                        self._opening_count += 1
+                        break
+
+                    remaining_time = end_time - time.time()
+                    if remaining_time <= 0:
+                        raise SessionPoolException(self.__class__.__name__,
+                                                   "Cannot get session instance during {} sec.".format(
+                                                       self._pool_timeout))
+                    self._session_condition.wait(remaining_time)
+
+            try:
+                # session returned to the pool while waiting for the slot is used instead of the new one
+                reserved = self._registry.reserve_session(requester=self,
+                                                          timeout=max(end_time - time.time(), 0),
+                                                          is_cancelled=lambda: not self._pool.empty())
+            except Exception:
+                with self._session_condition:
+                    self._opening_count -= 1
+                    self._session_condition.notify()
+                raise
+
+            with self._session_condition:
+                self._opening_count -= 1
+                if not reserved:
+                    continue
+
+                try:
+                    session = self._new_session(new_sessions, prompt, logger)
+                except Exception:
+                    self._registry.release_session()
+                    self._session_condition.notify()
+                    raise
+
+                self._idle_since[id(session)] = None
+                return session
+
+    def _get_idle_session(self, new_sessions, logger):
+        """Take session compatible with the new sessions from the pool, incompatible ones are closed
+
+        :return: session or None if there are no compatible sessions in the pool
+        """
+        while not self._pool.empty():
+            session = self._pool.get(False)
+            if self._session_manager.is_compatible(session, new_sessions, logger):
+                self._idle_since[id(session)] = None
+                return session
+
+            logger.debug("Session args was changed, creating session with new args")
+            self.remove_session(session, logger)
+
+        return None
+
+    def _close_session(self, session, logger):
+        """Disconnect removed session and release its slot in the registry"""
+        self._probed_at.pop(id(session), None)
+        if self._idle_since.pop(id(session), False) is False:
+            return
+
+        try:
+            session.disconnect()
+        except Exception:
+            logger.debug("Failed to disconnect {} session".format(session.session_type), exc_info=True)
+
+        self._registry.release_session()
+
+    def evict_idle_sessions(self, max_idle_time, logger, limit=None, blocking=True):
+        """Close sessions which are idle in the pool longer than max_idle_time
+
+        :param float max_idle_time: seconds, 0 closes all idle sessions
+        :param logger:
+        :param int limit: max number of sessions to close
+        :param bool blocking: if False and pool is locked by another thread nothing is evicted
+        :return: number of closed sessions
+        :rtype: int
+        """
+        if not self._session_condition.acquire(blocking):
+            return 0
+
+        try:
+            now = self._registry.timer()
+            kept_sessions = []
+            evicted_count = 0
+
+            while not self._pool.empty():
+                session = self._pool.get(False)
+                idle_since = self._idle_since.get(id(session))
+                if ((limit is None or evicted_count < limit) and
+                        (idle_since is None or now - idle_since >= max_idle_time)):
+                    logger.debug("Closing idle {} session".format(session.session_type))
+                    self.remove_session(session, logger)
+                    evicted_count += 1
+                else:
+                    kept_sessions.append(session)
+
+            for session in kept_sessions:
+                self._pool.put(session)
+
+            return evicted_count
+        finally:
+            self._session_condition.release()
+
+    def probe_idle_sessions(self, min_idle_time, timeout, logger):
+        """Check that sessions idle in the pool at least min_idle_time (since the return or the last probe)
+        are still alive, stale ones are closed before any command checks them out.
+        Sessions are taken out of the pool while probing, so other threads don't wait for the probes
+
+        :param float min_idle_time: seconds
+        :param float timeout: seconds to wait for the device response
+        :param logger:
+        :return: number of closed stale sessions
+        :rtype: int
+        """
+        with self._session_condition:
+            now = self._registry.timer()
+            probed_sessions = []
+            kept_sessions = []
+
+            while not self._pool.empty():
+                session = self._pool.get(False)
+                last_used = max(self._idle_since.get(id(session)) or now, self._probed_at.get(id(session), 0))
+                if now - last_used >= min_idle_time:
+                    probed_sessions.append(session)
+                else:
+                    kept_sessions.append(session)
+
+            for session in kept_sessions:
+                self._pool.put(session)
+
+        stale_count = 0
+        for session in probed_sessions:
+            if self._is_session_alive(session, timeout, logger):
+                with self._session_condition:
+                    # idle time is kept, probes must not prevent eviction of unused sessions
+                    self._probed_at[id(session)] = self._registry.timer()
+                    self._pool.put(session)
+                    self._session_condition.notify()
+            else:
+                logger.debug("Closing stale {} session".format(session.session_type))
+                self.remove_session(session, logger)
+                stale_count += 1
+
+        return stale_count
+
+    def _is_session_alive(self, session, timeout, logger):
+        """Send empty line and wait for any output from the device
+
+        :rtype: bool
+        """
+        try:
+            output = session.hardware_expect("", expected_string=self.KEEPALIVE_EXPECTED_STRING, logger=logger,
+                                             timeout=timeout)
+        except Exception:
+            logger.debug("{} session doesn't respond".format(session.session_type), exc_info=True)
+            return False
+
+        cached_mode = getattr(session, ModeCachingCliService.CACHED_MODE_ATTRIBUTE, None)
+        if cached_mode and not re.search(cached_mode[0].prompt, output, re.DOTALL):
+            # device left the mode by itself, e.g. on the config session timeout
+            ModeCachingCliService.clear_cached_mode(session)
+
+        return True
+
+
+class CliSessionPoolRegistry(object):
+    """Process-wide registry of the device session pools, so CLI sessions are reused across driver commands"""
+
+    DEFAULT_MAX_SESSIONS = 100
+    DEFAULT_MAX_IDLE_TIME = 300
+    DEFAULT_KEEPALIVE_INTERVAL = 60
+    DEFAULT_KEEPALIVE_TIMEOUT = 10
+
+    def __init__(self, max_sessions=DEFAULT_MAX_SESSIONS, max_idle_time=DEFAULT_MAX_IDLE_TIME, timer=time.time,
+                 logger=None):
+        """
+        :param int max_sessions: max number of the open sessions of all pools
+        :param float max_idle_time: seconds after which unused session is closed
+        :param timer: function returning current time in seconds
+        :param logger: used for the sessions evicted to free slot for the other pool, module logger by default
+        """
+        self.max_sessions = max_sessions
+        self.max_idle_time = max_idle_time
+        self.timer = timer
+        self._logger = logger or logging.getLogger(__name__)
+        self._lock = Lock()
+        self._sessions_condition = Condition()
+        self._open_sessions_count = 0
+        self._pools = {}
+        self._keepalive_stopped = None
+
+    @property
+    def open_sessions_count(self):
+        with self._sessions_condition:
+            return self._open_sessions_count
+
+    def get_pool(self, address, port, username, cli_type, max_pool_size=SessionPoolManager.MAX_POOL_SIZE,
+                 pool_timeout=SessionPoolManager.POOL_TIMEOUT, logger=None):
+        """Get shared session pool for the device, sessions idle longer than max_idle_time are closed
+
+        :param str address: device address
+        :param port: CLI TCP port
+        :param str username: CLI user
+        :param str cli_type: CLI connection type [ssh|telnet|auto]
+        :param int max_pool_size: max number of the device sessions, the largest requested size is used
+        :param int pool_timeout: seconds to wait for the free session
+        :param logger:
+        :rtype: SharedSessionPoolManager
+        """
+        key = (address, port, username, cli_type)
+
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = SharedSessionPoolManager(registry=self, max_pool_size=max_pool_size, pool_timeout=pool_timeout)
+                self._pools[key] = pool
+            elif pool.max_pool_size < max_pool_size:
+                pool.max_pool_size = max_pool_size
+            pools = self._pools.values()
+
+        for registered_pool in pools:
+            registered_pool.evict_idle_sessions(self.max_idle_time, logger or self._logger, blocking=False)
+
+        return pool
+
+    def get_cli(self, address, port, username, cli_type, max_pool_size=SessionPoolManager.MAX_POOL_SIZE,
+                pool_timeout=SessionPoolManager.POOL_TIMEOUT, logger=None, cache_command_mode=False):
+        """Get CLI which uses shared session pool of the device
+
+        :param bool cache_command_mode: keep command mode on the pooled sessions, see ModeCachingCLI
+        :rtype: CLI
+        """
+        cli_class = ModeCachingCLI if cache_command_mode else CLI
+        return cli_class(session_pool=self.get_pool(address=address,
+                                                    port=port,
+                                                    username=username,
+                                                    cli_type=cli_type,
+                                                    max_pool_size=max_pool_size,
+                                                    pool_timeout=pool_timeout,
+                                                    logger=logger))
+
+    def reserve_session(self, requester, timeout, is_cancelled=None):
+        """Reserve slot for the new session. If all slots are taken, idle sessions of the other pools are closed,
+        otherwise waits for the free slot
+
+        :param SharedSessionPoolManager requester: pool which opens the session
+        :param float timeout: seconds to wait for the free slot
+        :param is_cancelled: function checked while waiting, waiting is stopped once it returns True
+        :return: whether slot was reserved, False only if waiting was cancelled
+        :rtype: bool
+        :raises SessionPoolException: if there is no free slot during the timeout
+        """
+        end_time = time.time() + timeout
+
+        while True:
+            with self._sessions_condition:
+                if self._open_sessions_count < self.max_sessions:
+                    self._open_sessions_count += 1
+                    return True
+
+            with self._lock:
+                pools = [pool for pool in self._pools.itervalues() if pool is not requester]
+
+            # pools are not blocked, so two pools freeing slots for each other don't deadlock
+            if any(pool.evict_idle_sessions(0, self._logger, limit=1, blocking=False) for pool in pools):
+                continue
+
+            with self._sessions_condition:
+                remaining_time = end_time - time.time()
+                if self._open_sessions_count < self.max_sessions:
+                    continue
+                if is_cancelled is not None and is_cancelled():
+                    return False
+                if remaining_time <= 0:
+                    raise SessionPoolException(self.__class__.__name__,
+                                               "Cannot open new session during {} sec, {} sessions are already open"
+                                               .format(timeout, self._open_sessions_count))
+                # other pools can be locked at the moment, so check them again a bit later
+                self._sessions_condition.wait(min(remaining_time, 1))
+
+    def release_session(self):
+        """Free slot of the closed session"""
+        with self._sessions_condition:
+            self._open_sessions_count -= 1
+            self._sessions_condition.notify()
+
+    def probe_idle_sessions(self, min_idle_time, timeout=DEFAULT_KEEPALIVE_TIMEOUT):
+        """Close sessions idle longer than max_idle_time and probe the other idle sessions of the all pools
+
+        :param float min_idle_time: seconds the session is idle (since the return or the last probe) to be probed
+        :param float timeout: seconds to wait for the device response
+        :return: number of closed stale sessions
+        :rtype: int
+        """
+        with self._lock:
+            pools = self._pools.values()
+
+        stale_count = 0
+        for pool in pools:
+            pool.evict_idle_sessions(self.max_idle_time, self._logger)
+            stale_count += pool.probe_idle_sessions(min_idle_time, timeout, self._logger)
+
+        return stale_count
+
+    def start_keepalive(self, interval=DEFAULT_KEEPALIVE_INTERVAL, timeout=DEFAULT_KEEPALIVE_TIMEOUT):
+        """Start background thread which probes sessions idle longer than the interval,
+        so stale sessions (behind NAT or closed by the device idle timeout) are closed before the next command
+
+        :param float interval: seconds between the probes of the idle session
+        :param float timeout: seconds to wait for the device response
+        """
+        with self._lock:
+            if self._keepalive_stopped is not None:
+                return
+
+            self._keepalive_stopped = Event()
+            thread = Thread(target=self._run_keepalive,
+                            args=(interval, timeout, self._keepalive_stopped),
+                            name="CLI sessions keepalive")
+            thread.daemon = True
+            thread.start()
+
+    def stop_keepalive(self):
+        with self._lock:
+            if self._keepalive_stopped is not None:
+                self._keepalive_stopped.set()
+                self._keepalive_stopped = None
+
+    def _run_keepalive(self, interval, timeout, stopped):
+        while not stopped.wait(interval):
+            try:
+                stale_count = self.probe_idle_sessions(interval, timeout)
+            except Exception:
+                self._logger.exception("Failed to probe idle CLI sessions")
+            else:
+                if stale_count:
+                    self._logger.info("{} stale CLI sessions are closed".format(stale_count))
+
+
+SESSION_POOL_REGISTRY = CliSessionPoolRegistry()
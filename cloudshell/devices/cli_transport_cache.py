@@ -0,0 +1,91 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import time
+from threading import Lock
+
+
+class TransportPreferenceCache(object):
+    """Remembers which CLI session type connected to the device when CLI connection type is "auto",
+    so it is tried first next time instead of failing with the other session type on every connection"""
+
+    def __init__(self, ttl=3600, timer=time.time):
+        """
+        :param float ttl: seconds to keep session type preferred, after that all session types are tried
+            in the default order again, so device that starts supporting SSH is picked up
+        :param timer: function returning current time in seconds
+        """
+        self._ttl = ttl
+        self._timer = timer
+        self._lock = Lock()
+        # device -> (session type, expiration time)
+        self._preferences = {}
+
+    def get(self, device):
+        """Get session type which connected to the device last time
+
+        :param device: device key, e.g. (address, port)
+        :return: session type or None if there is no preference or it is expired
+        :rtype: str
+        """
+        with self._lock:
+            preference = self._preferences.get(device)
+            if preference is None:
+                return None
+
+            session_type, expires_at = preference
+            if expires_at <= self._timer():
+                del self._preferences[device]
+                return None
+
+            return session_type
+
+    def record_success(self, device, session_type):
+        """Prefer session type for the device. Expiration time is set only when the preferred type changes,
+        so successes of the preferred type don't prolong it and the default order is tried again after the TTL
+
+        :param device: device key, e.g. (address, port)
+        :param str session_type: session type which connected to the device
+        """
+        with self._lock:
+            now = self._timer()
+            preference = self._preferences.get(device)
+            if preference is not None and preference[0] == session_type and preference[1] > now:
+                return
+
+            self._preferences[device] = (session_type, now + self._ttl)
+
+    def record_failure(self, device, session_type):
+        """Drop preference of the session type which failed to connect to the device
+
+        :param device: device key, e.g. (address, port)
+        :param str session_type: session type which failed to connect to the device
+        """
+        with self._lock:
+            preference = self._preferences.get(device)
+            if preference is not None and preference[0] == session_type:
+                del self._preferences[device]
+
+    def order_sessions(self, device, sessions):
+        """Put session of the preferred type first, order of the other sessions is kept
+
+        :param device: device key, e.g. (address, port)
+        :param list sessions: sessions which will be tried one by one to connect to the device
+        :rtype: list
+        """
+        preferred_type = self.get(device)
+        if preferred_type is None:
+            return list(sessions)
+
+        return sorted(sessions, key=lambda session: session.session_type != preferred_type)
+
+    def clear(self):
+        with self._lock:
+            self._preferences.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._preferences)
+
+
+TRANSPORT_PREFERENCE_CACHE = TransportPreferenceCache()
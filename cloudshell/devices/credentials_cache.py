@@ -0,0 +1,39 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from cloudshell.devices.ttl_cache import TTLCache
+
+
+class DecryptedPasswordCache(TTLCache):
+    """Passwords decrypted by CloudShell API, bounded by TTL and size with LRU eviction
+
+    Shared by all handlers and runners in the process, so repeated commands for the same resource
+    don't make API round trips for the credentials
+    """
+
+    DEFAULT_TTL = 600
+    DEFAULT_MAX_SIZE = 1000
+
+    def decrypt_password(self, api, encrypted_password):
+        """Get decrypted password from the cache or decrypt it with CloudShell API
+
+        :param cloudshell.api.cloudshell_api.CloudShellAPISession api:
+        :param str encrypted_password: password as it is stored in the resource attribute
+        :rtype: str
+        """
+        password = self.get(encrypted_password)
+        if password is None:
+            password = api.DecryptPassword(encrypted_password).Value
+            self.set(encrypted_password, password)
+
+        return password
+
+    def invalidate(self, encrypted_password):
+        """Forget decrypted password, e.g. when the password was rotated and the old one is rejected by the device
+
+        :param str encrypted_password: password as it is stored in the resource attribute
+        """
+        self.pop(encrypted_password)
+
+
+PASSWORD_CACHE = DecryptedPasswordCache()
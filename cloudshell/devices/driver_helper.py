@@ -5,16 +5,42 @@ import threading
 
 from cloudshell.cli.cli import CLI
 from cloudshell.cli.session_pool_manager import SessionPoolManager
+from cloudshell.devices.cli_mode_cache import ModeCachingCLI
+from cloudshell.devices.cli_session_pool import SESSION_POOL_REGISTRY
+from cloudshell.devices.credentials_cache import PASSWORD_CACHE
 from cloudshell.shell.core.session.cloudshell_session import CloudShellSessionContext
 from cloudshell.shell.core.session.logging_session import LoggingSessionContext
 from cloudshell.snmp.snmp_parameters import SNMPV3Parameters, SNMPV2ReadParameters, SNMPV2WriteParameters
 
 
-def get_cli(session_pool_size, pool_timeout=100):
+def get_cli(session_pool_size, pool_timeout=100, cache_command_mode=False):
     session_pool = SessionPoolManager(max_pool_size=session_pool_size, pool_timeout=pool_timeout)
+    if cache_command_mode:
+        return ModeCachingCLI(session_pool=session_pool)
     return CLI(session_pool=session_pool)
 
 
+def get_shared_cli(resource_config, session_pool_size, pool_timeout=100, logger=None, cache_command_mode=False):
+    """Get CLI with the session pool shared by all driver commands of the device in the current process
+
+    :param resource_config: resource configuration with address, CLI port, user and CLI connection type
+    :param int session_pool_size: max number of the device sessions
+    :param int pool_timeout: seconds to wait for the free session
+    :param logger:
+    :param bool cache_command_mode: keep command mode on the pooled sessions, so the next command skips
+        the prompt probe and mode actions, see ModeCachingCLI
+    :rtype: CLI
+    """
+    return SESSION_POOL_REGISTRY.get_cli(address=resource_config.address,
+                                         port=resource_config.cli_tcp_port,
+                                         username=resource_config.user,
+                                         cli_type=resource_config.cli_connection_type,
+                                         max_pool_size=session_pool_size,
+                                         pool_timeout=pool_timeout,
+                                         logger=logger,
+                                         cache_command_mode=cache_command_mode)
+
+
 def get_logger_with_thread_id(context):
     """
     Create QS Logger for command context AutoLoadCommandContext, ResourceCommandContext
@@ -51,13 +77,13 @@ def get_snmp_parameters_from_command_context(resource_config, api, force_decrypt
     if '3' in resource_config.snmp_version:
         return SNMPV3Parameters(ip=resource_config.address,
                                 snmp_user=resource_config.snmp_v3_user or '',
-                                snmp_password=api.DecryptPassword(resource_config.snmp_v3_password).Value or '',
+                                snmp_password=PASSWORD_CACHE.decrypt_password(api, resource_config.snmp_v3_password) or '',
                                 snmp_private_key=resource_config.snmp_v3_private_key or '',
                                 auth_protocol=resource_config.snmp_v3_auth_protocol or SNMPV3Parameters.AUTH_NO_AUTH,
                                 private_key_protocol=resource_config.snmp_v3_priv_protocol or SNMPV3Parameters.PRIV_NO_PRIV).get_valid()
     else:
         if resource_config.shell_name or force_decrypt:
-            write_community = api.DecryptPassword(resource_config.snmp_write_community).Value or ''
+            write_community = PASSWORD_CACHE.decrypt_password(api, resource_config.snmp_write_community) or ''
         else:
             write_community = resource_config.snmp_write_community or ''
 
@@ -65,7 +91,7 @@ def get_snmp_parameters_from_command_context(resource_config, api, force_decrypt
             return SNMPV2WriteParameters(ip=resource_config.address, snmp_write_community=write_community)
         else:
             if resource_config.shell_name or force_decrypt:
-                read_community = api.DecryptPassword(resource_config.snmp_read_community).Value or ''
+                read_community = PASSWORD_CACHE.decrypt_password(api, resource_config.snmp_read_community) or ''
             else:
                 read_community = resource_config.snmp_read_community or ''
 
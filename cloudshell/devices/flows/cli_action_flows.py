@@ -1,8 +1,16 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
+import copy
+import re
+import time
 from abc import abstractmethod
+
+from cloudshell.cli.helper.normalize_buffer import normalize_buffer
+from cloudshell.cli.session.session_exceptions import CommandExecutionException, ExpectedSessionException, \
+    SessionReadEmptyData, SessionReadTimeout
 from cloudshell.devices.cli_handler_impl import CliHandlerImpl
+from cloudshell.devices.cli_mode_cache import ModeCachingCliService
 
 
 class BaseCliFlow(object):
@@ -53,6 +61,30 @@ class RestoreConfigurationFlow(BaseCliFlow):
         pass
 
 
+def _execute_vlan_ranges(vlan_range_list, execute_range):
+    """ Execute flow for the each VLAN range, failure of one range doesn't stop the next ones
+
+    :param list[str] vlan_range_list: list of VLANs or VLAN ranges
+    :param execute_range: function executing flow for the one VLAN range
+    :return: joined outputs of the VLAN ranges
+    :rtype: str
+    :raises CommandExecutionException: with errors of the all failed VLAN ranges
+    """
+
+    outputs = []
+    errors = []
+    for vlan_range in vlan_range_list:
+        try:
+            outputs.append(execute_range(vlan_range))
+        except Exception as e:
+            errors.append("VLAN {}: {}".format(vlan_range, e.message or e))
+
+    if errors:
+        raise CommandExecutionException("\n".join(errors))
+
+    return "\n".join(str(output) for output in outputs if output)
+
+
 class AddVlanFlow(BaseCliFlow):
     def __init__(self, cli_handler, logger):
         super(AddVlanFlow, self).__init__(cli_handler, logger)
@@ -71,6 +103,26 @@ class AddVlanFlow(BaseCliFlow):
 
         pass
 
+    def execute_batch_flow(self, vlan_range_list, port_mode, port_name, qnq, c_tag):
+        """ Configures several VLANs on the port. Executes execute_flow for the each VLAN range by default,
+        override it to configure all of them within the one CLI session. ConnectivityRunner uses batches only
+        if this method is overridden, error of the batch is reported for the all actions of its VLANs
+
+        :param list[str] vlan_range_list: list of VLANs or VLAN ranges
+        :param port_mode: mode which will be configured on port. Possible Values are trunk and access
+        :param port_name: full port name
+        :param qnq:
+        :param c_tag:
+        :return: outputs of the each VLAN range configuration
+        :raises CommandExecutionException: if any VLAN range failed, after all of them were executed
+        """
+
+        return _execute_vlan_ranges(vlan_range_list, lambda vlan_range: self.execute_flow(vlan_range=vlan_range,
+                                                                                          port_mode=port_mode,
+                                                                                          port_name=port_name,
+                                                                                          qnq=qnq,
+                                                                                          c_tag=c_tag))
+
 
 class RemoveVlanFlow(BaseCliFlow):
     def __init__(self, cli_handler, logger):
@@ -90,6 +142,40 @@ class RemoveVlanFlow(BaseCliFlow):
 
         pass
 
+    def execute_batch_flow(self, vlan_range_list, port_name, port_mode):
+        """ Remove configuration of several VLANs from the port. Executes execute_flow for the each VLAN range
+        by default, override it to remove all of them within the one CLI session. ConnectivityRunner uses batches
+        only if this method is overridden, error of the batch is reported for the all actions of its VLANs
+
+        :param list[str] vlan_range_list: list of VLANs or VLAN ranges
+        :param port_name: full port name
+        :param port_mode: mode which will be configured on port. Possible Values are trunk and access
+        :return: outputs of the each VLAN range removal
+        :raises CommandExecutionException: if any VLAN range failed, after all of them were executed
+        """
+
+        return _execute_vlan_ranges(vlan_range_list, lambda vlan_range: self.execute_flow(vlan_range=vlan_range,
+                                                                                          port_name=port_name,
+                                                                                          port_mode=port_mode))
+
+
+class GetPortVlansFlow(BaseCliFlow):
+    def __init__(self, cli_handler, logger):
+        super(GetPortVlansFlow, self).__init__(cli_handler, logger)
+
+    @abstractmethod
+    def execute_flow(self, port_names):
+        """ Read current port mode and VLAN membership of the ports, preferably with the one CLI command
+
+        :param list[str] port_names: full port names
+        :return: dict {port_name: (port_mode, VLANs)}, port mode is trunk or access,
+                 VLANs are VlanSet or string like "10-20,30". Value can be just VLANs if port mode is unknown,
+                 then only removals are reconciled. Ports missing in the result are configured without reconciliation
+        :rtype: dict
+        """
+
+        pass
+
 
 class LoadFirmwareFlow(BaseCliFlow):
     def __init__(self, cli_handler, logger):
@@ -109,14 +195,27 @@ class LoadFirmwareFlow(BaseCliFlow):
 
 
 class RunCommandFlow(BaseCliFlow):
+    # max number of commands written to the device before reading their output in the pipelined mode
+    PIPELINE_BLOCK_SIZE = 20
+    # characters from the end of the streamed output which are matched to the prompt
+    STREAM_TAIL_SIZE = 4096
+    STREAM_READ_TIMEOUT = 1
+    STREAM_IDLE_TIMEOUT = 60
+
     def __init__(self, cli_handler, logger):
         super(RunCommandFlow, self).__init__(cli_handler, logger)
 
-    def execute_flow(self, custom_command="", is_config=False):
+    def execute_flow(self, custom_command="", is_config=False, pipelined=False, error_map=None):
         """ Execute flow which run custom command on device
 
         :param custom_command: the command to execute on device
         :param is_config: if True then run command in configuration mode
+        :param pipelined: if True then write commands by blocks without waiting for the prompt after each one.
+            Commands must not require any interaction (confirmation, etc.) and device must echo them.
+            Errors are detected only after the whole block is written, so the commands of the block following
+            the failed one are already applied on the device, the exception names the failed command number
+        :param error_map: expected error map with subclass of CommandExecutionException or str,
+            checked for the output of each command
         :return: command execution output
         """
 
@@ -128,6 +227,73 @@ class RunCommandFlow(BaseCliFlow):
         else:
             commands = custom_command
 
+        mode = self._get_command_mode(is_config)
+
+        with self._cli_handler.get_cli_service(mode) as session:
+            if pipelined:
+                self._clear_cached_mode(session)
+                for block_start in xrange(0, len(commands), self.PIPELINE_BLOCK_SIZE):
+                    block = commands[block_start:block_start + self.PIPELINE_BLOCK_SIZE]
+                    responses.extend(self._send_commands_block(session, block, error_map, first_number=block_start + 1))
+            else:
+                for cmd in commands:
+                    responses.append(session.send_command(command=cmd, error_map=error_map))
+        return '\n'.join(responses)
+
+    def execute_flow_streaming(self, custom_command="", is_config=False):
+        """ Execute flow which run custom command on device and yield output by chunks as they are received,
+        so the output of the commands like "show tech-support" is never kept in memory at once
+
+        :param custom_command: the command to execute on device
+        :param is_config: if True then run command in configuration mode
+        :return: chunks of the command execution output, outputs of the commands are separated by new line
+        :rtype: collections.Iterable[str]
+        """
+        if isinstance(custom_command, basestring):
+            commands = [custom_command]
+        else:
+            commands = list(custom_command)
+
+        mode = self._get_command_mode(is_config)
+
+        with self._cli_handler.get_cli_service(mode) as session:
+            self._clear_cached_mode(session)
+            for number, cmd in enumerate(commands):
+                if number:
+                    yield '\n'
+                for chunk in self._stream_command_output(session, cmd):
+                    yield chunk
+
+    def execute_flow_to_sink(self, sink, custom_command="", is_config=False):
+        """ Execute flow which run custom command on device and write output to the sink as it is received
+
+        :param sink: file-like object with write method
+        :param custom_command: the command to execute on device
+        :param is_config: if True then run command in configuration mode
+        :return: length of the written output
+        :rtype: int
+        """
+        output_length = 0
+        for chunk in self.execute_flow_streaming(custom_command=custom_command, is_config=is_config):
+            sink.write(chunk)
+            output_length += len(chunk)
+        return output_length
+
+    @staticmethod
+    def _clear_cached_mode(cli_service):
+        """Commands written directly to the session bypass send_command and can leave the command mode,
+        so the mode cached by ModeCachingCliService is dropped and determined by the prompt on the next checkout
+
+        :param cli_service:
+        """
+        ModeCachingCliService.clear_cached_mode(cli_service.session)
+
+    def _get_command_mode(self, is_config):
+        """Get config or enable mode of the CLI handler
+
+        :param bool is_config:
+        :rtype: CommandMode
+        """
         if is_config:
             mode = self._cli_handler.config_mode
             if not mode:
@@ -138,11 +304,124 @@ class RunCommandFlow(BaseCliFlow):
             if not mode:
                 raise Exception(self.__class__.__name__,
                                 "CliHandler configuration is missing. Enable Mode has to be defined")
+        return mode
 
-        with self._cli_handler.get_cli_service(mode) as session:
-            for cmd in commands:
-                responses.append(session.send_command(command=cmd))
-        return '\n'.join(responses)
+    def _stream_command_output(self, cli_service, command):
+        """Send command and yield output chunks until the prompt is received.
+        Only the output tail is kept to match the prompt, command echo is removed like send_command does
+
+        :param cli_service:
+        :param str command:
+        :rtype: collections.Iterable[str]
+        """
+        session = cli_service.session
+        prompt = re.compile(cli_service.command_mode.prompt, re.DOTALL)
+        command_pattern = re.compile(self._get_command_pattern(command), re.MULTILINE)
+
+        self._logger.debug("Command: {}".format(command))
+        session.send_line(command, self._logger)
+
+        # output is held back until the command echo is removed from it
+        echo_buffer = ""
+        tail = ""
+        idle_since = time.time()
+
+        while True:
+            try:
+                chunk = session._receive(self.STREAM_READ_TIMEOUT, self._logger)
+            except (SessionReadTimeout, SessionReadEmptyData):
+                if time.time() - idle_since > self.STREAM_IDLE_TIMEOUT:
+                    raise ExpectedSessionException(self.__class__.__name__,
+                                                   "No output for the command '{}' during {} sec".format(
+                                                       command, self.STREAM_IDLE_TIMEOUT))
+                continue
+
+            idle_since = time.time()
+            chunk = normalize_buffer(chunk)
+
+            if echo_buffer is not None:
+                echo_buffer += chunk
+                echo = command_pattern.search(echo_buffer)
+                if echo:
+                    chunk = echo_buffer[echo.end():]
+                elif len(echo_buffer) > self.STREAM_TAIL_SIZE or prompt.search(echo_buffer):
+                    # device doesn't echo the command
+                    chunk = echo_buffer
+                else:
+                    continue
+                echo_buffer = None
+
+            tail = (tail + chunk)[-self.STREAM_TAIL_SIZE:]
+            if chunk:
+                yield chunk
+
+            if prompt.search(tail):
+                return
+
+    @staticmethod
+    def _get_command_pattern(command):
+        """Pattern of the command echoed by the device, same as ExpectSession uses to remove command from output"""
+        return r"\s*" + re.sub(r"\\\s+", r"\s+", re.escape(command)) + r"\s*"
+
+    def _send_commands_block(self, cli_service, commands, error_map=None, first_number=1):
+        """Write all commands at once, wait for the prompt after the last one and split output by the command echoes.
+        Commands following the failed one are already written to the device when the error is detected
+
+        :param cli_service:
+        :param list[str] commands:
+        :param dict error_map: expected error map with subclass of CommandExecutionException or str
+        :param int first_number: number of the first command of the block in the executed commands
+        :return: output of the each command, ends with the prompt like the output of send_command
+        :rtype: list[str]
+        """
+        for cmd in commands:
+            self._logger.debug("Command: {}".format(cmd))
+            cli_service.session.send_line(cmd, self._logger)
+
+        expected_string = "{}.*{}".format(self._get_command_pattern(commands[-1]), cli_service.command_mode.prompt)
+        output = cli_service.session.hardware_expect(None, expected_string=expected_string, logger=self._logger)
+
+        echoes = []
+        position = 0
+        for cmd in commands:
+            echo = re.compile(self._get_command_pattern(cmd), re.MULTILINE).search(output, position)
+            if not echo:
+                raise CommandExecutionException("Cannot find command '{}' in the device output, "
+                                                "pipelined mode requires device to echo commands".format(cmd))
+            echoes.append(echo)
+            position = echo.end()
+
+        responses = []
+        for index, (echo, next_echo) in enumerate(zip(echoes, echoes[1:] + [None])):
+            response = output[echo.end():next_echo.start() if next_echo else len(output)]
+            self._check_errors(echo.group().strip(), response, error_map, number=first_number + index,
+                               applied_after=len(commands) - index - 1)
+            responses.append(response)
+
+        return responses
+
+    @staticmethod
+    def _check_errors(command, output, error_map, number, applied_after):
+        """Raise exception if command output matches any pattern from the error map, as ExpectSession does.
+        Exception names the number of the failed command and how many commands after it were already sent
+
+        :param str command:
+        :param str output: output of the command
+        :param dict error_map: expected error map with subclass of CommandExecutionException or str
+        :param int number: number of the command in the executed commands
+        :param int applied_after: number of the commands sent to the device after the failed one
+        """
+        for error_pattern, error in (error_map or {}).iteritems():
+            if re.search(error_pattern, output, re.DOTALL):
+                failed_command = "Command #{} '{}' failed, {} following commands were already sent to the device" \
+                    .format(number, command, applied_after)
+
+                if isinstance(error, CommandExecutionException):
+                    # error map is shared between the calls, so the mapped exception is copied
+                    error = copy.copy(error)
+                    error.args += (failed_command,)
+                    raise error
+                raise CommandExecutionException("{}, session returned '{}'".format(failed_command, error))
 
 
 class ShutdownFlow(BaseCliFlow):
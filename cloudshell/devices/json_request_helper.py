@@ -1,6 +1,9 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
+import json
+from collections import OrderedDict
+
 
 class JsonRequestDeserializer(object):
     def __init__(self, json):
@@ -28,3 +31,132 @@ class JsonRequestDeserializer(object):
     def _is_primitive(thing):
         primitive = (int, str, bool, float, unicode)
         return isinstance(thing, primitive)
+
+
+class _RequestRecord(object):
+    """Lightweight record built from the request json object. Only fields listed in __slots__ are kept"""
+
+    __slots__ = ()
+    _NESTED_FIELDS = {}
+    _LIST_FIELDS = {}
+
+    def __init__(self, data):
+        for field in self.__slots__:
+            value = data.get(field)
+            if field in self._NESTED_FIELDS:
+                if isinstance(value, dict):
+                    value = self._NESTED_FIELDS[field](value)
+            elif field in self._LIST_FIELDS:
+                record_class = self._LIST_FIELDS[field]
+                value = [record_class(item) if isinstance(item, dict) else item for item in value or []]
+            setattr(self, field, value)
+
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__,
+                               ", ".join("{}={!r}".format(field, getattr(self, field)) for field in self.__slots__))
+
+
+class ActionAttribute(_RequestRecord):
+    __slots__ = ("attributeName", "attributeValue", "type")
+
+
+class ActionTarget(_RequestRecord):
+    __slots__ = ("fullName", "fullAddress", "type")
+
+
+class ConnectionParams(_RequestRecord):
+    __slots__ = ("vlanId", "mode", "type", "vlanServiceAttributes")
+    _LIST_FIELDS = {"vlanServiceAttributes": ActionAttribute}
+
+
+class ConnectivityAction(_RequestRecord):
+    __slots__ = ("actionId", "type", "connectionId", "actionTarget", "connectionParams",
+                 "connectorAttributes", "customActionAttributes")
+    _NESTED_FIELDS = {"actionTarget": ActionTarget,
+                      "connectionParams": ConnectionParams}
+    _LIST_FIELDS = {"connectorAttributes": ActionAttribute,
+                    "customActionAttributes": ActionAttribute}
+
+
+class ConnectivityRequestDecoder(object):
+    """Decodes ApplyConnectivityChanges request json into ConnectivityAction records"""
+
+    def __init__(self, required_attributes):
+        """
+        :param list required_attributes: names of the mandatory action fields,
+            nested fields are passed as tuples, e.g. ("connectionParams", "mode")
+        """
+        self._required_fields, self._required_nested_fields = self._compile_schema(required_attributes)
+
+    @staticmethod
+    def _compile_schema(required_attributes):
+        """ Split required attributes into the top level fields and the fields of the nested objects,
+        fields order is kept to report the first missing one
+
+        :rtype: tuple[tuple[str], tuple[tuple[str, tuple[str]]]]
+        """
+        required_fields = OrderedDict()
+        required_nested_fields = OrderedDict()
+
+        for attribute in required_attributes:
+            if isinstance(attribute, tuple):
+                required_fields[attribute[0]] = None
+                required_nested_fields.setdefault(attribute[0], OrderedDict())[attribute[1]] = None
+            else:
+                required_fields[attribute] = None
+
+        return (tuple(required_fields),
+                tuple((key, tuple(fields)) for key, fields in required_nested_fields.iteritems()))
+
+    @staticmethod
+    def _get_missing_field(data, fields):
+        """ Get the first of the fields missing in the json object
+
+        :param dict data:
+        :param tuple[str] fields:
+        :rtype: str | None
+        """
+        for field in fields:
+            if field not in data:
+                return field
+
+    def _validate_action(self, action):
+        """ Check that action json object contains all required fields
+
+        :param dict action:
+        :raises ValueError: if some required field is missing
+        """
+        if not isinstance(action, dict):
+            raise ValueError("Action should be a json object, got {!r}".format(action))
+
+        missing_field = self._get_missing_field(action, self._required_fields)
+        if missing_field is None:
+            for key, fields in self._required_nested_fields:
+                nested = action[key]
+                missing_field = self._get_missing_field(nested, fields) if isinstance(nested, dict) else key
+                if missing_field is not None:
+                    break
+
+        if missing_field is not None:
+            raise ValueError("Mandatory field {0} is missing in ApplyConnectivityChanges request json".format(
+                missing_field))
+
+    def decode(self, request):
+        """ Decode and validate request json
+
+        :param str request: ApplyConnectivityChanges request json
+        :return: list of the request actions or None if request doesn't contain driver request
+        :rtype: list[ConnectivityAction] | None
+        :raises ValueError: if request is not a valid json or some action misses required field
+        """
+        data = json.loads(request)
+        driver_request = data.get("driverRequest") if isinstance(data, dict) else None
+
+        if not isinstance(driver_request, dict) or not isinstance(driver_request.get("actions"), list):
+            return None
+
+        actions = driver_request["actions"]
+        for action in actions:
+            self._validate_action(action)
+
+        return [ConnectivityAction(action) for action in actions]
@@ -1,9 +1,19 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
+from contextlib import contextmanager
 from functools import wraps
+from threading import Condition, Lock
+import time
 import jsonpickle
+from jsonpickle import handlers as jsonpickle_handlers, tags as jsonpickle_tags
+from jsonpickle.backend import JSONBackend
 from urlparse import urlsplit, urlunsplit
 
+from cloudshell.core.driver_response import DriverResponse
+from cloudshell.core.driver_response_root import DriverResponseRoot
+from cloudshell.shell.core.interfaces.save_restore import OrchestrationSaveResult, OrchestrationSavedArtifactInfo, \
+    OrchestrationRestoreRules, OrchestrationSavedArtifact
+
 
 def validate_vlan_number(number):
     try:
@@ -15,18 +25,252 @@ def validate_vlan_number(number):
 
 
 def validate_vlan_range(vlan_range):
-    result = None
-    for vlan in vlan_range.split(','):
-        if '-' in vlan:
-            for vlan_range_border in vlan.split('-'):
-                result = validate_vlan_number(vlan_range_border)
-        else:
-            result = validate_vlan_number(vlan)
-        if not result:
-            return False
+    try:
+        VlanSet.from_string(vlan_range)
+    except ValueError:
+        return False
     return True
 
 
+class VlanSet(object):
+    """Set of VLAN numbers stored as 4096-bit bitmap"""
+
+    __slots__ = ('_bitmap',)
+
+    MIN_VLAN_NUMBER = 1
+    MAX_VLAN_NUMBER = 4000
+
+    def __init__(self, bitmap=0):
+        """
+        :param long bitmap: bit N is set when VLAN N is in the set
+        """
+        self._bitmap = bitmap
+
+    @classmethod
+    def from_range(cls, start, end):
+        """Create set with all VLANs from start to end, including both of them
+
+        :param int start: first VLAN number
+        :param int end: last VLAN number
+        :rtype: VlanSet
+        """
+        return cls(((1 << (end - start + 1)) - 1) << start)
+
+    @classmethod
+    def from_string(cls, vlan_str):
+        """Parse VLANs string like "10-15,19,21-23". Reversed ranges like "15-10" are allowed
+
+        :param str vlan_str: comma separated VLAN numbers and ranges
+        :rtype: VlanSet
+        :raises ValueError: if VLAN number or VLANs range is not valid
+        """
+        bitmap = 0
+        for vlan in vlan_str.split(','):
+            if '-' in vlan:
+                try:
+                    start, end = map(cls._parse_vlan_number, vlan.split('-'))
+                except ValueError:
+                    raise ValueError('Wrong VLANs range detected {}'.format(vlan))
+                if start > end:
+                    start, end = end, start
+            else:
+                try:
+                    start = end = cls._parse_vlan_number(vlan)
+                except ValueError:
+                    raise ValueError('Wrong VLAN number detected {}'.format(vlan))
+
+            bitmap |= cls.from_range(start, end)._bitmap
+
+        return cls(bitmap)
+
+    @classmethod
+    def union(cls, *vlan_sets):
+        """Create set with VLANs from all given sets
+
+        :param VlanSet vlan_sets:
+        :rtype: VlanSet
+        """
+        bitmap = 0
+        for vlan_set in vlan_sets:
+            bitmap |= vlan_set._bitmap
+        return cls(bitmap)
+
+    @classmethod
+    def _parse_vlan_number(cls, number):
+        number = int(number)
+        if number < cls.MIN_VLAN_NUMBER or number > cls.MAX_VLAN_NUMBER:
+            raise ValueError('VLAN number {} is out of range'.format(number))
+        return number
+
+    def ranges(self):
+        """Compress set into the minimal list of VLAN ranges
+
+        :return: list of (start, end) tuples in ascending order
+        :rtype: list[tuple[int, int]]
+        """
+        result = []
+        bitmap = self._bitmap
+        while bitmap:
+            start = (bitmap & -bitmap).bit_length() - 1
+            shifted = bitmap >> start
+            length = (~shifted & (shifted + 1)).bit_length() - 1
+            result.append((start, start + length - 1))
+            bitmap &= ~(((1 << length) - 1) << start)
+        return result
+
+    def to_range_list(self):
+        """Compress set into the minimal list of VLAN ranges strings like ["10-15", "19"]
+
+        :rtype: list[str]
+        """
+        return [str(start) if start == end else '{}-{}'.format(start, end) for start, end in self.ranges()]
+
+    def __or__(self, other):
+        return VlanSet(self._bitmap | other._bitmap)
+
+    def __and__(self, other):
+        return VlanSet(self._bitmap & other._bitmap)
+
+    def __sub__(self, other):
+        return VlanSet(self._bitmap & ~other._bitmap)
+
+    def __contains__(self, vlan):
+        return bool(self._bitmap >> int(vlan) & 1)
+
+    def __iter__(self):
+        for start, end in self.ranges():
+            for vlan in xrange(start, end + 1):
+                yield vlan
+
+    def __len__(self):
+        return bin(self._bitmap).count('1')
+
+    def __nonzero__(self):
+        return bool(self._bitmap)
+
+    def __eq__(self, other):
+        return isinstance(other, VlanSet) and self._bitmap == other._bitmap
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._bitmap)
+
+    def __str__(self):
+        return ','.join(self.to_range_list())
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, str(self))
+
+
+class ResponseJsonEncoder(object):
+    """Encodes driver responses to the same json as jsonpickle.encode(response, unpicklable=False)
+
+    Only plain objects of the known response classes, lists, tuples and primitive values are supported,
+    all the other values raise UnsupportedJsonValue
+    """
+
+    # connectivity responses are added on the first use, see _get_connectivity_response_types
+    RESPONSE_TYPES = frozenset([DriverResponseRoot,
+                                DriverResponse,
+                                OrchestrationSaveResult,
+                                OrchestrationSavedArtifactInfo,
+                                OrchestrationRestoreRules,
+                                OrchestrationSavedArtifact])
+    PRIMITIVE_TYPES = frozenset([unicode, bool, float, int, long, type(None)])
+
+    class UnsupportedJsonValue(Exception):
+        pass
+
+    def __init__(self):
+        # jsonpickle.encode creates the same default backend on the each call
+        self._backend = JSONBackend()
+        self._response_types = None
+
+    @staticmethod
+    def _get_connectivity_response_types():
+        """Connectivity response classes, cloudshell-networking is an optional dependency
+
+        :rtype: frozenset
+        """
+        try:
+            from cloudshell.networking.apply_connectivity.models.connectivity_result import \
+                ConnectivityActionResult, ConnectivitySuccessResponse, ConnectivityErrorResponse
+        except ImportError:
+            return frozenset()
+
+        return frozenset([ConnectivityActionResult, ConnectivitySuccessResponse, ConnectivityErrorResponse])
+
+    @property
+    def response_types(self):
+        """Response classes handled by the encoder
+
+        :rtype: frozenset
+        """
+        if self._response_types is None:
+            self._response_types = self.RESPONSE_TYPES | self._get_connectivity_response_types()
+        return self._response_types
+
+    def is_supported(self, value):
+        """Check whether value is a response object handled by the encoder
+
+        :rtype: bool
+        """
+        return type(value) in self.response_types
+
+    def encode(self, value):
+        """Encode response object to json
+
+        :raises UnsupportedJsonValue: if response contains values jsonpickle would encode in other way
+        :rtype: str
+        """
+        return self._backend.encode(self._flatten(value, set()))
+
+    def _flatten(self, value, seen):
+        """Convert value to the json-friendly object
+
+        :param value:
+        :param set seen: ids of the already flattened lists and objects,
+            jsonpickle encodes them as references on the next occurrence
+        """
+        value_type = type(value)
+
+        if value_type in self.PRIMITIVE_TYPES:
+            return value
+
+        if value_type is str:
+            try:
+                return value.decode("utf-8")
+            except UnicodeDecodeError:
+                raise self.UnsupportedJsonValue(value)
+
+        if value_type is tuple:
+            return [self._flatten(item, seen) for item in value]
+
+        if value_type is list or (value_type in self.response_types and jsonpickle_handlers.get(value_type) is None):
+            if id(value) in seen:
+                raise self.UnsupportedJsonValue(value)
+            seen.add(id(value))
+
+            if value_type is list:
+                return [self._flatten(item, seen) for item in value]
+
+            # keys are inserted in the same sorted order as jsonpickle does, so the dict is iterated in the same order
+            attributes = value.__dict__
+            data = {}
+            for key in sorted(attributes):
+                if key in jsonpickle_tags.RESERVED:
+                    raise self.UnsupportedJsonValue(value)
+                data[key] = self._flatten(attributes[key], seen)
+            return data
+
+        raise self.UnsupportedJsonValue(value)
+
+
+_response_json_encoder = ResponseJsonEncoder()
+
+
 def serialize_to_json(result, unpicklable=False):
     """Serializes output as JSON and writes it to console output wrapped with special prefix and suffix
 
@@ -35,6 +279,12 @@ def serialize_to_json(result, unpicklable=False):
                         When False will be deserialized as dictionary
     """
 
+    if not unpicklable and _response_json_encoder.is_supported(result):
+        try:
+            return str(_response_json_encoder.encode(result))
+        except ResponseJsonEncoder.UnsupportedJsonValue:
+            pass
+
     json = jsonpickle.encode(result, unpicklable=unpicklable)
     result_for_output = str(json)
     return result_for_output
@@ -127,3 +377,86 @@ def command_logging(func):
 
         return result
     return wrapped
+
+
+class _KeyLock(object):
+    """State of the lock for the one key"""
+
+    __slots__ = ("condition", "users", "locked")
+
+    def __init__(self, lock):
+        self.condition = Condition(lock)
+        # threads holding or waiting for the lock
+        self.users = 0
+        self.locked = False
+
+
+class KeyedLock(object):
+    """Set of locks identified by keys, e.g. port names.
+    Lock for the key exists only while someone holds it or waits for it"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._locks = {}
+
+    def acquire(self, key, timeout=None):
+        """Acquire lock for the key, blocks while lock is held by another thread
+
+        :param key: hashable lock identifier
+        :param float timeout: max seconds to wait for the lock, waits forever if None
+        :return: whether lock was acquired
+        :rtype: bool
+        """
+        deadline = None if timeout is None else time.time() + timeout
+
+        with self._lock:
+            key_lock = self._locks.get(key)
+            if key_lock is None:
+                key_lock = self._locks[key] = _KeyLock(self._lock)
+            key_lock.users += 1
+
+            while key_lock.locked:
+                if deadline is None:
+                    key_lock.condition.wait()
+                    continue
+
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self._remove_user(key, key_lock)
+                    return False
+                key_lock.condition.wait(remaining)
+
+            key_lock.locked = True
+            return True
+
+    def release(self, key):
+        """Release lock for the key acquired by the acquire method
+
+        :param key: hashable lock identifier
+        """
+        with self._lock:
+            key_lock = self._locks[key]
+            key_lock.locked = False
+            key_lock.condition.notify()
+            self._remove_user(key, key_lock)
+
+    def _remove_user(self, key, key_lock):
+        key_lock.users -= 1
+        if not key_lock.users:
+            del self._locks[key]
+
+    @contextmanager
+    def lock(self, key):
+        """Acquire lock for the key, blocks while lock is held by another thread
+
+        :param key: hashable lock identifier
+        """
+        self.acquire(key)
+        try:
+            yield
+        finally:
+            self.release(key)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._locks)
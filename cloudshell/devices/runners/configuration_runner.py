@@ -9,6 +9,7 @@ import time
 from abc import abstractproperty
 from posixpath import join
 
+from cloudshell.devices.credentials_cache import PASSWORD_CACHE
 from cloudshell.devices.json_request_helper import JsonRequestDeserializer
 from cloudshell.devices.networking_utils import UrlParser, serialize_to_json, command_logging
 from cloudshell.devices.runners.interfaces.configuration_runner_interface import ConfigurationOperationsInterface
@@ -221,7 +222,8 @@ class ConfigurationRunner(ConfigurationOperationsInterface):
             if UrlParser.USERNAME not in url or not url[UrlParser.USERNAME]:
                 url[UrlParser.USERNAME] = self.resource_config.backup_user
             if UrlParser.PASSWORD not in url or not url[UrlParser.PASSWORD]:
-                url[UrlParser.PASSWORD] = self._api.DecryptPassword(self.resource_config.backup_password).Value
+                url[UrlParser.PASSWORD] = PASSWORD_CACHE.decrypt_password(self._api,
+                                                                          self.resource_config.backup_password)
         try:
             result = UrlParser.build_url(url)
         except Exception as e:
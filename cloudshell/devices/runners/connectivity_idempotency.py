@@ -0,0 +1,36 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from cloudshell.devices.ttl_cache import TTLCache
+
+
+class ConnectivityIdempotencyCache(TTLCache):
+    """Results of the successfully applied connectivity actions, bounded by TTL and size with LRU eviction
+
+    Share one instance between the runners to skip device configuration
+    when CloudShell retries ApplyConnectivityChanges with the same actions
+    """
+
+    DEFAULT_TTL = 300
+    DEFAULT_MAX_SIZE = 10000
+
+    def get(self, key, default=None):
+        """Get cached action results
+
+        :param tuple key: action id and hash of the action payload
+        :return: list of (success, message) tuples or default if there is no valid entry for the key
+        :rtype: list[tuple[bool, str]] | None
+        """
+        results = super(ConnectivityIdempotencyCache, self).get(key)
+        if results is None:
+            return default
+
+        return list(results)
+
+    def set(self, key, results):
+        """Cache action results
+
+        :param tuple key: action id and hash of the action payload
+        :param list[tuple[bool, str]] results:
+        """
+        super(ConnectivityIdempotencyCache, self).set(key, tuple(results))
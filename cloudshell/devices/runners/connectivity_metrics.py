@@ -0,0 +1,76 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from collections import defaultdict
+from threading import Lock
+
+
+class FlowMetrics(object):
+    """Timings and outcome of the one VLAN flow invocation"""
+
+    __slots__ = ("flow_name", "vlan_id", "port_name", "action_ids", "wait_time", "execution_time", "success")
+
+    def __init__(self, flow_name, vlan_id, port_name, action_ids, wait_time, execution_time, success):
+        """
+        :param str flow_name: name of the runner method, e.g. add_vlan, remove_vlan_batch
+        :param vlan_id: VLAN range or list of VLAN ranges passed to the flow
+        :param str port_name: full port name
+        :param list[str] action_ids: ids of the request actions the flow was executed for
+        :param float wait_time: seconds from the moment the flow could start (previous flow of the port completed)
+            until it started, i.e. waiting for a free worker and for the port lock held by the other requests
+        :param float execution_time: seconds the flow was executing, including CLI session checkout
+        :param bool success: whether flow was executed successfully
+        """
+        self.flow_name = flow_name
+        self.vlan_id = vlan_id
+        self.port_name = port_name
+        self.action_ids = action_ids
+        self.wait_time = wait_time
+        self.execution_time = execution_time
+        self.success = success
+
+    def __str__(self):
+        return "{flow} VLAN {vlan} on {port}: wait {wait:.3f}s, execution {execution:.3f}s, {outcome}".format(
+            flow=self.flow_name,
+            vlan=self.vlan_id,
+            port=self.port_name,
+            wait=self.wait_time,
+            execution=self.execution_time,
+            outcome="success" if self.success else "failed")
+
+
+class ConnectivityMetricsSink(object):
+    """Receives metrics of the each VLAN flow invocation. Override record method to export them"""
+
+    def record(self, flow_metrics):
+        """Record metrics of the VLAN flow invocation. Called from the worker threads
+
+        :param FlowMetrics flow_metrics:
+        """
+        pass
+
+
+class ConnectivityMetricsCollector(ConnectivityMetricsSink):
+    """Keeps metrics of the VLAN flow invocations grouped by the request action id"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._metrics = defaultdict(list)
+
+    def record(self, flow_metrics):
+        with self._lock:
+            for action_id in flow_metrics.action_ids:
+                self._metrics[action_id].append(flow_metrics)
+
+    def get(self, action_id):
+        """Get metrics of the all VLAN flows executed for the action
+
+        :param str action_id: id of the request action
+        :rtype: list[FlowMetrics]
+        """
+        with self._lock:
+            return list(self._metrics.get(action_id, []))
+
+    def clear(self):
+        with self._lock:
+            self._metrics.clear()
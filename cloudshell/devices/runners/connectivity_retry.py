@@ -0,0 +1,141 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import random
+import socket
+import time
+from threading import Lock
+
+from cloudshell.cli.cli_exception import CliException
+from cloudshell.cli.session.session_exceptions import SessionException, ExpectedSessionException, SessionReadTimeout
+from cloudshell.cli.session_pool_manager import SessionPoolException
+
+
+class RetryPolicy(object):
+    """Number of attempts and delays between them for the VLAN flows failed with transient errors"""
+
+    # connection and session errors, device may respond on the next attempt
+    TRANSIENT_ERRORS = (CliException, SessionException, socket.error, EOFError)
+    # errors reported by the device itself, e.g. failed command, there is no sense to retry them
+    PERMANENT_ERRORS = (ExpectedSessionException,)
+
+    def __init__(self, attempts=1, backoff=1.0, backoff_factor=2.0, max_backoff=30.0, jitter=0.5):
+        """
+        :param int attempts: max number of the flow attempts, 1 disables retries
+        :param float backoff: seconds to wait before the second attempt
+        :param float backoff_factor: multiplier of the delay for the each next attempt
+        :param float max_backoff: max seconds to wait between attempts
+        :param float jitter: part of the delay that is randomized, from 0 to 1
+        """
+        self.attempts = attempts
+        self.backoff = backoff
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+
+    def is_transient(self, exception):
+        """Check whether flow failed with the error that may disappear on the next attempt
+
+        :param Exception exception:
+        :rtype: bool
+        """
+        return isinstance(exception, self.TRANSIENT_ERRORS) and not isinstance(exception, self.PERMANENT_ERRORS)
+
+    def get_delay(self, attempt):
+        """Get seconds to wait after the failed attempt
+
+        :param int attempt: number of the failed attempt, starting from 1
+        :rtype: float
+        """
+        delay = min(self.backoff * self.backoff_factor ** (attempt - 1), self.max_backoff)
+        return delay * (1 - self.jitter * random.random())
+
+
+class DeviceCircuitBreaker(object):
+    """Fails VLAN flows fast for the device which is clearly unreachable
+
+    Breaker opens for the device after the number of the consecutive transient failures.
+    Once reset timeout is over, one trial flow is allowed, it closes the breaker on success
+    or keeps it open for the next reset timeout on failure
+    """
+
+    # connection and session errors
+    UNREACHABLE_ERRORS = (CliException, SessionException, socket.error, EOFError)
+    # errors reported by the device itself
+    DEVICE_ERRORS = (ExpectedSessionException,)
+    # errors which don't tell whether device is reachable: local session pool is exhausted, command is slow
+    INCONCLUSIVE_ERRORS = (SessionPoolException, SessionReadTimeout)
+
+    def __init__(self, failure_threshold=3, reset_timeout=60, timer=time.time):
+        """
+        :param int failure_threshold: number of the consecutive transient failures which open the breaker
+        :param float reset_timeout: seconds the breaker stays open before the trial flow is allowed
+        :param timer: function returning current time in seconds
+        """
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._timer = timer
+        self._lock = Lock()
+        # device name -> [consecutive failures count, time when breaker was opened or None]
+        self._devices = {}
+
+    def allow(self, device_name):
+        """Check whether flow can be executed on the device
+
+        :param str device_name:
+        :rtype: bool
+        """
+        with self._lock:
+            state = self._devices.get(device_name)
+            if state is None or state[1] is None:
+                return True
+
+            now = self._timer()
+            if now - state[1] < self._reset_timeout:
+                return False
+
+            # allow one trial flow, the others wait for its result
+            state[1] = now
+            return True
+
+    def is_open(self, device_name):
+        """
+        :param str device_name:
+        :rtype: bool
+        """
+        with self._lock:
+            state = self._devices.get(device_name)
+            return state is not None and state[1] is not None
+
+    def record_reachable(self, device_name):
+        """Close the breaker, device responded to the flow
+
+        :param str device_name:
+        """
+        with self._lock:
+            self._devices.pop(device_name, None)
+
+    def record_failure(self, device_name, exception):
+        """Count the failed flow according to its error
+
+        :param str device_name:
+        :param Exception exception: error of the last flow attempt
+        """
+        if isinstance(exception, self.INCONCLUSIVE_ERRORS):
+            return
+
+        if isinstance(exception, self.UNREACHABLE_ERRORS) and not isinstance(exception, self.DEVICE_ERRORS):
+            self.record_unreachable(device_name)
+        else:
+            self.record_reachable(device_name)
+
+    def record_unreachable(self, device_name):
+        """Count the transient failure of the flow, open the breaker if threshold is reached
+
+        :param str device_name:
+        """
+        with self._lock:
+            state = self._devices.setdefault(device_name, [0, None])
+            state[0] += 1
+            if state[0] >= self._failure_threshold:
+                state[1] = self._timer()
@@ -1,34 +1,174 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
+import hashlib
+import time
 import traceback
 
-import jsonpickle
-
 from abc import abstractproperty
-from collections import defaultdict
-from threading import Thread, current_thread
+from collections import defaultdict, deque, OrderedDict
+from threading import Condition, Event, Lock, Thread, local
 
 from cloudshell.core.driver_response import DriverResponse
 from cloudshell.core.driver_response_root import DriverResponseRoot
 from cloudshell.networking.apply_connectivity.models.connectivity_result import ConnectivityErrorResponse, \
     ConnectivitySuccessResponse
-from cloudshell.devices.json_request_helper import JsonRequestDeserializer
-from cloudshell.devices.networking_utils import serialize_to_json, validate_vlan_range, \
-    validate_vlan_number, command_logging
+from cloudshell.devices.flows.cli_action_flows import AddVlanFlow, RemoveVlanFlow
+from cloudshell.devices.json_request_helper import ConnectivityRequestDecoder
+from cloudshell.devices.networking_utils import serialize_to_json, command_logging, VlanSet, KeyedLock
+from cloudshell.devices.runners.connectivity_retry import RetryPolicy
+from cloudshell.devices.runners.connectivity_metrics import ConnectivityMetricsSink, FlowMetrics
 from cloudshell.devices.runners.interfaces.connectivity_runner_interface import ConnectivityOperationsInterface
 
 
+class ConnectivityActionResults(object):
+    """ Thread-safe container of the VLAN flows results collected for the one request """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._results = defaultdict(list)
+
+    def add(self, action_ids, success, message):
+        """ Add result of the VLAN flow to the each action it was executed for
+
+        :param list[str] action_ids: ids of the request actions
+        :param bool success: whether flow was executed successfully
+        :param str message: flow output or error message
+        """
+
+        with self._lock:
+            for action_id in action_ids:
+                self._results[action_id].append((success, message))
+
+    def get(self, action_id):
+        """ Get all results collected for the action
+
+        :param str action_id: id of the request action
+        :return: list of (success, message) tuples
+        :rtype: list[tuple[bool, str]]
+        """
+
+        with self._lock:
+            return list(self._results.get(action_id, []))
+
+
+class PortTaskQueue(object):
+    """ Queue of the VLAN tasks. Tasks for the same port are given out one by one,
+    tasks for the different ports can be executed in parallel """
+
+    def __init__(self, task_list):
+        """
+        :param list[tuple] task_list: list of (target, args, action_ids) tuples, args[1] is a port name
+        """
+
+        self._condition = Condition()
+        self._port_tasks = OrderedDict()
+        for task in task_list:
+            self._port_tasks.setdefault(task[1][1], deque()).append(task)
+
+        self._ready_ports = deque(self._port_tasks)
+        # time when the next task of the port became available to the workers
+        self._ready_since = dict.fromkeys(self._port_tasks, time.time())
+        self._in_progress = {}
+        self.ports_count = len(self._port_tasks)
+        self.cancelled = Event()
+
+    def get(self):
+        """ Get next task for the port without task in progress. Blocks until such task is available
+
+        :return: (port_name, task, ready_time) tuple or None if there are no more tasks,
+            ready_time is when the task became available, i.e. previous task of the port was completed
+        :rtype: tuple
+        """
+
+        with self._condition:
+            while not self._ready_ports:
+                if not self._port_tasks:
+                    return None
+                self._condition.wait()
+
+            port_name = self._ready_ports.popleft()
+            task = self._port_tasks[port_name].popleft()
+            self._in_progress[port_name] = task
+            return port_name, task, self._ready_since.pop(port_name)
+
+    def task_done(self, port_name):
+        """ Mark task for the port as completed, next task for the port becomes available
+
+        :param str port_name: full port name
+        """
+
+        with self._condition:
+            self._in_progress.pop(port_name, None)
+            if self._port_tasks.get(port_name):
+                self._ready_ports.append(port_name)
+                self._ready_since[port_name] = time.time()
+            else:
+                self._port_tasks.pop(port_name, None)
+            self._condition.notify_all()
+
+    def cancel(self, report=None):
+        """ Drop all tasks which are not started yet, workers get None on the next get call
+
+        :param report: function called with not started tasks and tasks in progress, the other cancel calls
+            wait until it returns, so the tasks are reported before any of them returns
+        :return: not started tasks and tasks in progress, both are empty if queue is already cancelled
+        :rtype: tuple[list[tuple], list[tuple]]
+        """
+
+        with self._condition:
+            if self.cancelled.is_set():
+                return [], []
+
+            self.cancelled.set()
+            not_started = [task for tasks in self._port_tasks.itervalues() for task in tasks]
+            in_progress = self._in_progress.values()
+            self._port_tasks.clear()
+            self._ready_ports.clear()
+            self._ready_since.clear()
+            self._condition.notify_all()
+
+            if report is not None:
+                report(not_started, in_progress)
+
+        return not_started, in_progress
+
+
 class ConnectivityRunner(ConnectivityOperationsInterface):
     IS_VLAN_RANGE_SUPPORTED = True
+    CANCEL_OPPOSITE_VLAN_ACTIONS = True
+    # Push only VLANs missing on the port (or present on it for removal), requires get_port_vlans_flow
+    RECONCILE_VLANS = False
+    DEFAULT_CONCURRENCY_LIMIT = 1
+    # Changes of the same port are serialized across all requests in the process
+    PORT_LOCKS = KeyedLock()
+    # Single attempt by default, override to retry VLAN flows failed with transient CLI errors
+    RETRY_POLICY = RetryPolicy()
+    # Disabled by default, set DeviceCircuitBreaker to fail fast VLAN flows of the unreachable devices,
+    # e.g. shared instance tracks devices across all requests in the process
+    CIRCUIT_BREAKER = None
+    # Seconds the whole request may take, VLAN flows not completed in time are reported as failed. No limit if None
+    REQUEST_TIMEOUT = None
     APPLY_CONNECTIVITY_CHANGES_ACTION_REQUIRED_ATTRIBUTE_LIST = ["type", "actionId",
                                                                  ("connectionParams", "mode"),
                                                                  ("actionTarget", "fullAddress")]
 
-    def __init__(self, logger, cli_handler):
+    def __init__(self, logger, cli_handler, metrics_sink=None, idempotency_cache=None):
+        """
+        :param logger:
+        :param cli_handler:
+        :param ConnectivityMetricsSink metrics_sink: receives timings and outcome of the each VLAN flow invocation
+        :param ConnectivityIdempotencyCache idempotency_cache: results of the already applied actions,
+            retried actions with the same id and payload are not applied on the device again. Disabled if None
+        """
+
         self._logger = logger
-        self.result = defaultdict(list)
         self._cli_handler = cli_handler
+        self._metrics_sink = metrics_sink or ConnectivityMetricsSink()
+        self._idempotency_cache = idempotency_cache
+        # request deadline of the worker thread, used to stop retries which can't complete in time
+        self._worker_state = local()
+        self._request_decoder = ConnectivityRequestDecoder(self.APPLY_CONNECTIVITY_CHANGES_ACTION_REQUIRED_ATTRIBUTE_LIST)
 
     @property
     def cli_handler(self):
@@ -38,6 +178,21 @@ class ConnectivityRunner(ConnectivityOperationsInterface):
 
         return self._cli_handler
 
+    @property
+    def concurrency_limit(self):
+        """ Max number of VLAN flows executed in parallel, taken from the "Sessions Concurrency Limit" attribute
+        :return: number of worker threads
+        :rtype: int
+        """
+
+        resource_config = getattr(self._cli_handler, "resource_config", None)
+        try:
+            limit = int(float(resource_config.sessions_concurrency_limit))
+        except (AttributeError, TypeError, ValueError):
+            limit = self.DEFAULT_CONCURRENCY_LIMIT
+
+        return max(limit, 1)
+
     @abstractproperty
     def add_vlan_flow(self):
         """ Get Add VLAN flow property
@@ -54,6 +209,14 @@ class ConnectivityRunner(ConnectivityOperationsInterface):
 
         pass
 
+    @property
+    def get_port_vlans_flow(self):
+        """ Get port VLANs flow property, used when RECONCILE_VLANS is True
+        :return: GetPortVlansFlow object or None if reading of the port VLANs is not supported
+        """
+
+        return None
+
     @command_logging
     def apply_connectivity_changes(self, request):
         """ Handle apply connectivity changes request json, trigger add or remove vlan methods,
@@ -67,24 +230,41 @@ class ConnectivityRunner(ConnectivityOperationsInterface):
         if request is None or request == "":
             raise Exception(self.__class__.__name__, "request is None or empty")
 
-        holder = JsonRequestDeserializer(jsonpickle.decode(request))
+        deadline = None if self.REQUEST_TIMEOUT is None else time.time() + self.REQUEST_TIMEOUT
+
+        try:
+            actions = self._request_decoder.decode(request)
+        except ValueError as e:
+            raise Exception(self.__class__.__name__, str(e))
 
-        if not holder or not hasattr(holder, "driverRequest"):
+        if actions is None:
             raise Exception(self.__class__.__name__, "Deserialized request is None or empty")
 
         driver_response = DriverResponse()
-        add_vlan_thread_list = []
-        remove_vlan_thread_list = []
+        results = ConnectivityActionResults()
+        add_vlan_list = []
+        remove_vlan_list = []
         driver_response_root = DriverResponseRoot()
 
-        for action in holder.driverRequest.actions:
-            self._logger.info("Action: ", action.__dict__)
-            self._validate_request_action(action)
+        cacheable_actions = []
+
+        for action in actions:
+            self._logger.info("Action: {}".format(action))
 
             action_id = action.actionId
             full_name = action.actionTarget.fullName
             port_mode = action.connectionParams.mode.lower()
 
+            if self._idempotency_cache is not None and action.type in ("setVlan", "removeVlan"):
+                idempotency_key = self._get_idempotency_key(action)
+                cached_results = self._idempotency_cache.get(idempotency_key)
+                if cached_results is not None:
+                    self._logger.info("Action {} was already applied, using cached result".format(action_id))
+                    for success, message in cached_results:
+                        results.add([action_id], success, message)
+                    continue
+                cacheable_actions.append((action_id, idempotency_key))
+
             if action.type == "setVlan":
                 qnq = False
                 ctag = ""
@@ -94,41 +274,33 @@ class ConnectivityRunner(ConnectivityOperationsInterface):
                     if attribute.attributeName.lower() == "ctag":
                         ctag = attribute.attributeValue
 
-                for vlan_id in self._get_vlan_list(action.connectionParams.vlanId):
-                    add_vlan_thread = Thread(target=self.add_vlan,
-                                             name=action_id,
-                                             args=(vlan_id, full_name, port_mode, qnq, ctag))
-                    add_vlan_thread_list.append(add_vlan_thread)
+                vlan_set = self._get_vlan_set(action.connectionParams.vlanId)
+                add_vlan_list.append((action_id, vlan_set, full_name, port_mode, qnq, ctag))
             elif action.type == "removeVlan":
-                for vlan_id in self._get_vlan_list(action.connectionParams.vlanId):
-                    remove_vlan_thread = Thread(target=self.remove_vlan,
-                                                name=action_id,
-                                                args=(vlan_id, full_name, port_mode,))
-                    remove_vlan_thread_list.append(remove_vlan_thread)
+                vlan_set = self._get_vlan_set(action.connectionParams.vlanId)
+                remove_vlan_list.append((action_id, vlan_set, full_name, port_mode))
             else:
-                self._logger.warning("Undefined action type determined '{}': {}".format(action.type, action.__dict__))
+                self._logger.warning("Undefined action type determined '{}': {}".format(action.type, action))
                 continue
 
-        # Start all created remove_vlan_threads
-        for thread in remove_vlan_thread_list:
-            thread.start()
+        remove_vlan_plan, add_vlan_plan = self._plan_vlan_changes(remove_vlan_list, add_vlan_list, results)
 
-        # Join all remove_vlan_threads. Main thread will wait completion of all remove_vlan_thread
-        for thread in remove_vlan_thread_list:
-            thread.join()
+        # Tasks of the same port are executed in order, so port removes are completed before its first add starts,
+        # while the other ports go on independently
+        self._run_tasks(self._get_remove_vlan_tasks(remove_vlan_plan) + self._get_add_vlan_tasks(add_vlan_plan),
+                        results,
+                        deadline)
 
-        # Start all created add_vlan_threads
-        for thread in add_vlan_thread_list:
-            thread.start()
-
-        # Join all add_vlan_threads. Main thread will wait completion of all add_vlan_thread
-        for thread in add_vlan_thread_list:
-            thread.join()
+        for action_id, idempotency_key in cacheable_actions:
+            action_results = results.get(action_id)
+            if all(success for success, _ in action_results):
+                self._idempotency_cache.set(idempotency_key, action_results)
 
         request_result = []
-        for action in holder.driverRequest.actions:
-            result_statuses, message = zip(*self.result.get(action.actionId))
-            if all(result_statuses):
+        for action in actions:
+            action_results = results.get(action.actionId)
+            message = [action_message for _, action_message in action_results]
+            if all(success for success, _ in action_results):
                 action_result = ConnectivitySuccessResponse(action,
                                                             "Add Vlan {vlan} configuration successfully completed"
                                                             .format(vlan=action.connectionParams.vlanId))
@@ -144,6 +316,378 @@ class ConnectivityRunner(ConnectivityOperationsInterface):
         driver_response_root.driverResponse = driver_response
         return serialize_to_json(driver_response_root)  # .replace("[true]", "true")
 
+    @staticmethod
+    def _get_idempotency_key(action):
+        """ Get key of the action in the idempotency cache
+
+        :param ConnectivityAction action:
+        :return: action id and hash of the action payload
+        :rtype: tuple
+        """
+        return action.actionId, hashlib.sha1(repr(action)).hexdigest()
+
+    @staticmethod
+    def _group_vlan_changes(vlan_list):
+        """ Group VLAN changes with the same port and port settings requested by the different actions
+
+        :param list[tuple] vlan_list: list of (action_id, vlan_set, full_name, port_mode, ...) tuples
+        :return: ordered dict {(full_name, port_mode, ...): [(action_id, vlan_set)]}
+        :rtype: OrderedDict
+        """
+
+        port_changes = OrderedDict()
+        for item in vlan_list:
+            port_changes.setdefault(item[2:], []).append((item[0], item[1]))
+
+        return port_changes
+
+    def _build_vlan_plan(self, port_changes):
+        """ Split VLANs requested for the each port into VLAN ranges (or VLANs if ranges are not supported)
+        and map them to the actions which requested them
+
+        :param OrderedDict port_changes: {(full_name, port_mode, ...): [(action_id, vlan_set)]}
+        :return: ordered dict {(vlan_id, full_name, port_mode, ...): [action_ids]}
+        :rtype: OrderedDict
+        """
+
+        vlan_plan = OrderedDict()
+        for port_settings, action_vlans in port_changes.iteritems():
+            port_vlan_set = VlanSet.union(*[vlan_set for _, vlan_set in action_vlans])
+            for vlan_id, unit_vlan_set in self._split_vlan_set(port_vlan_set):
+                action_ids = vlan_plan.setdefault((vlan_id,) + port_settings, [])
+                for action_id, vlan_set in action_vlans:
+                    if action_id not in action_ids and vlan_set & unit_vlan_set:
+                        action_ids.append(action_id)
+
+        return vlan_plan
+
+    def _plan_vlan_changes(self, remove_vlan_list, add_vlan_list, results):
+        """ Build per-port plan of the VLAN changes. Overlapping and duplicated changes are merged, removal of the VLAN
+        which is added to the same port in the same port mode is skipped and reported as completed.
+        With RECONCILE_VLANS only the difference with the current port VLANs is planned
+
+        :param list[tuple] remove_vlan_list: list of (action_id, vlan_set, full_name, port_mode) tuples
+        :param list[tuple] add_vlan_list: list of (action_id, vlan_set, full_name, port_mode, qnq, c_tag) tuples
+        :param ConnectivityActionResults results: request results container
+        :return: remove and add VLAN plans {(vlan_id, full_name, port_mode, ...): [action_ids]}
+        :rtype: tuple[OrderedDict, OrderedDict]
+        """
+
+        remove_port_changes = self._group_vlan_changes(remove_vlan_list)
+        add_port_changes = self._group_vlan_changes(add_vlan_list)
+
+        if self.CANCEL_OPPOSITE_VLAN_ACTIONS:
+            for (full_name, port_mode, qnq, c_tag), add_action_vlans in add_port_changes.iteritems():
+                remove_action_vlans = remove_port_changes.get((full_name, port_mode))
+                # QinQ configuration can't be skipped, remove action may tear down port tunnel settings
+                if qnq or not remove_action_vlans:
+                    continue
+
+                readded_vlan_set = (VlanSet.union(*[vlan_set for _, vlan_set in remove_action_vlans]) &
+                                    VlanSet.union(*[vlan_set for _, vlan_set in add_action_vlans]))
+                if not readded_vlan_set:
+                    continue
+
+                # removes are executed before adds, so VLAN will be present on the port anyway
+                for index, (action_id, vlan_set) in enumerate(remove_action_vlans):
+                    if vlan_set & readded_vlan_set:
+                        message = ("VLAN {vlan} is added back to {port} by the same request, "
+                                   "removal is skipped".format(vlan=vlan_set & readded_vlan_set, port=full_name))
+                        results.add([action_id], True, message)
+                        remove_action_vlans[index] = (action_id, vlan_set - readded_vlan_set)
+
+        if self.RECONCILE_VLANS:
+            self._reconcile_vlan_changes(remove_port_changes, add_port_changes, results)
+
+        return self._build_vlan_plan(remove_port_changes), self._build_vlan_plan(add_port_changes)
+
+    def _get_port_vlans(self, port_names):
+        """ Read current port mode and VLANs of the ports with get_port_vlans_flow
+
+        :param list[str] port_names: full port names
+        :return: dict {full_name: (port_mode, VlanSet)}, port mode is None if flow didn't return it,
+            ports with unknown VLANs are missing
+        :rtype: dict
+        """
+
+        flow = self.get_port_vlans_flow
+        if flow is None:
+            return {}
+
+        try:
+            flow_result = flow.execute_flow(port_names=port_names) or {}
+        except Exception:
+            self._logger.warning("Failed to read port VLANs, reconciliation is skipped: {}".format(
+                traceback.format_exc()))
+            return {}
+
+        port_vlans = {}
+        for full_name, vlans in flow_result.iteritems():
+            port_mode = None
+            if isinstance(vlans, tuple):
+                port_mode, vlans = vlans
+                port_mode = port_mode and port_mode.lower()
+            if isinstance(vlans, VlanSet):
+                port_vlans[full_name] = port_mode, vlans
+                continue
+            try:
+                port_vlans[full_name] = port_mode, VlanSet.from_string(vlans)
+            except (TypeError, ValueError):
+                self._logger.warning("Unable to parse VLANs {!r} of the port {}, reconciliation is skipped".format(
+                    vlans, full_name))
+
+        return port_vlans
+
+    def _reconcile_vlan_changes(self, remove_port_changes, add_port_changes, results):
+        """ Exclude VLANs which are already absent on the port from the removal
+        and VLANs which will be still present on the port in the same port mode after removal from the addition.
+        Port VLANs are read once for the request
+
+        :param OrderedDict remove_port_changes: {(full_name, port_mode): [(action_id, vlan_set)]}
+        :param OrderedDict add_port_changes: {(full_name, port_mode, qnq, c_tag): [(action_id, vlan_set)]}
+        :param ConnectivityActionResults results: request results container
+        """
+
+        port_names = OrderedDict()
+        for port_settings in remove_port_changes.keys() + add_port_changes.keys():
+            port_names[port_settings[0]] = None
+
+        port_vlans = self._get_port_vlans(port_names.keys())
+        if not port_vlans:
+            return
+
+        for (full_name, _), action_vlans in remove_port_changes.iteritems():
+            current_port_mode, current_vlan_set = port_vlans.get(full_name, (None, None))
+            if current_vlan_set is None:
+                continue
+
+            for index, (action_id, vlan_set) in enumerate(action_vlans):
+                absent_vlan_set = vlan_set - current_vlan_set
+                if absent_vlan_set:
+                    results.add([action_id], True, "VLAN {vlan} is not configured on {port}, no changes required"
+                                .format(vlan=absent_vlan_set, port=full_name))
+                    action_vlans[index] = (action_id, vlan_set & current_vlan_set)
+
+            port_vlans[full_name] = (current_port_mode,
+                                     current_vlan_set - VlanSet.union(*[vlan_set for _, vlan_set in action_vlans]))
+
+        for (full_name, port_mode, qnq, _), action_vlans in add_port_changes.iteritems():
+            current_port_mode, current_vlan_set = port_vlans.get(full_name, (None, None))
+            # QinQ configuration can't be verified by the port VLAN membership,
+            # port has to be switched to the requested mode even if VLAN is present on it
+            if qnq or current_vlan_set is None or current_port_mode != port_mode:
+                continue
+
+            for index, (action_id, vlan_set) in enumerate(action_vlans):
+                present_vlan_set = vlan_set & current_vlan_set
+                if present_vlan_set:
+                    results.add([action_id], True, "VLAN {vlan} is already configured on {port}, no changes required"
+                                .format(vlan=present_vlan_set, port=full_name))
+                    action_vlans[index] = (action_id, vlan_set - current_vlan_set)
+
+    @staticmethod
+    def _group_vlans_by_port(vlan_plan):
+        """ Group planned VLAN changes with the same port and port settings together
+
+        :param OrderedDict vlan_plan: {(vlan_id, full_name, port_mode, ...): [action_ids]}
+        :return: ordered dict {(full_name, port_mode, ...): (vlan_ids, action_ids)}
+        :rtype: OrderedDict
+        """
+
+        batches = OrderedDict()
+        for vlan_key, vlan_action_ids in vlan_plan.iteritems():
+            vlan_ids, action_ids = batches.setdefault(vlan_key[1:], ([], []))
+            vlan_ids.append(vlan_key[0])
+            action_ids.extend(action_id for action_id in vlan_action_ids if action_id not in action_ids)
+
+        return batches
+
+    @staticmethod
+    def _is_batch_flow_overridden(flow, base_flow_class):
+        """ Check whether VLAN flow overrides execute_batch_flow to change several VLANs within the one CLI session.
+        Default execute_batch_flow saves nothing, so separate tasks are used and result of the each VLAN
+        is reported only for its own actions
+
+        :param flow: AddVlanFlow or RemoveVlanFlow object
+        :param type base_flow_class: AddVlanFlow or RemoveVlanFlow
+        :rtype: bool
+        """
+
+        batch_flow = getattr(type(flow), "execute_batch_flow", None)
+        if batch_flow is None:
+            return False
+
+        return getattr(batch_flow, "__func__", batch_flow) is not base_flow_class.execute_batch_flow.__func__
+
+    def _get_add_vlan_tasks(self, add_vlan_plan):
+        """ Create add VLAN tasks. If add VLAN flow overrides execute_batch_flow, one task will be created
+        for the all VLANs with the same port settings
+
+        :param OrderedDict add_vlan_plan: {(vlan_id, full_name, port_mode, qnq, c_tag): [action_ids]}
+        :return: list of (target, args, action_ids) tuples
+        :rtype: list[tuple]
+        """
+
+        if not self._is_batch_flow_overridden(self.add_vlan_flow, AddVlanFlow):
+            return [(self.add_vlan, vlan_key, action_ids) for vlan_key, action_ids in add_vlan_plan.iteritems()]
+
+        return [(self.add_vlan_batch, (vlan_ids,) + port_settings, action_ids)
+                for port_settings, (vlan_ids, action_ids) in self._group_vlans_by_port(add_vlan_plan).iteritems()]
+
+    def _get_remove_vlan_tasks(self, remove_vlan_plan):
+        """ Create remove VLAN tasks. If remove VLAN flow overrides execute_batch_flow, one task will be created
+        for the all VLANs with the same port and port mode
+
+        :param OrderedDict remove_vlan_plan: {(vlan_id, full_name, port_mode): [action_ids]}
+        :return: list of (target, args, action_ids) tuples
+        :rtype: list[tuple]
+        """
+
+        if not self._is_batch_flow_overridden(self.remove_vlan_flow, RemoveVlanFlow):
+            return [(self.remove_vlan, vlan_key, action_ids) for vlan_key, action_ids in remove_vlan_plan.iteritems()]
+
+        return [(self.remove_vlan_batch, (vlan_ids,) + port_settings, action_ids)
+                for port_settings, (vlan_ids, action_ids) in self._group_vlans_by_port(remove_vlan_plan).iteritems()]
+
+    def _run_task(self, target, args, action_ids, results, ready_time, task_queue):
+        """ Execute task while holding the port lock, add its result to the each action it was executed for
+        and record flow metrics. If port lock isn't acquired before the request deadline, request is cancelled
+
+        :param target: VLAN flow runner method, returns (success, message) tuple
+        :param tuple args: target arguments, starting with VLAN id(s) and port name
+        :param list[str] action_ids: ids of the request actions
+        :param ConnectivityActionResults results: request results container
+        :param float ready_time: time when task became available, i.e. previous task of the port was completed
+        :param PortTaskQueue task_queue: queue the task was taken from, task is skipped if queue is cancelled
+            by the time the port lock is acquired
+        """
+
+        deadline = getattr(self._worker_state, "deadline", None)
+        if not self.PORT_LOCKS.acquire(args[1], None if deadline is None else max(deadline - time.time(), 0)):
+            # port is still locked by the flow of the other request, e.g. stuck one
+            self._cancel_request(task_queue, results, waiting_args=args)
+            return
+
+        try:
+            if task_queue.cancelled.is_set():
+                return
+
+            start_time = time.time()
+            success, message = target(*args)
+            end_time = time.time()
+        finally:
+            self.PORT_LOCKS.release(args[1])
+
+        results.add(action_ids, success, message)
+
+        flow_metrics = FlowMetrics(flow_name=target.__name__,
+                                   vlan_id=args[0],
+                                   port_name=args[1],
+                                   action_ids=action_ids,
+                                   wait_time=start_time - ready_time,
+                                   execution_time=end_time - start_time,
+                                   success=success)
+        self._logger.debug("Flow metrics: {}".format(flow_metrics))
+        try:
+            self._metrics_sink.record(flow_metrics)
+        except Exception:
+            self._logger.error("Failed to record flow metrics: {}".format(traceback.format_exc()))
+
+    def _run_worker(self, task_queue, results, deadline=None):
+        """ Execute tasks from the queue until there are no more tasks
+
+        :param PortTaskQueue task_queue:
+        :param ConnectivityActionResults results: request results container
+        :param float deadline: time when request times out
+        """
+
+        self._worker_state.deadline = deadline
+
+        while True:
+            port_task = task_queue.get()
+            if port_task is None:
+                return
+
+            port_name, (target, args, action_ids), ready_time = port_task
+            try:
+                self._run_task(target, args, action_ids, results, ready_time, task_queue)
+            except Exception as e:
+                self._logger.error(traceback.format_exc())
+                results.add(action_ids, False, str(e))
+            finally:
+                task_queue.task_done(port_name)
+
+    def _cancel_tasks(self, task_list, results, in_progress=False):
+        """ Report tasks as failed because of the request timeout
+
+        :param list[tuple] task_list: list of (target, args, action_ids) tuples
+        :param ConnectivityActionResults results: request results container
+        :param bool in_progress: whether tasks were started
+        """
+
+        for target, args, action_ids in task_list:
+            vlan_id = args[0] if isinstance(args[0], basestring) else ",".join(args[0])
+            message = "VLAN {vlan} on {port} {state}, request timeout of {timeout}s exceeded".format(
+                vlan=vlan_id,
+                port=args[1],
+                state="timed out" if in_progress else "was cancelled",
+                timeout=self.REQUEST_TIMEOUT)
+            self._logger.error(message)
+            results.add(action_ids, False, message)
+
+    def _cancel_request(self, task_queue, results, waiting_args=None):
+        """ Cancel not started tasks of the timed out request and report them and the tasks in progress as failed.
+        Nothing is reported if request is already cancelled
+
+        :param PortTaskQueue task_queue:
+        :param ConnectivityActionResults results: request results container
+        :param tuple waiting_args: arguments of the task in progress which gave up waiting for the port lock,
+            it is reported as cancelled
+        """
+
+        def report(not_started, in_progress):
+            self._cancel_tasks(not_started + [task for task in in_progress if task[1] is waiting_args], results)
+            self._cancel_tasks([task for task in in_progress if task[1] is not waiting_args], results,
+                               in_progress=True)
+
+        task_queue.cancel(report)
+
+    def _run_tasks(self, task_list, results, deadline=None):
+        """ Execute tasks on the bounded pool of worker threads and wait for completion of all of them.
+        Tasks for the same port are executed one by one, tasks for the different ports - in parallel.
+        Once deadline is reached, not started tasks are cancelled and tasks in progress are reported as timed out
+
+        :param list[tuple] task_list: list of (target, args, action_ids) tuples
+        :param ConnectivityActionResults results: request results container
+        :param float deadline: time when request times out, no limit if None
+        """
+
+        if not task_list:
+            return
+
+        if deadline is not None and time.time() >= deadline:
+            self._cancel_tasks(task_list, results)
+            return
+
+        task_queue = PortTaskQueue(task_list)
+        workers = [Thread(target=self._run_worker, args=(task_queue, results, deadline))
+                   for _ in range(min(self.concurrency_limit, task_queue.ports_count))]
+
+        for worker in workers:
+            # stuck worker shouldn't prevent driver process from exit
+            worker.daemon = True
+            worker.start()
+
+        for worker in workers:
+            if deadline is None:
+                worker.join()
+                continue
+
+            worker.join(max(deadline - time.time(), 0))
+            if worker.is_alive():
+                self._cancel_request(task_queue, results)
+                return
+
     def _validate_request_action(self, action):
         """ Validate action from the request json,
             according to APPLY_CONNECTIVITY_CHANGES_ACTION_REQUIRED_ATTRIBUTE_LIST
@@ -168,6 +712,34 @@ class ConnectivityRunner(ConnectivityOperationsInterface):
                             "Mandatory field {0} is missing in ApplyConnectivityChanges request json".format(
                                 fail_attribute))
 
+    def _get_vlan_set(self, vlan_str):
+        """ Get VLAN set from input string
+
+        :param str vlan_str: comma separated VLAN numbers and ranges
+        :rtype: VlanSet
+        """
+
+        try:
+            return VlanSet.from_string(vlan_str)
+        except ValueError as e:
+            raise Exception(self.__class__.__name__, str(e))
+
+    def _split_vlan_set(self, vlan_set):
+        """ Split VLAN set into VLAN ranges, or into the separate VLANs if ranges are not supported
+
+        :param VlanSet vlan_set:
+        :return: list of (vlan_id, VlanSet) tuples
+        :rtype: list[tuple[str, VlanSet]]
+        """
+
+        if self.IS_VLAN_RANGE_SUPPORTED:
+            vlan_ranges = vlan_set.ranges()
+        else:
+            vlan_ranges = [(vlan, vlan) for vlan in vlan_set]
+
+        return [(str(start) if start == end else "{}-{}".format(start, end), VlanSet.from_range(start, end))
+                for start, end in vlan_ranges]
+
     def _get_vlan_list(self, vlan_str):
         """ Get VLAN list from input string
 
@@ -175,30 +747,73 @@ class ConnectivityRunner(ConnectivityOperationsInterface):
         :return list of VLANs or Exception
         """
 
-        result = set()
-        for splitted_vlan in vlan_str.split(","):
-            if "-" not in splitted_vlan:
-                if validate_vlan_number(splitted_vlan):
-                    result.add(int(splitted_vlan))
-                else:
-                    raise Exception(self.__class__.__name__, "Wrong VLAN number detected {}".format(splitted_vlan))
+        return [vlan_id for vlan_id, _ in self._split_vlan_set(self._get_vlan_set(vlan_str))]
+
+    @staticmethod
+    def _get_device_name(full_name):
+        """ Get name of the device resource from the full port name
+
+        :param str full_name: Full interface name. Example: 2950/Chassis 0/FastEthernet0-23
+        :rtype: str
+        """
+        return full_name.split("/")[0]
+
+    def _execute_flow(self, flow_property, flow_method, **flow_kwargs):
+        """ Execute VLAN flow according to the RETRY_POLICY and the device CIRCUIT_BREAKER
+
+        :param str flow_property: name of the runner flow property, e.g. add_vlan_flow
+        :param str flow_method: name of the flow method, e.g. execute_flow
+        :param flow_kwargs: flow method arguments, port_name is required
+        :return: (success, message) tuple
+        :rtype: tuple[bool, str]
+        """
+
+        device_name = self._get_device_name(flow_kwargs["port_name"])
+        circuit_breaker = self.CIRCUIT_BREAKER
+        attempt = 0
+
+        while True:
+            attempt += 1
+            if circuit_breaker is not None and not circuit_breaker.allow(device_name):
+                return False, "Device {} is unreachable, VLAN configuration skipped".format(device_name)
+
+            try:
+                output = getattr(getattr(self, flow_property), flow_method)(**flow_kwargs)
+            except Exception as e:
+                self._logger.error(traceback.format_exc())
+                delay = self._get_retry_delay(e, attempt)
+                if delay is None:
+                    if circuit_breaker is not None:
+                        circuit_breaker.record_failure(device_name, e)
+                    return False, e.message
+
+                self._logger.warning("Attempt {}/{} of the {} on {} failed, retrying in {:.1f}s".format(
+                    attempt, self.RETRY_POLICY.attempts, flow_property, flow_kwargs["port_name"], delay))
+                time.sleep(delay)
             else:
-                if self.IS_VLAN_RANGE_SUPPORTED:
-                    if validate_vlan_range(splitted_vlan):
-                        result.add(splitted_vlan)
-                    else:
-                        raise Exception(self.__class__.__name__, "Wrong VLANs range detected {}".format(vlan_str))
-                else:
-                    start, end = map(int, splitted_vlan.split("-"))
-                    if validate_vlan_number(start) and validate_vlan_number(end):
-                        if start > end:
-                            start, end = end, start
-                        for vlan in range(start, end + 1):
-                            result.add(vlan)
-                    else:
-                        raise Exception(self.__class__.__name__, "Wrong VLANs range detected {}".format(vlan_str))
-
-        return map(str, list(result))
+                if circuit_breaker is not None:
+                    circuit_breaker.record_reachable(device_name)
+                return True, output
+
+    def _get_retry_delay(self, exception, attempt):
+        """ Get seconds to wait before the next attempt of the failed flow
+
+        :param Exception exception: error of the flow attempt
+        :param int attempt: number of the failed attempt, starting from 1
+        :return: delay or None if error is permanent, attempts are over
+            or the retry can't start before the request deadline
+        :rtype: float
+        """
+
+        if not self.RETRY_POLICY.is_transient(exception) or attempt >= self.RETRY_POLICY.attempts:
+            return None
+
+        delay = self.RETRY_POLICY.get_delay(attempt)
+        deadline = getattr(self._worker_state, "deadline", None)
+        if deadline is not None and time.time() + delay >= deadline:
+            return None
+
+        return delay
 
     def add_vlan(self, vlan_id, full_name, port_mode, qnq, c_tag):
         """ Run flow to add VLAN(s) to interface
@@ -208,18 +823,16 @@ class ConnectivityRunner(ConnectivityOperationsInterface):
         :param port_mode: port mode type. Should be trunk or access
         :param qnq:
         :param c_tag:
+        :return: (success, message) tuple
+        :rtype: tuple[bool, str]
         """
 
-        try:
-            action_result = self.add_vlan_flow.execute_flow(vlan_range=vlan_id,
-                                                            port_mode=port_mode,
-                                                            port_name=full_name,
-                                                            qnq=qnq,
-                                                            c_tag=c_tag)
-            self.result[current_thread().name].append((True, action_result))
-        except Exception as e:
-            self._logger.error(traceback.format_exc())
-            self.result[current_thread().name].append((False, e.message))
+        return self._execute_flow("add_vlan_flow", "execute_flow",
+                                  vlan_range=vlan_id,
+                                  port_mode=port_mode,
+                                  port_name=full_name,
+                                  qnq=qnq,
+                                  c_tag=c_tag)
 
     def remove_vlan(self, vlan_id, full_name, port_mode):
         """
@@ -227,14 +840,45 @@ class ConnectivityRunner(ConnectivityOperationsInterface):
         :param vlan_id: Already validated number of VLAN(s)
         :param full_name: Full interface name. Example: 2950/Chassis 0/FastEthernet0-23
         :param port_mode: port mode type. Should be trunk or access
+        :return: (success, message) tuple
+        :rtype: tuple[bool, str]
         """
 
-        try:
+        return self._execute_flow("remove_vlan_flow", "execute_flow",
+                                  vlan_range=vlan_id,
+                                  port_name=full_name,
+                                  port_mode=port_mode)
+
+    def add_vlan_batch(self, vlan_range_list, full_name, port_mode, qnq, c_tag):
+        """ Run batch flow to add several VLANs to interface
+
+        :param list[str] vlan_range_list: Already validated VLANs or VLAN ranges
+        :param full_name: Full interface name. Example: 2950/Chassis 0/FastEthernet0-23
+        :param port_mode: port mode type. Should be trunk or access
+        :param qnq:
+        :param c_tag:
+        :return: (success, message) tuple
+        :rtype: tuple[bool, str]
+        """
+
+        return self._execute_flow("add_vlan_flow", "execute_batch_flow",
+                                  vlan_range_list=vlan_range_list,
+                                  port_mode=port_mode,
+                                  port_name=full_name,
+                                  qnq=qnq,
+                                  c_tag=c_tag)
+
+    def remove_vlan_batch(self, vlan_range_list, full_name, port_mode):
+        """ Run batch flow to remove several VLANs from interface
+
+        :param list[str] vlan_range_list: Already validated VLANs or VLAN ranges
+        :param full_name: Full interface name. Example: 2950/Chassis 0/FastEthernet0-23
+        :param port_mode: port mode type. Should be trunk or access
+        :return: (success, message) tuple
+        :rtype: tuple[bool, str]
+        """
 
-            action_result = self.remove_vlan_flow.execute_flow(vlan_range=vlan_id,
-                                                               port_name=full_name,
-                                                               port_mode=port_mode)
-            self.result[current_thread().name].append((True, action_result))
-        except Exception as e:
-            self._logger.error(traceback.format_exc())
-            self.result[current_thread().name].append((False, e.message))
+        return self._execute_flow("remove_vlan_flow", "execute_batch_flow",
+                                  vlan_range_list=vlan_range_list,
+                                  port_name=full_name,
+                                  port_mode=port_mode)
@@ -0,0 +1,197 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import time
+import traceback
+from collections import defaultdict, deque, OrderedDict
+from Queue import Queue
+from threading import Condition, Thread
+
+from cloudshell.devices.flows.cli_action_flows import RunCommandFlow
+
+
+class FleetCommandResult(object):
+    """Outcome of the custom command on the one device"""
+
+    __slots__ = ("resource_config", "success", "output", "execution_time")
+
+    def __init__(self, resource_config, success, output, execution_time):
+        """
+        :param resource_config: resource configuration of the device
+        :param bool success: whether command was executed successfully
+        :param str output: command output or error message
+        :param float execution_time: seconds the command was executing, including CLI session checkout
+        """
+        self.resource_config = resource_config
+        self.success = success
+        self.output = output
+        self.execution_time = execution_time
+
+    def __str__(self):
+        return "{name} ({address}): {outcome} in {time:.3f}s".format(name=self.resource_config.name,
+                                                                     address=self.resource_config.address,
+                                                                     outcome="success" if self.success else "failed",
+                                                                     time=self.execution_time)
+
+
+class DeviceTaskQueue(object):
+    """Queue of the devices resource configurations. Configuration is given out only if its device (address)
+    has a free slot, so workers don't wait for the busy device while the other devices are waiting in the queue"""
+
+    def __init__(self, resource_configs, device_concurrency_limit):
+        """
+        :param list resource_configs: resource configurations of the devices, several ones can share address
+        :param int device_concurrency_limit: max number of the configurations given out for the one address
+        """
+        self._condition = Condition()
+        self._device_concurrency_limit = device_concurrency_limit
+        self._device_tasks = OrderedDict()
+        for resource_config in resource_configs:
+            self._device_tasks.setdefault(resource_config.address, deque()).append(resource_config)
+
+        # devices with not started configurations and a free slot
+        self._ready_devices = deque(self._device_tasks)
+        self._in_progress = defaultdict(int)
+        self._stopped = False
+
+    def get(self):
+        """Get configuration of the device with a free slot. Blocks until such configuration is available
+
+        :return: resource configuration or None if there are no more configurations or queue is stopped
+        """
+        with self._condition:
+            while not self._ready_devices:
+                if self._stopped or not self._device_tasks:
+                    return None
+                self._condition.wait()
+
+            if self._stopped:
+                return None
+
+            address = self._ready_devices.popleft()
+            tasks = self._device_tasks[address]
+            resource_config = tasks.popleft()
+            self._in_progress[address] += 1
+
+            if not tasks:
+                del self._device_tasks[address]
+            elif self._in_progress[address] < self._device_concurrency_limit:
+                self._ready_devices.append(address)
+
+            return resource_config
+
+    def task_done(self, address):
+        """Free slot of the device, its next configuration becomes available
+
+        :param str address: device address
+        """
+        with self._condition:
+            self._in_progress[address] -= 1
+            if not self._in_progress[address]:
+                del self._in_progress[address]
+
+            if address in self._device_tasks and address not in self._ready_devices:
+                self._ready_devices.append(address)
+            self._condition.notify_all()
+
+    def stop(self):
+        """Drop all configurations which are not given out yet, workers get None on the next get call"""
+        with self._condition:
+            self._stopped = True
+            self._device_tasks.clear()
+            self._ready_devices.clear()
+            self._condition.notify_all()
+
+
+class FleetCommandRunner(object):
+    """Runs the same custom command on the many devices in parallel"""
+
+    DEFAULT_CONCURRENCY_LIMIT = 20
+    DEFAULT_DEVICE_CONCURRENCY_LIMIT = 1
+
+    def __init__(self, logger, cli_handler_factory, concurrency_limit=DEFAULT_CONCURRENCY_LIMIT,
+                 device_concurrency_limit=DEFAULT_DEVICE_CONCURRENCY_LIMIT):
+        """
+        :param logger:
+        :param cli_handler_factory: function which creates CliHandlerImpl for the resource configuration,
+            use driver_helper.get_shared_cli for its CLI to reuse sessions between the runs
+        :param int concurrency_limit: max number of the commands executing at the same time
+        :param int device_concurrency_limit: max number of the commands executing on the one device (address)
+        """
+        self._logger = logger
+        self._cli_handler_factory = cli_handler_factory
+        self._concurrency_limit = concurrency_limit
+        self._device_concurrency_limit = device_concurrency_limit
+
+    def run_command_flow(self, cli_handler):
+        """
+        :param CliHandlerImpl cli_handler:
+        :rtype: RunCommandFlow
+        """
+        return RunCommandFlow(cli_handler, self._logger)
+
+    def run_custom_command(self, resource_configs, custom_command, is_config=False):
+        """Execute custom command on the all devices, results are yielded as soon as each device finishes
+
+        :param list resource_configs: resource configurations of the devices
+        :param custom_command: command or list of commands
+        :param bool is_config: if True then run command in configuration mode
+        :rtype: collections.Iterable[FleetCommandResult]
+        """
+        resource_configs = list(resource_configs)
+        tasks = DeviceTaskQueue(resource_configs, self._device_concurrency_limit)
+        results = Queue()
+        workers_count = min(self._concurrency_limit, len(resource_configs))
+
+        for number in xrange(workers_count):
+            worker = Thread(target=self._run_worker,
+                            args=(tasks, results, custom_command, is_config),
+                            name="Fleet command worker {}".format(number))
+            # consumer may stop reading results, worker must not keep the process alive then
+            worker.daemon = True
+            worker.start()
+
+        try:
+            for _ in xrange(len(resource_configs)):
+                yield results.get()
+        finally:
+            # don't start commands on the remaining devices if consumer stopped reading results
+            tasks.stop()
+
+    def _run_worker(self, tasks, results, custom_command, is_config):
+        """Execute command on the devices from the queue until there are no more devices
+
+        :param DeviceTaskQueue tasks: resource configurations of the devices
+        :param Queue results: FleetCommandResult of the each device
+        """
+        while True:
+            resource_config = tasks.get()
+            if resource_config is None:
+                return
+
+            try:
+                results.put(self._run_command(resource_config, custom_command, is_config))
+            finally:
+                tasks.task_done(resource_config.address)
+
+    def _run_command(self, resource_config, custom_command, is_config):
+        """Execute command on the one device
+
+        :rtype: FleetCommandResult
+        """
+        start_time = time.time()
+        try:
+            cli_handler = self._cli_handler_factory(resource_config)
+            output = self.run_command_flow(cli_handler).execute_flow(custom_command=custom_command,
+                                                                     is_config=is_config)
+            success = True
+        except Exception as e:
+            self._logger.error("Failed to run custom command on {}: {}".format(resource_config.address,
+                                                                              traceback.format_exc()))
+            output = "Failed to run custom command: {}".format(e)
+            success = False
+
+        return FleetCommandResult(resource_config=resource_config,
+                                  success=success,
+                                  output=output,
+                                  execution_time=time.time() - start_time)
@@ -7,6 +7,11 @@ from cloudshell.devices.runners.interfaces.run_command_runner_interface import R
 
 
 class RunCommandRunner(RunCommandInterface):
+    # write custom config commands to the device by blocks, see RunCommandFlow.execute_flow.
+    # Errors are detected only after the whole block is written, so commands following the failed one
+    # are already applied on the device
+    PIPELINE_CONFIG_COMMANDS = False
+
     def __init__(self, logger, cli_handler):
         """Create RunCommandOperations
 
@@ -45,4 +50,6 @@ class RunCommandRunner(RunCommandInterface):
         :return: result of command execution
         """
 
-        return self.run_command_flow.execute_flow(custom_command=custom_command, is_config=True)
+        return self.run_command_flow.execute_flow(custom_command=custom_command,
+                                                  is_config=True,
+                                                  pipelined=self.PIPELINE_CONFIG_COMMANDS)
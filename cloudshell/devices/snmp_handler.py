@@ -2,8 +2,10 @@
 # -*- coding: utf-8 -*-
 
 from abc import abstractmethod
+from functools import partial
 from cloudshell.devices.driver_helper import get_snmp_parameters_from_command_context
 from cloudshell.devices.snmp_handler_interface import SnmpHandlerInterface
+from cloudshell.devices.snmp_state import SNMP_STATE_REGISTRY
 
 from cloudshell.snmp.quali_snmp import QualiSnmp
 
@@ -13,19 +15,22 @@ class SnmpContextManager(object):
     Context manager to enable/disable snmp
     """
 
-    def __init__(self, enable_flow, disable_flow, snmp_parameters, logger):
+    def __init__(self, enable_flow, disable_flow, snmp_parameters, logger, snmp_state_registry=None):
         """
         :param enable_flow:
         :param disable_flow:
         :param snmp_parameters:
         :type snmp_parameters:
         :param logger:
+        :param SnmpStateRegistry snmp_state_registry: if set, SNMP is enabled only by the first user of the device
+            and disabled after the last one, otherwise it is enabled and disabled every time
         :return:
         """
         self._enable_flow = enable_flow
         self._disable_flow = disable_flow
         self._snmp_parameters = snmp_parameters
         self._logger = logger
+        self._snmp_state_registry = snmp_state_registry
 
     def __enter__(self):
         """
@@ -33,9 +38,17 @@ class SnmpContextManager(object):
         :return:
         :rtype: QualiSnmp
         """
-        if self._enable_flow:
-            self._enable_flow.execute_flow(self._snmp_parameters)
-        return QualiSnmp(self._snmp_parameters, self._logger)
+        if self._snmp_state_registry is None:
+            self._enable_snmp()
+            return QualiSnmp(self._snmp_parameters, self._logger)
+
+        device_key = self._snmp_state_registry.get_device_key(self._snmp_parameters)
+        self._snmp_state_registry.acquire(device_key, self._enable_snmp if self._enable_flow else None)
+        try:
+            return QualiSnmp(self._snmp_parameters, self._logger)
+        except Exception:
+            self._snmp_state_registry.release(device_key, self._get_disable_function())
+            raise
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         """
@@ -45,15 +58,38 @@ class SnmpContextManager(object):
         :param exc_tb:
         :return:
         """
+        if self._snmp_state_registry is None:
+            self._disable_snmp()
+        else:
+            device_key = self._snmp_state_registry.get_device_key(self._snmp_parameters)
+            self._snmp_state_registry.release(device_key, self._get_disable_function())
+
+    def _enable_snmp(self):
+        if self._enable_flow:
+            self._enable_flow.execute_flow(self._snmp_parameters)
+
+    def _disable_snmp(self):
         if self._disable_flow:
             self._disable_flow.execute_flow(self._snmp_parameters)
 
+    def _get_disable_function(self):
+        """Registry can disable SNMP after the linger time, when this context manager is already exited,
+        so it gets only the disable flow with the SNMP parameters
+
+        :return: function disabling SNMP on the device or None
+        """
+        if self._disable_flow:
+            return partial(self._disable_flow.execute_flow, self._snmp_parameters)
+
 
 class SnmpHandler(SnmpHandlerInterface):
     """
     Collect parameters for creating snmp handler
     """
 
+    # SNMP is kept enabled while any command in the process uses it, set None to enable/disable it every time
+    SNMP_STATE_REGISTRY = SNMP_STATE_REGISTRY
+
     def __init__(self, resource_config, logger, api):
         self.resource_config = resource_config
         self._logger = logger
@@ -89,4 +125,5 @@ class SnmpHandler(SnmpHandlerInterface):
         :return:
         :rtype: SnmpContextManager
         """
-        return SnmpContextManager(self.enable_flow, self.disable_flow, self._snmp_parameters, self._logger)
+        return SnmpContextManager(self.enable_flow, self.disable_flow, self._snmp_parameters, self._logger,
+                                  snmp_state_registry=self.SNMP_STATE_REGISTRY)
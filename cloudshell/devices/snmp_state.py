@@ -0,0 +1,174 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import atexit
+import logging
+from threading import Lock, Timer
+
+
+class _DeviceSnmpState(object):
+    """SNMP state of the one device"""
+
+    __slots__ = ("lock", "users", "enabled", "linger_timer", "linger_disable")
+
+    def __init__(self):
+        # held while enable/disable flow is executing, so concurrent users wait for it
+        self.lock = Lock()
+        # changed only while holding the registry lock, so unused state isn't dropped while the new user waits
+        self.users = 0
+        # whether SNMP was enabled by the enable flow of the users
+        self.enabled = False
+        # scheduled disable while SNMP is kept enabled without users
+        self.linger_timer = None
+        self.linger_disable = None
+
+
+class SnmpStateRegistry(object):
+    """Process-wide reference count of the SNMP users per device.
+    SNMP is enabled by the first user and disabled only after the last user exits and the linger time passes,
+    so back-to-back or concurrent SNMP users don't reconfigure the device every time"""
+
+    DEFAULT_LINGER_TIME = 60
+
+    def __init__(self, linger_time=DEFAULT_LINGER_TIME, logger=None):
+        """
+        :param float linger_time: seconds SNMP is kept enabled after the last user exits, 0 disables it immediately
+        :param logger: used for the disable flows executed after the linger time, module logger by default
+        """
+        self.linger_time = linger_time
+        self._logger = logger or logging.getLogger(__name__)
+        self._lock = Lock()
+        self._devices = {}
+
+    @staticmethod
+    def get_device_key(snmp_parameters):
+        """SNMP parameters which are configured on the device by the enable flow
+
+        :param cloudshell.snmp.snmp_parameters.SNMPParameters snmp_parameters:
+        :rtype: tuple
+        """
+        return (snmp_parameters.ip,
+                snmp_parameters.port,
+                type(snmp_parameters).__name__,
+                getattr(snmp_parameters, "snmp_community", None),
+                getattr(snmp_parameters, "snmp_user", None))
+
+    def _add_user(self, key):
+        with self._lock:
+            state = self._devices.get(key)
+            if state is None:
+                state = self._devices[key] = _DeviceSnmpState()
+            state.users += 1
+            return state
+
+    def _remove_user(self, key, state):
+        """Unregister user, unused state of the disabled device is dropped
+
+        :return: whether there are other users of the device
+        :rtype: bool
+        """
+        with self._lock:
+            state.users -= 1
+            self._drop_unused_state(key, state)
+            return state.users > 0
+
+    def _drop_unused_state(self, key, state):
+        if not state.users and not state.enabled and state.linger_timer is None and self._devices.get(key) is state:
+            del self._devices[key]
+
+    def acquire(self, key, enable):
+        """Register SNMP user, SNMP is enabled if it isn't enabled yet
+
+        :param tuple key: device key, see get_device_key
+        :param enable: function enabling SNMP on the device or None
+        """
+        state = self._add_user(key)
+        try:
+            with state.lock:
+                if state.linger_timer is not None:
+                    state.linger_timer.cancel()
+                    state.linger_timer = state.linger_disable = None
+
+                if not state.enabled and enable:
+                    enable()
+                    state.enabled = True
+        except Exception:
+            with state.lock:
+                self._remove_user(key, state)
+            raise
+
+    def release(self, key, disable):
+        """Unregister SNMP user, SNMP is disabled after the linger time if there are no other users.
+        Disable function can be called after the user has exited, so it must not use the resources of the user
+        command, e.g. its logger or API session
+
+        :param tuple key: device key, see get_device_key
+        :param disable: function disabling SNMP on the device or None
+        """
+        with self._lock:
+            state = self._devices[key]
+
+        with state.lock:
+            if self._remove_user(key, state):
+                return
+
+            if not state.enabled or self.linger_time <= 0:
+                # SNMP wasn't enabled by the users, it is disabled right away as without the registry
+                self._disable(key, state, disable)
+                return
+
+            timer = Timer(self.linger_time, self._disable_lingering)
+            timer.args = (key, state, timer)
+            timer.name = "SNMP disable {}".format(key[0])
+            # process isn't kept alive by the timer, lingering devices are disabled by flush on exit
+            timer.daemon = True
+            state.linger_timer = timer
+            state.linger_disable = disable
+            timer.start()
+
+    def flush(self):
+        """Disable SNMP on the all devices where it is kept enabled without users, e.g. before the process exits"""
+        with self._lock:
+            devices = self._devices.items()
+
+        for key, state in devices:
+            with state.lock:
+                if state.linger_timer is None:
+                    continue
+
+                state.linger_timer.cancel()
+                self._disable_logging_errors(key, state, state.linger_disable)
+
+    def _disable_lingering(self, key, state, timer):
+        with state.lock:
+            # timer could fire while the new user was waiting for the lock
+            if state.linger_timer is not timer:
+                return
+
+            self._disable_logging_errors(key, state, state.linger_disable)
+
+    def _disable_logging_errors(self, key, state, disable):
+        try:
+            self._disable(key, state, disable)
+        except Exception:
+            self._logger.exception("Failed to disable SNMP")
+
+    def _disable(self, key, state, disable):
+        state.linger_timer = state.linger_disable = None
+        # SNMP is enabled again by the next user even if disable flow failed
+        state.enabled = False
+        try:
+            if disable:
+                disable()
+        finally:
+            # new users of the device wait for the state lock until disable flow is completed
+            with self._lock:
+                self._drop_unused_state(key, state)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._devices)
+
+
+SNMP_STATE_REGISTRY = SnmpStateRegistry()
+atexit.register(SNMP_STATE_REGISTRY.flush)
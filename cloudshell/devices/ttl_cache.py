@@ -0,0 +1,80 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
+class TTLCache(object):
+    """Thread safe cache bounded by TTL and size with LRU eviction"""
+
+    DEFAULT_TTL = 300
+    DEFAULT_MAX_SIZE = 1000
+
+    def __init__(self, ttl=None, max_size=None, timer=time.time):
+        """
+        :param float ttl: seconds the value is kept, DEFAULT_TTL if not set
+        :param int max_size: max number of the kept values, least recently used ones are evicted first,
+            DEFAULT_MAX_SIZE if not set
+        :param timer: function returning current time in seconds
+        """
+        self._ttl = self.DEFAULT_TTL if ttl is None else ttl
+        self._max_size = self.DEFAULT_MAX_SIZE if max_size is None else max_size
+        self._timer = timer
+        self._lock = Lock()
+        # key -> (expiration time, value), ordered from the least recently used one
+        self._entries = OrderedDict()
+
+    def get(self, key, default=None):
+        """Get value and mark it as the most recently used one
+
+        :return: value or default if there is no valid entry for the key
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return default
+
+            expires_at, value = entry
+            if expires_at <= self._timer():
+                return default
+
+            self._entries[key] = entry
+            return value
+
+    def set(self, key, value):
+        """Keep value for the TTL, expired and least recently used entries above the size limit are evicted"""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (self._timer() + self._ttl, value)
+            self._evict()
+
+    def pop(self, key, default=None):
+        """Remove value
+
+        :return: removed value or default if there is no valid entry for the key
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or entry[0] <= self._timer():
+                return default
+
+            return entry[1]
+
+    def _evict(self):
+        """Remove expired entries from the head and the least recently used ones above the size limit"""
+        now = self._timer()
+        while self._entries:
+            key, (expires_at, _) = next(self._entries.iteritems())
+            if expires_at > now and len(self._entries) <= self._max_size:
+                break
+            del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
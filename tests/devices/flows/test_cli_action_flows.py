@@ -1,9 +1,11 @@
 import unittest
 
 import mock
+from cloudshell.cli.session.session_exceptions import CommandExecutionException, ExpectedSessionException, \
+    SessionReadTimeout
 
 from cloudshell.devices.flows.cli_action_flows import RunCommandFlow, SaveConfigurationFlow, \
-    RestoreConfigurationFlow, AddVlanFlow, RemoveVlanFlow, LoadFirmwareFlow, ShutdownFlow, \
+    RestoreConfigurationFlow, AddVlanFlow, RemoveVlanFlow, GetPortVlansFlow, LoadFirmwareFlow, ShutdownFlow, \
     EnableSnmpFlow, DisableSnmpFlow
 
 
@@ -79,6 +81,130 @@ class TestRunCommandFlow(unittest.TestCase):
 
         self.assertEqual('\n'.join(responses), result)
 
+    def _create_pipelined_session(self, output):
+        session = mock.MagicMock()
+        session.command_mode.prompt = r"Switch\(config\)#\s*$"
+        session.session.hardware_expect.return_value = output
+        self.cli_handler.get_cli_service.return_value = mock.MagicMock(__enter__=mock.MagicMock(return_value=session))
+        return session
+
+    def test_execute_flow_pipelined(self):
+        """Check that commands will be written by blocks and output will be split by the command echoes"""
+        self.run_flow.PIPELINE_BLOCK_SIZE = 2
+        session = self._create_pipelined_session(output=None)
+        session.session.hardware_expect.side_effect = ["vlan 10\nSwitch(config-vlan)#name test\nSwitch(config-vlan)#",
+                                                       "exit\nSwitch(config)#"]
+        # act
+        result = self.run_flow.execute_flow(["vlan 10", "name test", "exit"], is_config=True, pipelined=True)
+        # verify
+        self.assertEqual(result, "Switch(config-vlan)#\nSwitch(config-vlan)#\nSwitch(config)#")
+        session.session.send_line.assert_has_calls([mock.call("vlan 10", self.logger),
+                                                    mock.call("name test", self.logger),
+                                                    mock.call("exit", self.logger)])
+        self.assertEqual(session.session.hardware_expect.call_count, 2)
+        session.send_command.assert_not_called()
+        self.assertIsNone(session.session.cached_command_mode)
+
+    def test_execute_flow_pipelined_splits_output(self):
+        """Check that output of the each command will end with the prompt, like output of send_command"""
+        self._create_pipelined_session(output="interface eth1\nSwitch(config-if)#description uplink\n"
+                                              "Switch(config-if)#")
+        # act
+        result = self.run_flow._send_commands_block(self.cli_handler.get_cli_service().__enter__(),
+                                                    ["interface eth1", "description uplink"])
+        # verify
+        self.assertEqual(result, ["Switch(config-if)#", "Switch(config-if)#"])
+
+    def test_execute_flow_pipelined_detects_error_of_each_command(self):
+        """Check that error map will be checked for the output of the each command"""
+        self._create_pipelined_session(output="vlan 5000\n% Invalid VLAN\nSwitch(config)#exit\nSwitch#")
+        # act
+        with self.assertRaisesRegexp(CommandExecutionException,
+                                     "Command #1 'vlan 5000' failed, 1 following commands were already sent.*"
+                                     "wrong VLAN"):
+            self.run_flow.execute_flow(["vlan 5000", "exit"], is_config=True, pipelined=True,
+                                       error_map={"% Invalid": "wrong VLAN"})
+
+    def test_execute_flow_pipelined_error_names_command_number(self):
+        """Check that number of the failed command will be counted in all commands, not in the block"""
+        self.run_flow.PIPELINE_BLOCK_SIZE = 2
+        session = self._create_pipelined_session(output=None)
+        session.session.hardware_expect.side_effect = ["vlan 10\nSwitch(config-vlan)#exit\nSwitch(config)#",
+                                                       "vlan 5000\n% Invalid VLAN\nSwitch(config)#"]
+        error = CommandExecutionException("wrong VLAN")
+        # act
+        with self.assertRaises(CommandExecutionException) as context:
+            self.run_flow.execute_flow(["vlan 10", "exit", "vlan 5000"], is_config=True, pipelined=True,
+                                       error_map={"% Invalid": error})
+        # verify
+        self.assertEqual(context.exception.args,
+                         ("wrong VLAN", "Command #3 'vlan 5000' failed, 0 following commands were already sent "
+                                        "to the device"))
+        self.assertEqual(error.args, ("wrong VLAN",))
+
+    def test_execute_flow_pipelined_without_command_echo(self):
+        """Check that exception will be raised if device doesn't echo commands"""
+        self._create_pipelined_session(output="Switch(config)#")
+        # act
+        with self.assertRaisesRegexp(CommandExecutionException, "Cannot find command 'vlan 10'"):
+            self.run_flow.execute_flow(["vlan 10"], is_config=True, pipelined=True)
+
+    def _create_streaming_session(self, chunks):
+        session = mock.MagicMock()
+        session.command_mode.prompt = r"Switch#\s*$"
+        session.session._receive.side_effect = chunks
+        self.cli_handler.get_cli_service.return_value = mock.MagicMock(__enter__=mock.MagicMock(return_value=session))
+        return session
+
+    def test_execute_flow_streaming(self):
+        """Check that output chunks will be yielded as they are received without the command echo"""
+        session = self._create_streaming_session(["show tech", "-support\nline 1\n", SessionReadTimeout(),
+                                                  "line 2\nSwi", "tch#", "show clock\n10:00\nSwitch#"])
+        # act
+        result = list(self.run_flow.execute_flow_streaming(["show tech-support", "show clock"]))
+        # verify
+        self.assertEqual(result, ["line 1\n", "line 2\nSwi", "tch#", "\n", "10:00\nSwitch#"])
+        session.session.send_line.assert_has_calls([mock.call("show tech-support", self.logger),
+                                                    mock.call("show clock", self.logger)])
+        self.cli_handler.get_cli_service.assert_called_once_with(self.cli_handler.enable_mode)
+        self.assertIsNone(session.session.cached_command_mode)
+
+    def test_execute_flow_streaming_keeps_only_output_tail(self):
+        """Check that prompt will be matched only at the end of the output tail"""
+        self.run_flow.STREAM_TAIL_SIZE = 10
+        self._create_streaming_session(["show run\n", "Switch# text\n" * 5, "Switch#"])
+        # act
+        result = "".join(self.run_flow.execute_flow_streaming("show run", is_config=True))
+        # verify
+        self.assertEqual(result, "Switch# text\n" * 5 + "Switch#")
+        self.cli_handler.get_cli_service.assert_called_once_with(self.cli_handler.config_mode)
+
+    def test_execute_flow_streaming_without_command_echo(self):
+        self._create_streaming_session(["10:00\nSwitch#"])
+        # act
+        result = list(self.run_flow.execute_flow_streaming("show clock"))
+        # verify
+        self.assertEqual(result, ["10:00\nSwitch#"])
+
+    @mock.patch("cloudshell.devices.flows.cli_action_flows.time")
+    def test_execute_flow_streaming_idle_timeout(self, time_module):
+        """Check that exception will be raised if device doesn't send anything during the idle timeout"""
+        time_module.time.side_effect = [0, 30, 61]
+        self._create_streaming_session([SessionReadTimeout(), SessionReadTimeout()])
+        # act
+        with self.assertRaisesRegexp(ExpectedSessionException, "No output for the command 'show clock'"):
+            list(self.run_flow.execute_flow_streaming("show clock"))
+
+    def test_execute_flow_to_sink(self):
+        """Check that output will be written to the sink"""
+        sink = mock.MagicMock()
+        self._create_streaming_session(["show clock\n10:00\n", "Switch#"])
+        # act
+        result = self.run_flow.execute_flow_to_sink(sink, "show clock")
+        # verify
+        self.assertEqual(result, len("10:00\nSwitch#"))
+        sink.write.assert_has_calls([mock.call("10:00\n"), mock.call("Switch#")])
+
 
 class TestSaveConfigurationFlow(unittest.TestCase):
     def test_execute_flow_does_nothing(self):
@@ -138,6 +264,29 @@ class TestAddVlanFlow(unittest.TestCase):
         self.assertIsNone(
             tested_class.execute_flow(vlan_range, port_mode, port_name, qnq, c_tag))
 
+    def test_execute_batch_flow(self):
+        """Check that method will execute flow for the each VLAN range and return all outputs"""
+        tested_class = AddVlanFlow(mock.MagicMock(), mock.MagicMock())
+        tested_class.execute_flow = mock.MagicMock(side_effect=["VLAN 10 added", None, "VLAN 30-40 added"])
+        # act
+        result = tested_class.execute_batch_flow(["10", "20", "30-40"], "trunk", "port name", False, "")
+        # verify
+        self.assertEqual(result, "VLAN 10 added\nVLAN 30-40 added")
+        self.assertEqual(tested_class.execute_flow.call_args_list, [
+            mock.call(vlan_range=vlan_range, port_mode="trunk", port_name="port name", qnq=False, c_tag="")
+            for vlan_range in ("10", "20", "30-40")])
+
+    def test_execute_batch_flow_failed(self):
+        """Check that method will execute the all VLAN ranges and raise errors of the failed ones"""
+        tested_class = AddVlanFlow(mock.MagicMock(), mock.MagicMock())
+        tested_class.execute_flow = mock.MagicMock(side_effect=[Exception("boom 10"), "output 20",
+                                                                Exception("boom 30")])
+        # act
+        with self.assertRaisesRegexp(CommandExecutionException, "^VLAN 10: boom 10\nVLAN 30: boom 30$"):
+            tested_class.execute_batch_flow(["10", "20", "30"], "trunk", "port name", False, "")
+        # verify
+        self.assertEqual(tested_class.execute_flow.call_count, 3)
+
 
 class TestRemoveVlanFlow(unittest.TestCase):
     def test_execute_flow_does_nothing(self):
@@ -160,6 +309,28 @@ class TestRemoveVlanFlow(unittest.TestCase):
         self.assertIsNone(tested_class.execute_flow(
             vlan_range, port_name, port_mode, action_map, error_map))
 
+    def test_execute_batch_flow(self):
+        """Check that method will execute flow for the each VLAN range and return all outputs"""
+        tested_class = RemoveVlanFlow(mock.MagicMock(), mock.MagicMock())
+        tested_class.execute_flow = mock.MagicMock(side_effect=["VLAN 10 removed", "VLAN 20 removed"])
+        # act
+        result = tested_class.execute_batch_flow(["10", "20"], "port name", "trunk")
+        # verify
+        self.assertEqual(result, "VLAN 10 removed\nVLAN 20 removed")
+        self.assertEqual(tested_class.execute_flow.call_args_list, [
+            mock.call(vlan_range=vlan_range, port_name="port name", port_mode="trunk") for vlan_range in ("10", "20")])
+
+
+class TestGetPortVlansFlow(unittest.TestCase):
+    def test_execute_flow_does_nothing(self):
+        class TestedClass(GetPortVlansFlow):
+            def execute_flow(self, port_names):
+                return super(TestedClass, self).execute_flow(port_names)
+
+        tested_class = TestedClass(mock.MagicMock(), mock.MagicMock())
+
+        self.assertIsNone(tested_class.execute_flow(["port name"]))
+
 
 class TestLoadFirmwareFlow(unittest.TestCase):
     def test_execute_flow_does_nothing(self):
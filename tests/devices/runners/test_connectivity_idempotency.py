@@ -0,0 +1,59 @@
+import unittest
+
+import mock
+
+from cloudshell.devices.runners.connectivity_idempotency import ConnectivityIdempotencyCache
+
+
+class TestConnectivityIdempotencyCache(unittest.TestCase):
+    def setUp(self):
+        self.timer = mock.MagicMock(return_value=100)
+        self.cache = ConnectivityIdempotencyCache(ttl=10, max_size=2, timer=self.timer)
+
+    def test_get(self):
+        """Check that cache will return results stored for the key"""
+        self.cache.set(("action 1", "hash"), [(True, "success message")])
+        # act
+        result = self.cache.get(("action 1", "hash"))
+        # verify
+        self.assertEqual(result, [(True, "success message")])
+        self.assertIsNone(self.cache.get(("action 1", "other hash")))
+
+    def test_get_expired(self):
+        """Check that cache will not return results after TTL is over"""
+        self.cache.set(("action 1", "hash"), [(True, "success message")])
+        self.timer.return_value = 110
+        # act
+        result = self.cache.get(("action 1", "hash"))
+        # verify
+        self.assertIsNone(result)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_set_evicts_least_recently_used(self):
+        """Check that cache will evict least recently used entry when size limit is reached"""
+        self.cache.set("key 1", [])
+        self.cache.set("key 2", [])
+        self.cache.get("key 1")
+        # act
+        self.cache.set("key 3", [])
+        # verify
+        self.assertEqual(len(self.cache), 2)
+        self.assertEqual(self.cache.get("key 1"), [])
+        self.assertIsNone(self.cache.get("key 2"))
+        self.assertEqual(self.cache.get("key 3"), [])
+
+    def test_set_evicts_expired(self):
+        """Check that cache will remove expired entries on set"""
+        self.cache.set("key 1", [])
+        self.timer.return_value = 110
+        # act
+        self.cache.set("key 2", [])
+        # verify
+        self.assertEqual(len(self.cache), 1)
+
+    def test_clear(self):
+        self.cache.set("key 1", [])
+        # act
+        self.cache.clear()
+        # verify
+        self.assertEqual(len(self.cache), 0)
@@ -0,0 +1,58 @@
+import unittest
+
+from cloudshell.devices.runners.connectivity_metrics import FlowMetrics, ConnectivityMetricsSink, \
+    ConnectivityMetricsCollector
+
+
+class TestFlowMetrics(unittest.TestCase):
+    def test_str(self):
+        flow_metrics = FlowMetrics(flow_name="add_vlan",
+                                   vlan_id="10-20",
+                                   port_name="Switch/Chassis 0/Port 1",
+                                   action_ids=["action id"],
+                                   wait_time=0.5,
+                                   execution_time=1.25,
+                                   success=False)
+        # act
+        result = str(flow_metrics)
+        # verify
+        self.assertEqual(result, "add_vlan VLAN 10-20 on Switch/Chassis 0/Port 1: wait 0.500s, "
+                                 "execution 1.250s, failed")
+
+
+class TestConnectivityMetricsSink(unittest.TestCase):
+    def test_record_does_nothing(self):
+        self.assertIsNone(ConnectivityMetricsSink().record(flow_metrics=None))
+
+
+class TestConnectivityMetricsCollector(unittest.TestCase):
+    def setUp(self):
+        self.collector = ConnectivityMetricsCollector()
+
+    def _create_flow_metrics(self, action_ids):
+        return FlowMetrics(flow_name="remove_vlan_batch",
+                           vlan_id=["10", "20"],
+                           port_name="port name",
+                           action_ids=action_ids,
+                           wait_time=0,
+                           execution_time=0,
+                           success=True)
+
+    def test_get(self):
+        """Check that collector will return metrics of the all flows executed for the action"""
+        first_metrics = self._create_flow_metrics(["action 1", "action 2"])
+        second_metrics = self._create_flow_metrics(["action 2"])
+        # act
+        self.collector.record(first_metrics)
+        self.collector.record(second_metrics)
+        # verify
+        self.assertEqual(self.collector.get("action 1"), [first_metrics])
+        self.assertEqual(self.collector.get("action 2"), [first_metrics, second_metrics])
+        self.assertEqual(self.collector.get("unknown action"), [])
+
+    def test_clear(self):
+        self.collector.record(self._create_flow_metrics(["action 1"]))
+        # act
+        self.collector.clear()
+        # verify
+        self.assertEqual(self.collector.get("action 1"), [])
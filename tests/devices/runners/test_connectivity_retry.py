@@ -0,0 +1,91 @@
+import socket
+import unittest
+
+import mock
+from cloudshell.cli.session.session_exceptions import SessionReadTimeout, CommandExecutionException
+from cloudshell.cli.session_pool_manager import SessionPoolException
+
+from cloudshell.devices.runners.connectivity_retry import RetryPolicy, DeviceCircuitBreaker
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_is_transient(self):
+        """Check that only connection and session errors are considered as transient"""
+        policy = RetryPolicy()
+        # verify
+        self.assertTrue(policy.is_transient(SessionReadTimeout()))
+        self.assertTrue(policy.is_transient(socket.error()))
+        self.assertTrue(policy.is_transient(EOFError()))
+        self.assertFalse(policy.is_transient(CommandExecutionException()))
+        self.assertFalse(policy.is_transient(Exception()))
+
+    @mock.patch("cloudshell.devices.runners.connectivity_retry.random")
+    def test_get_delay(self, random):
+        """Check that delay grows exponentially up to the max backoff and is reduced by the jitter"""
+        policy = RetryPolicy(backoff=1, backoff_factor=2, max_backoff=5, jitter=0.5)
+        random.random.return_value = 0
+        # act
+        delays = [policy.get_delay(attempt) for attempt in range(1, 5)]
+        random.random.return_value = 1
+        jittered_delay = policy.get_delay(2)
+        # verify
+        self.assertEqual(delays, [1, 2, 4, 5])
+        self.assertEqual(jittered_delay, 1)
+
+
+class TestDeviceCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.timer = mock.MagicMock(return_value=100)
+        self.breaker = DeviceCircuitBreaker(failure_threshold=2, reset_timeout=10, timer=self.timer)
+
+    def test_opens_after_consecutive_failures(self):
+        """Check that breaker will block the device after the threshold of the consecutive failures"""
+        self.breaker.record_unreachable("switch")
+        self.assertTrue(self.breaker.allow("switch"))
+        # act
+        self.breaker.record_unreachable("switch")
+        # verify
+        self.assertFalse(self.breaker.allow("switch"))
+        self.assertTrue(self.breaker.is_open("switch"))
+        self.assertTrue(self.breaker.allow("other switch"))
+
+    def test_reachable_resets_failures(self):
+        """Check that failures count is reset once device responds"""
+        self.breaker.record_unreachable("switch")
+        self.breaker.record_reachable("switch")
+        # act
+        self.breaker.record_unreachable("switch")
+        # verify
+        self.assertTrue(self.breaker.allow("switch"))
+
+    def test_allows_one_trial_after_reset_timeout(self):
+        """Check that only one trial flow is allowed once reset timeout is over"""
+        self.breaker.record_unreachable("switch")
+        self.breaker.record_unreachable("switch")
+        self.timer.return_value = 110
+        # act
+        results = [self.breaker.allow("switch"), self.breaker.allow("switch")]
+        self.breaker.record_reachable("switch")
+        # verify
+        self.assertEqual(results, [True, False])
+        self.assertFalse(self.breaker.is_open("switch"))
+
+    def test_record_failure(self):
+        """Check that only connection errors will be counted as device unreachability"""
+        errors = [socket.error(), SessionPoolException(), SessionReadTimeout()]
+        # act
+        for error in errors:
+            self.breaker.record_failure("switch", error)
+        # verify
+        self.assertTrue(self.breaker.allow("switch"))
+        self.breaker.record_failure("switch", EOFError())
+        self.assertFalse(self.breaker.allow("switch"))
+
+    def test_record_failure_device_error(self):
+        """Check that error reported by the device will reset failures count"""
+        self.breaker.record_failure("switch", socket.error())
+        # act
+        self.breaker.record_failure("switch", CommandExecutionException("invalid command"))
+        self.breaker.record_failure("switch", socket.error())
+        # verify
+        self.assertTrue(self.breaker.allow("switch"))
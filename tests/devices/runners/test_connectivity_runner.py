@@ -1,9 +1,20 @@
+import json
+import socket
+import threading
+import time
 import unittest
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
 import mock
+from cloudshell.cli.session.session_exceptions import SessionReadTimeout, CommandExecutionException
 
-from cloudshell.devices.runners.connectivity_runner import ConnectivityRunner
+from cloudshell.devices.flows.cli_action_flows import AddVlanFlow, RemoveVlanFlow
+from cloudshell.devices.networking_utils import VlanSet, KeyedLock
+from cloudshell.devices.runners.connectivity_idempotency import ConnectivityIdempotencyCache
+from cloudshell.devices.runners.connectivity_metrics import ConnectivityMetricsCollector
+from cloudshell.devices.runners.connectivity_retry import RetryPolicy, DeviceCircuitBreaker
+from cloudshell.devices.runners.connectivity_runner import ConnectivityRunner, ConnectivityActionResults, \
+    PortTaskQueue
 
 
 class TestConnectivityRunner(unittest.TestCase):
@@ -23,6 +34,26 @@ class TestConnectivityRunner(unittest.TestCase):
 
         self.connectivity_runner = TestedConnectivityRunner(logger=self.logger, cli_handler=self.cli_handler)
 
+    @staticmethod
+    def _create_action(action_id, action_type, vlan_id, port_name="Switch/Chassis 0/Port 1", mode="Trunk"):
+        return {"actionId": action_id,
+                "type": action_type,
+                "actionTarget": {"fullName": port_name, "fullAddress": "192.168.1.1/0/1"},
+                "connectionParams": {"vlanId": vlan_id, "mode": mode, "vlanServiceAttributes": []},
+                "connectorAttributes": []}
+
+    @staticmethod
+    def _create_add_vlan_flow(**kwargs):
+        flow = AddVlanFlow(cli_handler=mock.MagicMock(), logger=mock.MagicMock())
+        flow.execute_flow = mock.MagicMock(**kwargs)
+        return flow
+
+    @staticmethod
+    def _create_remove_vlan_flow(**kwargs):
+        flow = RemoveVlanFlow(cli_handler=mock.MagicMock(), logger=mock.MagicMock())
+        flow.execute_flow = mock.MagicMock(**kwargs)
+        return flow
+
     def test_abstract_methods(self):
         """Check that instance can't be instantiated without implementation of the all abstract methods"""
         class TestedClass(ConnectivityRunner):
@@ -38,7 +69,15 @@ class TestConnectivityRunner(unittest.TestCase):
         # act
         result = self.connectivity_runner._get_vlan_list(vlan_str=vlan_str)
         # verify
-        self.assertEqual(result, ["21-23", "19", "10-15"])
+        self.assertEqual(result, ["10-15", "19", "21-23"])
+
+    def test_get_vlan_list_merges_overlapping_ranges(self):
+        """Check that method will merge overlapping and adjacent VLAN ranges"""
+        vlan_str = "10-20,15-30,31,40"
+        # act
+        result = self.connectivity_runner._get_vlan_list(vlan_str=vlan_str)
+        # verify
+        self.assertEqual(result, ["10-31", "40"])
 
     def test_get_vlan_list_vlan_range_range_is_not_supported(self):
         """Check that method will return list with VLANs between the given range and change start/end if needed"""
@@ -49,55 +88,45 @@ class TestConnectivityRunner(unittest.TestCase):
         # verify
         self.assertEqual(result, ["10", "11", "12"])
 
-    @mock.patch("cloudshell.devices.runners.connectivity_runner.validate_vlan_number")
-    def test_get_vlan_list_invalid_vlan_number(self, validate_vlan_number):
+    def test_get_vlan_list_invalid_vlan_number(self):
         """Check that method will raise Exception if VLAN number is not valid"""
-        validate_vlan_number.return_value = False
         vlan_str = "5000"
         # act
         with self.assertRaisesRegexp(Exception, "Wrong VLAN number detected 5000"):
             self.connectivity_runner._get_vlan_list(vlan_str=vlan_str)
 
-    @mock.patch("cloudshell.devices.runners.connectivity_runner.validate_vlan_range")
-    def test_get_vlan_list_invalid_vlan_range(self, validate_vlan_range):
+    def test_get_vlan_list_invalid_vlan_range(self):
         """Check that method will raise Exception if VLAN range is not valid"""
         self.connectivity_runner.IS_VLAN_RANGE_SUPPORTED = True
-        validate_vlan_range.return_value = False
         vlan_str = "5000-5005"
         # act
         with self.assertRaisesRegexp(Exception, "Wrong VLANs range detected 5000-5005"):
             self.connectivity_runner._get_vlan_list(vlan_str=vlan_str)
 
-    @mock.patch("cloudshell.devices.runners.connectivity_runner.validate_vlan_number")
-    def test_get_vlan_list_invalid_vlan_range_range_is_not_supported(self, validate_vlan_number):
+    def test_get_vlan_list_invalid_vlan_range_range_is_not_supported(self):
         """Check that method will raise Exception if VLAN range is not valid and IS_VLAN_RANGE_SUPPORTED is False"""
         self.connectivity_runner.IS_VLAN_RANGE_SUPPORTED = False
-        validate_vlan_number.return_value = False
         vlan_str = "5000-5005"
         # act
         with self.assertRaisesRegexp(Exception, "Wrong VLANs range detected 5000-5005"):
             self.connectivity_runner._get_vlan_list(vlan_str=vlan_str)
 
-    @mock.patch("cloudshell.devices.runners.connectivity_runner.current_thread")
-    def test_add_vlan(self, current_thread):
-        """Check that method will execute add_vlan_flow and add it to the result"""
+    def test_add_vlan(self):
+        """Check that method will execute add_vlan_flow and return its result"""
         vlan_id = "some vlan id"
         full_name = "some full name"
         port_mode = "port mode"
         qnq = mock.MagicMock()
         c_tag = mock.MagicMock()
-        expected_res = defaultdict(list)
         action_result = mock.MagicMock()
-        expected_res[current_thread().name] = [(True, action_result)]
-        self.connectivity_runner.add_vlan_flow = mock.MagicMock(
-            execute_flow=mock.MagicMock(
-                return_value=action_result))
+        self.connectivity_runner.add_vlan_flow = self._create_add_vlan_flow(
+                return_value=action_result)
         # act
-        self.connectivity_runner.add_vlan(vlan_id=vlan_id,
-                                          full_name=full_name,
-                                          port_mode=port_mode,
-                                          qnq=qnq,
-                                          c_tag=c_tag)
+        result = self.connectivity_runner.add_vlan(vlan_id=vlan_id,
+                                                   full_name=full_name,
+                                                   port_mode=port_mode,
+                                                   qnq=qnq,
+                                                   c_tag=c_tag)
         # verify
         self.connectivity_runner.add_vlan_flow.execute_flow.assert_called_once_with(
             vlan_range=vlan_id,
@@ -106,28 +135,24 @@ class TestConnectivityRunner(unittest.TestCase):
             qnq=qnq,
             c_tag=c_tag)
 
-        self.assertEqual(self.connectivity_runner.result, expected_res)
+        self.assertEqual(result, (True, action_result))
 
-    @mock.patch("cloudshell.devices.runners.connectivity_runner.current_thread")
-    def test_add_vlan_failed(self, current_thread):
-        """Check that method will execute add_vlan_flow and add error message to the result"""
+    def test_add_vlan_failed(self):
+        """Check that method will execute add_vlan_flow and return error message"""
         vlan_id = "some vlan id"
         full_name = "some full name"
         port_mode = "port mode"
         qnq = mock.MagicMock()
         c_tag = mock.MagicMock()
-        expected_res = defaultdict(list)
         error_msg = "some exception message"
-        expected_res[current_thread().name] = [(False, error_msg)]
-        self.connectivity_runner.add_vlan_flow = mock.MagicMock(
-            execute_flow=mock.MagicMock(
-                side_effect=Exception(error_msg)))
+        self.connectivity_runner.add_vlan_flow = self._create_add_vlan_flow(
+                side_effect=Exception(error_msg))
         # act
-        self.connectivity_runner.add_vlan(vlan_id=vlan_id,
-                                          full_name=full_name,
-                                          port_mode=port_mode,
-                                          qnq=qnq,
-                                          c_tag=c_tag)
+        result = self.connectivity_runner.add_vlan(vlan_id=vlan_id,
+                                                   full_name=full_name,
+                                                   port_mode=port_mode,
+                                                   qnq=qnq,
+                                                   c_tag=c_tag)
         # verify
         self.connectivity_runner.add_vlan_flow.execute_flow.assert_called_once_with(
             vlan_range=vlan_id,
@@ -136,55 +161,237 @@ class TestConnectivityRunner(unittest.TestCase):
             qnq=qnq,
             c_tag=c_tag)
 
-        self.assertEqual(self.connectivity_runner.result, expected_res)
+        self.assertEqual(result, (False, error_msg))
 
-    @mock.patch("cloudshell.devices.runners.connectivity_runner.current_thread")
-    def test_remove_vlan(self, current_thread):
-        """Check that method will execute remove_vlan_flow and add it to the result"""
+    def test_remove_vlan(self):
+        """Check that method will execute remove_vlan_flow and return its result"""
         vlan_id = "some vlan id"
         full_name = "some full name"
         port_mode = "port mode"
-        expected_res = defaultdict(list)
         action_result = mock.MagicMock()
-        expected_res[current_thread().name] = [(True, action_result)]
-        self.connectivity_runner.remove_vlan_flow = mock.MagicMock(
-            execute_flow=mock.MagicMock(
-                return_value=action_result))
+        self.connectivity_runner.remove_vlan_flow = self._create_remove_vlan_flow(
+                return_value=action_result)
         # act
-        self.connectivity_runner.remove_vlan(vlan_id=vlan_id,
-                                             full_name=full_name,
-                                             port_mode=port_mode)
+        result = self.connectivity_runner.remove_vlan(vlan_id=vlan_id,
+                                                      full_name=full_name,
+                                                      port_mode=port_mode)
         # verify
         self.connectivity_runner.remove_vlan_flow.execute_flow.assert_called_once_with(
             vlan_range=vlan_id,
             port_mode=port_mode,
             port_name=full_name)
 
-        self.assertEqual(self.connectivity_runner.result, expected_res)
+        self.assertEqual(result, (True, action_result))
 
-    @mock.patch("cloudshell.devices.runners.connectivity_runner.current_thread")
-    def test_remove_vlan_failed(self, current_thread):
-        """Check that method will execute remove_vlan_flow and add error message to the result"""
+    def test_remove_vlan_failed(self):
+        """Check that method will execute remove_vlan_flow and return error message"""
         vlan_id = "some vlan id"
         full_name = "some full name"
         port_mode = "port mode"
-        expected_res = defaultdict(list)
         error_msg = "some exception message"
-        expected_res[current_thread().name] = [(False, error_msg)]
-        self.connectivity_runner.remove_vlan_flow = mock.MagicMock(
-            execute_flow=mock.MagicMock(
-                side_effect=Exception(error_msg)))
+        self.connectivity_runner.remove_vlan_flow = self._create_remove_vlan_flow(
+                side_effect=Exception(error_msg))
         # act
-        self.connectivity_runner.remove_vlan(vlan_id=vlan_id,
-                                             full_name=full_name,
-                                             port_mode=port_mode)
+        result = self.connectivity_runner.remove_vlan(vlan_id=vlan_id,
+                                                      full_name=full_name,
+                                                      port_mode=port_mode)
         # verify
         self.connectivity_runner.remove_vlan_flow.execute_flow.assert_called_once_with(
             vlan_range=vlan_id,
             port_mode=port_mode,
             port_name=full_name)
 
-        self.assertEqual(self.connectivity_runner.result, expected_res)
+        self.assertEqual(result, (False, error_msg))
+
+    def test_add_vlan_batch(self):
+        """Check that method will execute batch add_vlan_flow and return its result"""
+        vlan_range_list = ["10", "20-30"]
+        full_name = "some full name"
+        port_mode = "port mode"
+        qnq = mock.MagicMock()
+        c_tag = mock.MagicMock()
+        action_result = mock.MagicMock()
+        self.connectivity_runner.add_vlan_flow = mock.MagicMock(
+            execute_batch_flow=mock.MagicMock(
+                return_value=action_result))
+        # act
+        result = self.connectivity_runner.add_vlan_batch(vlan_range_list=vlan_range_list,
+                                                         full_name=full_name,
+                                                         port_mode=port_mode,
+                                                         qnq=qnq,
+                                                         c_tag=c_tag)
+        # verify
+        self.connectivity_runner.add_vlan_flow.execute_batch_flow.assert_called_once_with(
+            vlan_range_list=vlan_range_list,
+            port_mode=port_mode,
+            port_name=full_name,
+            qnq=qnq,
+            c_tag=c_tag)
+
+        self.assertEqual(result, (True, action_result))
+
+    def test_remove_vlan_batch_failed(self):
+        """Check that method will execute batch remove_vlan_flow and return error message"""
+        vlan_range_list = ["10", "20-30"]
+        full_name = "some full name"
+        port_mode = "port mode"
+        error_msg = "some exception message"
+        self.connectivity_runner.remove_vlan_flow = mock.MagicMock(
+            execute_batch_flow=mock.MagicMock(
+                side_effect=Exception(error_msg)))
+        # act
+        result = self.connectivity_runner.remove_vlan_batch(vlan_range_list=vlan_range_list,
+                                                            full_name=full_name,
+                                                            port_mode=port_mode)
+        # verify
+        self.connectivity_runner.remove_vlan_flow.execute_batch_flow.assert_called_once_with(
+            vlan_range_list=vlan_range_list,
+            port_name=full_name,
+            port_mode=port_mode)
+
+        self.assertEqual(result, (False, error_msg))
+
+    def test_plan_vlan_changes_merges_duplicates(self):
+        """Check that method will merge the same and overlapping VLAN changes requested by the different actions"""
+        remove_vlan_list = [("action 1", VlanSet.from_string("10"), "port 1", "trunk"),
+                            ("action 2", VlanSet.from_string("10"), "port 1", "trunk")]
+        add_vlan_list = [("action 3", VlanSet.from_string("20-30"), "port 1", "trunk", False, ""),
+                         ("action 4", VlanSet.from_string("25-35,40"), "port 1", "trunk", False, ""),
+                         ("action 5", VlanSet.from_string("20"), "port 2", "trunk", False, "")]
+        results = ConnectivityActionResults()
+        # act
+        remove_vlan_plan, add_vlan_plan = self.connectivity_runner._plan_vlan_changes(remove_vlan_list,
+                                                                                      add_vlan_list,
+                                                                                      results)
+        # verify
+        self.assertEqual(remove_vlan_plan, {("10", "port 1", "trunk"): ["action 1", "action 2"]})
+        self.assertEqual(add_vlan_plan.items(), [(("20-35", "port 1", "trunk", False, ""), ["action 3", "action 4"]),
+                                                 (("40", "port 1", "trunk", False, ""), ["action 4"]),
+                                                 (("20", "port 2", "trunk", False, ""), ["action 5"])])
+        self.assertEqual(results.get("action 1"), [])
+
+    def test_plan_vlan_changes_range_is_not_supported(self):
+        """Check that method will split VLAN ranges into the separate VLANs if ranges are not supported"""
+        self.connectivity_runner.IS_VLAN_RANGE_SUPPORTED = False
+        add_vlan_list = [("action 1", VlanSet.from_string("10-11"), "port 1", "trunk", False, ""),
+                         ("action 2", VlanSet.from_string("11"), "port 1", "trunk", False, "")]
+        results = ConnectivityActionResults()
+        # act
+        remove_vlan_plan, add_vlan_plan = self.connectivity_runner._plan_vlan_changes([], add_vlan_list, results)
+        # verify
+        self.assertEqual(remove_vlan_plan, {})
+        self.assertEqual(add_vlan_plan.items(), [(("10", "port 1", "trunk", False, ""), ["action 1"]),
+                                                 (("11", "port 1", "trunk", False, ""), ["action 1", "action 2"])])
+
+    def test_plan_vlan_changes_cancels_opposite_changes(self):
+        """Check that method will skip removal of the VLAN added to the same port and report it completed"""
+        remove_vlan_list = [("action 1", VlanSet.from_string("10,20"), "port 1", "trunk"),
+                            ("action 2", VlanSet.from_string("30-40"), "port 1", "trunk")]
+        add_vlan_list = [("action 3", VlanSet.from_string("10"), "port 1", "trunk", False, ""),
+                         ("action 3", VlanSet.from_string("20"), "port 1", "access", False, ""),
+                         ("action 4", VlanSet.from_string("30"), "port 1", "trunk", True, ""),
+                         ("action 5", VlanSet.from_string("35-45"), "port 1", "trunk", False, "")]
+        results = ConnectivityActionResults()
+        # act
+        remove_vlan_plan, add_vlan_plan = self.connectivity_runner._plan_vlan_changes(remove_vlan_list,
+                                                                                      add_vlan_list,
+                                                                                      results)
+        # verify
+        self.assertEqual(remove_vlan_plan.items(), [(("20", "port 1", "trunk"), ["action 1"]),
+                                                    (("30-34", "port 1", "trunk"), ["action 2"])])
+        self.assertEqual(add_vlan_plan.items(), [(("10", "port 1", "trunk", False, ""), ["action 3"]),
+                                                 (("35-45", "port 1", "trunk", False, ""), ["action 5"]),
+                                                 (("20", "port 1", "access", False, ""), ["action 3"]),
+                                                 (("30", "port 1", "trunk", True, ""), ["action 4"])])
+        message = "VLAN {} is added back to port 1 by the same request, removal is skipped"
+        self.assertEqual(results.get("action 1"), [(True, message.format("10"))])
+        self.assertEqual(results.get("action 2"), [(True, message.format("35-40"))])
+        self.assertEqual(results.get("action 3"), [])
+        self.assertEqual(results.get("action 4"), [])
+        self.assertEqual(results.get("action 5"), [])
+
+    def test_plan_vlan_changes_cancellation_disabled(self):
+        """Check that method will keep opposite changes if CANCEL_OPPOSITE_VLAN_ACTIONS is False"""
+        self.connectivity_runner.CANCEL_OPPOSITE_VLAN_ACTIONS = False
+        remove_vlan_list = [("action 1", VlanSet.from_string("10"), "port 1", "trunk")]
+        add_vlan_list = [("action 2", VlanSet.from_string("10"), "port 1", "trunk", False, "")]
+        results = ConnectivityActionResults()
+        # act
+        remove_vlan_plan, add_vlan_plan = self.connectivity_runner._plan_vlan_changes(remove_vlan_list,
+                                                                                      add_vlan_list,
+                                                                                      results)
+        # verify
+        self.assertEqual(remove_vlan_plan, {("10", "port 1", "trunk"): ["action 1"]})
+        self.assertEqual(add_vlan_plan, {("10", "port 1", "trunk", False, ""): ["action 2"]})
+
+    def test_get_add_vlan_tasks(self):
+        """Check that method will create task for the each VLAN if flow doesn't override execute_batch_flow"""
+        self.connectivity_runner.add_vlan_flow = self._create_add_vlan_flow()
+        add_vlan_plan = OrderedDict([(("10", "port 1", "trunk", False, ""), ["action 1"]),
+                                     (("20", "port 1", "trunk", False, ""), ["action 2", "action 3"])])
+        # act
+        result = self.connectivity_runner._get_add_vlan_tasks(add_vlan_plan)
+        # verify
+        self.assertEqual(result, [
+            (self.connectivity_runner.add_vlan, ("10", "port 1", "trunk", False, ""), ["action 1"]),
+            (self.connectivity_runner.add_vlan, ("20", "port 1", "trunk", False, ""), ["action 2", "action 3"])])
+
+    def test_get_add_vlan_tasks_batch_flow_overridden(self):
+        """Check that method will create one task for the all VLANs with the same port settings"""
+        class TestedAddVlanFlow(AddVlanFlow):
+            def execute_flow(self, vlan_range, port_mode, port_name, qnq, c_tag):
+                pass
+
+            def execute_batch_flow(self, vlan_range_list, port_mode, port_name, qnq, c_tag):
+                pass
+
+        self.connectivity_runner.add_vlan_flow = TestedAddVlanFlow(mock.MagicMock(), mock.MagicMock())
+        add_vlan_plan = OrderedDict([(("10", "port 1", "trunk", False, ""), ["action 1"]),
+                                     (("11", "port 1", "trunk", False, ""), ["action 1"]),
+                                     (("20", "port 1", "trunk", False, ""), ["action 2", "action 3"]),
+                                     (("30", "port 2", "trunk", False, ""), ["action 4"])])
+        # act
+        result = self.connectivity_runner._get_add_vlan_tasks(add_vlan_plan)
+        # verify
+        self.assertEqual(result, [
+            (self.connectivity_runner.add_vlan_batch, (["10", "11", "20"], "port 1", "trunk", False, ""),
+             ["action 1", "action 2", "action 3"]),
+            (self.connectivity_runner.add_vlan_batch, (["30"], "port 2", "trunk", False, ""),
+             ["action 4"])])
+
+    def test_get_remove_vlan_tasks(self):
+        """Check that method will create task for the each VLAN if flow doesn't override execute_batch_flow"""
+        self.connectivity_runner.remove_vlan_flow = self._create_remove_vlan_flow()
+        remove_vlan_plan = OrderedDict([(("10", "port 1", "trunk"), ["action 1"]),
+                                        (("20", "port 1", "trunk"), ["action 2"])])
+        # act
+        result = self.connectivity_runner._get_remove_vlan_tasks(remove_vlan_plan)
+        # verify
+        self.assertEqual(result, [
+            (self.connectivity_runner.remove_vlan, ("10", "port 1", "trunk"), ["action 1"]),
+            (self.connectivity_runner.remove_vlan, ("20", "port 1", "trunk"), ["action 2"])])
+
+    def test_get_remove_vlan_tasks_batch_flow_overridden(self):
+        """Check that method will create one task for the all VLANs with the same port and port mode"""
+        class TestedRemoveVlanFlow(RemoveVlanFlow):
+            def execute_flow(self, vlan_range, port_name, port_mode, action_map=None, error_map=None):
+                pass
+
+            def execute_batch_flow(self, vlan_range_list, port_name, port_mode):
+                pass
+
+        self.connectivity_runner.remove_vlan_flow = TestedRemoveVlanFlow(mock.MagicMock(), mock.MagicMock())
+        remove_vlan_plan = OrderedDict([(("10", "port 1", "trunk"), ["action 1"]),
+                                        (("20", "port 1", "trunk"), ["action 2"]),
+                                        (("30", "port 1", "access"), ["action 3"])])
+        # act
+        result = self.connectivity_runner._get_remove_vlan_tasks(remove_vlan_plan)
+        # verify
+        self.assertEqual(result, [
+            (self.connectivity_runner.remove_vlan_batch, (["10", "20"], "port 1", "trunk"),
+             ["action 1", "action 2"]),
+            (self.connectivity_runner.remove_vlan_batch, (["30"], "port 1", "access"),
+             ["action 3"])])
 
     def test_validate_request_action_no_attr(self):
         """Check that method will raise exception if action object doesn't contain required attr"""
@@ -234,31 +441,34 @@ class TestConnectivityRunner(unittest.TestCase):
         with self.assertRaisesRegexp(Exception, "request is None or empty"):
             self.connectivity_runner.apply_connectivity_changes(request=None)
 
-    @mock.patch("cloudshell.devices.runners.connectivity_runner.jsonpickle")
-    @mock.patch("cloudshell.devices.runners.connectivity_runner.JsonRequestDeserializer")
-    def test_apply_connectivity_changes_no_json_req_holder(self, json_request_deserializer_class, jsonpickle):
+    def test_apply_connectivity_changes_no_json_req_holder(self):
         """Check that method will raise exception if json request was not correctly parsed"""
-        json_request_deserializer_class.return_value = None
+        self.connectivity_runner._request_decoder = mock.MagicMock(decode=mock.MagicMock(return_value=None))
         request = mock.MagicMock()
 
         with self.assertRaisesRegexp(Exception, "Deserialized request is None or empty"):
             self.connectivity_runner.apply_connectivity_changes(request=request)
 
+    def test_apply_connectivity_changes_missing_mandatory_field(self):
+        """Check that method will raise exception if some action misses mandatory field"""
+        action = self._create_action(action_id="some action id", action_type="setVlan", vlan_id="10")
+        del action["connectionParams"]["mode"]
+        request = json.dumps({"driverRequest": {"actions": [action]}})
+
+        with self.assertRaisesRegexp(Exception, "Mandatory field mode is missing in ApplyConnectivityChanges"):
+            self.connectivity_runner.apply_connectivity_changes(request=request)
+
     @mock.patch("cloudshell.devices.runners.connectivity_runner.DriverResponseRoot")
     @mock.patch("cloudshell.devices.runners.connectivity_runner.serialize_to_json")
-    @mock.patch("cloudshell.devices.runners.connectivity_runner.jsonpickle")
-    @mock.patch("cloudshell.devices.runners.connectivity_runner.JsonRequestDeserializer")
-    def test_apply_connectivity_changes(self, json_request_deserializer_class, jsonpickle, serialize_to_json,
+    def test_apply_connectivity_changes(self, serialize_to_json,
                                         driver_response_root_class):
         """Check that method will return serialized response"""
         response = mock.MagicMock()
         driver_response_root = mock.MagicMock()
         driver_response_root_class.return_value = driver_response_root
         serialize_to_json.return_value = response
-        json_request_deserializer = mock.MagicMock(
-            driverRequest=mock.MagicMock(actions=[]))
-
-        json_request_deserializer_class.return_value = json_request_deserializer
+        self.connectivity_runner._request_decoder = mock.MagicMock(
+            decode=mock.MagicMock(return_value=[]))
         request = mock.MagicMock()
         # act
         result = self.connectivity_runner.apply_connectivity_changes(request=request)
@@ -266,21 +476,17 @@ class TestConnectivityRunner(unittest.TestCase):
         self.assertEqual(result, response)
         serialize_to_json.assert_called_once_with(driver_response_root)
 
-    @mock.patch("cloudshell.devices.runners.connectivity_runner.Thread")
     @mock.patch("cloudshell.devices.runners.connectivity_runner.ConnectivitySuccessResponse")
     @mock.patch("cloudshell.devices.runners.connectivity_runner.serialize_to_json")
-    @mock.patch("cloudshell.devices.runners.connectivity_runner.jsonpickle")
-    @mock.patch("cloudshell.devices.runners.connectivity_runner.JsonRequestDeserializer")
-    def test_apply_connectivity_changes_set_vlan_action_success(self, json_request_deserializer_class,
-                                                                jsonpickle, serialize_to_json,
-                                                                connectivity_success_response_class, thread_class):
+    def test_apply_connectivity_changes_set_vlan_action_success(self, serialize_to_json,
+                                                                connectivity_success_response_class):
         """Check that method will add success response for the set_vlan action"""
         action_id = "some action id"
-        vlan_id = "test vlan id"
+        vlan_id = "10"
         qnq = True
         ctag = "ctag value"
-        self.connectivity_runner.result[action_id] = [(True, "success action message")]
-        self.connectivity_runner._get_vlan_list = mock.MagicMock(return_value=[vlan_id])
+        self.connectivity_runner._get_vlan_set = mock.MagicMock(return_value=VlanSet.from_string(vlan_id))
+        self.connectivity_runner._run_tasks = mock.MagicMock()
         action = mock.MagicMock(type="setVlan",
                                 actionId=action_id,
                                 connectionParams=mock.MagicMock(vlanServiceAttributes=[
@@ -290,39 +496,36 @@ class TestConnectivityRunner(unittest.TestCase):
                                                    attributeValue=ctag)
                                 ]))
 
-        json_request_deserializer = mock.MagicMock(
-            driverRequest=mock.MagicMock(actions=[action]))
-
-        json_request_deserializer_class.return_value = json_request_deserializer
+        self.connectivity_runner._request_decoder = mock.MagicMock(
+            decode=mock.MagicMock(return_value=[action]))
         request = mock.MagicMock()
 
         # act
         self.connectivity_runner.apply_connectivity_changes(request=request)
 
         # verify
-        thread_class.assert_any_call(target=self.connectivity_runner.add_vlan,
-                                     name=action_id,
-                                     args=(vlan_id, action.actionTarget.fullName, action.connectionParams.mode.lower(),
-                                           qnq, ctag))
+        self.connectivity_runner._run_tasks.assert_called_once_with(
+            [(self.connectivity_runner.add_vlan,
+              (vlan_id, action.actionTarget.fullName, action.connectionParams.mode.lower(), qnq, ctag),
+              [action_id])],
+            mock.ANY, mock.ANY)
 
         connectivity_success_response_class.assert_called_once_with(
             action, "Add Vlan {} configuration successfully completed".format(action.connectionParams.vlanId))
 
     @mock.patch("cloudshell.devices.runners.connectivity_runner.ConnectivityErrorResponse")
     @mock.patch("cloudshell.devices.runners.connectivity_runner.serialize_to_json")
-    @mock.patch("cloudshell.devices.runners.connectivity_runner.jsonpickle")
-    @mock.patch("cloudshell.devices.runners.connectivity_runner.JsonRequestDeserializer")
-    def test_apply_connectivity_changes_set_vlan_action_error(self, json_request_deserializer_class,
-                                                                jsonpickle, serialize_to_json,
+    def test_apply_connectivity_changes_set_vlan_action_error(self, serialize_to_json,
                                                                 connectivity_error_response_class):
         """Check that method will add error response for the failed set_vlan action"""
         action_id = "some action id"
-        self.connectivity_runner.result[action_id] = [(False, "failed action message")]
-        action = mock.MagicMock(type="setVlan", actionId=action_id)
-        json_request_deserializer = mock.MagicMock(
-            driverRequest=mock.MagicMock(actions=[action]))
-
-        json_request_deserializer_class.return_value = json_request_deserializer
+        self.connectivity_runner._get_vlan_set = mock.MagicMock(return_value=VlanSet.from_string("10"))
+        self.connectivity_runner.add_vlan_flow = self._create_add_vlan_flow(
+                side_effect=Exception("failed action message"))
+        action = mock.MagicMock(type="setVlan", actionId=action_id,
+                                connectionParams=mock.MagicMock(vlanServiceAttributes=[]))
+        self.connectivity_runner._request_decoder = mock.MagicMock(
+            decode=mock.MagicMock(return_value=[action]))
         request = mock.MagicMock()
 
         # act
@@ -334,58 +537,48 @@ class TestConnectivityRunner(unittest.TestCase):
                     "Add Vlan configuration details:\n"
                     "failed action message".format(action.connectionParams.vlanId))
 
-    @mock.patch("cloudshell.devices.runners.connectivity_runner.Thread")
     @mock.patch("cloudshell.devices.runners.connectivity_runner.ConnectivitySuccessResponse")
     @mock.patch("cloudshell.devices.runners.connectivity_runner.serialize_to_json")
-    @mock.patch("cloudshell.devices.runners.connectivity_runner.jsonpickle")
-    @mock.patch("cloudshell.devices.runners.connectivity_runner.JsonRequestDeserializer")
-    def test_apply_connectivity_changes_remove_vlan_action_success(self, json_request_deserializer_class,
-                                                                jsonpickle, serialize_to_json,
-                                                                connectivity_success_response_class, thread_class):
+    def test_apply_connectivity_changes_remove_vlan_action_success(self, serialize_to_json,
+                                                                connectivity_success_response_class):
         """Check that method will add success response for the remove_vlan action"""
         action_id = "some action id"
-        vlan_id = "test vlan id"
-        self.connectivity_runner.result[action_id] = [(True, "success action message")]
-        self.connectivity_runner._get_vlan_list = mock.MagicMock(return_value=[vlan_id])
+        vlan_id = "10"
+        self.connectivity_runner._get_vlan_set = mock.MagicMock(return_value=VlanSet.from_string(vlan_id))
+        self.connectivity_runner._run_tasks = mock.MagicMock()
 
         action = mock.MagicMock(type="removeVlan", actionId=action_id)
 
-        json_request_deserializer = mock.MagicMock(
-            driverRequest=mock.MagicMock(actions=[action]))
-
-        json_request_deserializer_class.return_value = json_request_deserializer
+        self.connectivity_runner._request_decoder = mock.MagicMock(
+            decode=mock.MagicMock(return_value=[action]))
         request = mock.MagicMock()
 
         # act
         self.connectivity_runner.apply_connectivity_changes(request=request)
         # verify
-        thread_class.assert_any_call(target=self.connectivity_runner.remove_vlan,
-                                     name=action_id,
-                                     args=(vlan_id, action.actionTarget.fullName, action.connectionParams.mode.lower()))
+        self.connectivity_runner._run_tasks.assert_called_once_with(
+            [(self.connectivity_runner.remove_vlan,
+              (vlan_id, action.actionTarget.fullName, action.connectionParams.mode.lower()),
+              [action_id])],
+            mock.ANY, mock.ANY)
 
         connectivity_success_response_class.assert_called_once_with(
             action, "Add Vlan {} configuration successfully completed".format(action.connectionParams.vlanId))
 
-    @mock.patch("cloudshell.devices.runners.connectivity_runner.Thread")
     @mock.patch("cloudshell.devices.runners.connectivity_runner.ConnectivitySuccessResponse")
     @mock.patch("cloudshell.devices.runners.connectivity_runner.serialize_to_json")
-    @mock.patch("cloudshell.devices.runners.connectivity_runner.jsonpickle")
-    @mock.patch("cloudshell.devices.runners.connectivity_runner.JsonRequestDeserializer")
-    def test_apply_connectivity_changes_unknown_action(self, json_request_deserializer_class,
-                                                                jsonpickle, serialize_to_json,
-                                                                connectivity_success_response_class, thread_class):
+    def test_apply_connectivity_changes_unknown_action(self, serialize_to_json,
+                                                                connectivity_success_response_class):
         """Check that method will skip unknown action"""
         action_id = "some action id"
-        vlan_id = "test vlan id"
-        self.connectivity_runner.result[action_id] = [(True, "success action message")]
-        self.connectivity_runner._get_vlan_list = mock.MagicMock(return_value=[vlan_id])
+        vlan_id = "10"
+        self.connectivity_runner._get_vlan_set = mock.MagicMock(return_value=VlanSet.from_string(vlan_id))
+        self.connectivity_runner._run_tasks = mock.MagicMock()
 
         action = mock.MagicMock(type="UNKNOWN", actionId=action_id)
 
-        json_request_deserializer = mock.MagicMock(
-            driverRequest=mock.MagicMock(actions=[action]))
-
-        json_request_deserializer_class.return_value = json_request_deserializer
+        self.connectivity_runner._request_decoder = mock.MagicMock(
+            decode=mock.MagicMock(return_value=[action]))
         request = mock.MagicMock()
 
         # act
@@ -395,6 +588,496 @@ class TestConnectivityRunner(unittest.TestCase):
         connectivity_success_response_class.assert_called_once_with(
             action, "Add Vlan {} configuration successfully completed".format(action.connectionParams.vlanId))
 
+    def test_concurrency_limit(self):
+        """Check that property will return "Sessions Concurrency Limit" attribute value as integer"""
+        self.cli_handler.resource_config.sessions_concurrency_limit = "5"
+        # act
+        result = self.connectivity_runner.concurrency_limit
+        # verify
+        self.assertEqual(result, 5)
+
+    def test_concurrency_limit_invalid_attribute(self):
+        """Check that property will return default limit if "Sessions Concurrency Limit" attribute is not valid"""
+        for limit in (None, "", "some str"):
+            self.cli_handler.resource_config.sessions_concurrency_limit = limit
+            # act
+            result = self.connectivity_runner.concurrency_limit
+            # verify
+            self.assertEqual(result, ConnectivityRunner.DEFAULT_CONCURRENCY_LIMIT)
+
+    @mock.patch("cloudshell.devices.runners.connectivity_runner.Thread")
+    def test_run_tasks(self, thread_class):
+        """Check that method will execute tasks on the pool of threads limited by the concurrency limit"""
+        self.cli_handler.resource_config.sessions_concurrency_limit = "2"
+        results = ConnectivityActionResults()
+        task_list = [(mock.MagicMock(), (vlan_id, "port {}".format(vlan_id)), ["some action id"])
+                     for vlan_id in range(10)]
+        # act
+        self.connectivity_runner._run_tasks(task_list, results)
+        # verify
+        self.assertEqual(thread_class.call_count, 2)
+        thread_class.assert_called_with(target=self.connectivity_runner._run_worker,
+                                        args=(mock.ANY, results, None))
+        self.assertEqual(thread_class.return_value.start.call_count, 2)
+        self.assertEqual(thread_class.return_value.join.call_count, 2)
+
+    @mock.patch("cloudshell.devices.runners.connectivity_runner.Thread")
+    def test_run_tasks_threads_limited_by_ports_count(self, thread_class):
+        """Check that method will not start more threads than the number of ports"""
+        self.cli_handler.resource_config.sessions_concurrency_limit = "5"
+        task_list = [(mock.MagicMock(), (vlan_id, "port {}".format(vlan_id % 2)), ["some action id"])
+                     for vlan_id in range(10)]
+        # act
+        self.connectivity_runner._run_tasks(task_list, ConnectivityActionResults())
+        # verify
+        self.assertEqual(thread_class.call_count, 2)
+
+    @mock.patch("cloudshell.devices.runners.connectivity_runner.Thread")
+    def test_run_tasks_empty_task_list(self, thread_class):
+        """Check that method will not start threads if there are no tasks to execute"""
+        # act
+        self.connectivity_runner._run_tasks([], ConnectivityActionResults())
+        # verify
+        thread_class.assert_not_called()
+
+    def test_run_tasks_executes_all_tasks(self):
+        """Check that all tasks will be executed even if there are more tasks than worker threads"""
+        self.cli_handler.resource_config.sessions_concurrency_limit = "3"
+        results = ConnectivityActionResults()
+        task_list = [(lambda vlan_id, port_name: (True, vlan_id), (vlan_id, "port name"),
+                      ["action {}".format(vlan_id % 2)])
+                     for vlan_id in range(100)]
+        # act
+        self.connectivity_runner._run_tasks(task_list, results)
+        # verify
+        self.assertEqual(sorted(message for _, message in results.get("action 0")), range(0, 100, 2))
+        self.assertEqual(sorted(message for _, message in results.get("action 1")), range(1, 100, 2))
+
+    def test_run_tasks_serializes_same_port(self):
+        """Check that tasks for the same port will not be executed in parallel, but different ports will"""
+        self.cli_handler.resource_config.sessions_concurrency_limit = "4"
+        lock = threading.Lock()
+        in_progress = defaultdict(int)
+        max_in_progress = defaultdict(int)
+
+        def target(vlan_id, port_name):
+            with lock:
+                in_progress[port_name] += 1
+                in_progress["all"] += 1
+                max_in_progress[port_name] = max(max_in_progress[port_name], in_progress[port_name])
+                max_in_progress["all"] = max(max_in_progress["all"], in_progress["all"])
+            time.sleep(0.01)
+            with lock:
+                in_progress[port_name] -= 1
+                in_progress["all"] -= 1
+            return True, vlan_id
+
+        task_list = [(target, (vlan_id, "port {}".format(vlan_id % 4)), ["action"]) for vlan_id in range(20)]
+        # act
+        self.connectivity_runner._run_tasks(task_list, ConnectivityActionResults())
+        # verify
+        self.assertEqual([max_in_progress["port {}".format(port)] for port in range(4)], [1, 1, 1, 1])
+        self.assertGreater(max_in_progress["all"], 1)
+
+    def test_run_tasks_task_failed(self):
+        """Check that unexpected task error will be added to the task actions results"""
+        results = ConnectivityActionResults()
+        task_list = [(mock.MagicMock(side_effect=Exception("unexpected error")), ("10", "port name"), ["action"])]
+        # act
+        self.connectivity_runner._run_tasks(task_list, results)
+        # verify
+        self.assertEqual(results.get("action"), [(False, "unexpected error")])
+
+    def test_run_tasks_records_flow_metrics(self):
+        """Check that metrics of the each executed task will be passed to the metrics sink"""
+        metrics_sink = ConnectivityMetricsCollector()
+        runner = type(self.connectivity_runner)(logger=self.logger, cli_handler=self.cli_handler,
+                                                metrics_sink=metrics_sink)
+        runner.add_vlan_flow = self._create_add_vlan_flow(return_value="success")
+        runner.remove_vlan_flow = self._create_remove_vlan_flow(side_effect=Exception("failed"))
+        task_list = [(runner.add_vlan, ("10", "port 1", "trunk", False, ""), ["action 1", "action 2"]),
+                     (runner.remove_vlan, ("20", "port 2", "trunk"), ["action 2"])]
+        # act
+        runner._run_tasks(task_list, ConnectivityActionResults())
+        # verify
+        action_1_metrics = metrics_sink.get("action 1")
+        self.assertEqual([(metrics.flow_name, metrics.vlan_id, metrics.port_name, metrics.success)
+                          for metrics in action_1_metrics], [("add_vlan", "10", "port 1", True)])
+        self.assertGreaterEqual(action_1_metrics[0].wait_time, 0)
+        self.assertGreaterEqual(action_1_metrics[0].execution_time, 0)
+        self.assertEqual(sorted((metrics.flow_name, metrics.success) for metrics in metrics_sink.get("action 2")),
+                         [("add_vlan", True), ("remove_vlan", False)])
+
+    def test_run_tasks_metrics_sink_failed(self):
+        """Check that metrics sink error will not affect task result"""
+        metrics_sink = mock.MagicMock(record=mock.MagicMock(side_effect=Exception("sink error")))
+        runner = type(self.connectivity_runner)(logger=self.logger, cli_handler=self.cli_handler,
+                                                metrics_sink=metrics_sink)
+        results = ConnectivityActionResults()
+        task_list = [(mock.MagicMock(__name__="add_vlan", return_value=(True, "success")), ("10", "port"), ["action"])]
+        # act
+        runner._run_tasks(task_list, results)
+        # verify
+        self.assertEqual(results.get("action"), [(True, "success")])
+
+    def test_apply_connectivity_changes_failed_vlan_of_port(self):
+        """Check that failed VLAN will be reported only for its action and the other VLANs of the port are applied"""
+        def execute_flow(vlan_range, **kwargs):
+            if vlan_range == "10":
+                raise Exception("boom 10")
+            return "ok"
+
+        self.connectivity_runner.add_vlan_flow = self._create_add_vlan_flow(side_effect=execute_flow)
+        request = json.dumps({"driverRequest": {"actions": [
+            self._create_action("action a", "setVlan", "10"),
+            self._create_action("action b", "setVlan", "20")]}})
+        # act
+        result = json.loads(self.connectivity_runner.apply_connectivity_changes(request=request))
+        # verify
+        action_results = {action["actionId"]: action for action in result["driverResponse"]["actionResults"]}
+        self.assertFalse(action_results["action a"]["success"])
+        self.assertIn("boom 10", action_results["action a"]["errorMessage"])
+        self.assertTrue(action_results["action b"]["success"])
+        self.connectivity_runner.add_vlan_flow.execute_flow.assert_any_call(vlan_range="20",
+                                                                            port_mode="trunk",
+                                                                            port_name="Switch/Chassis 0/Port 1",
+                                                                            qnq=False,
+                                                                            c_tag="")
+
+    def test_apply_connectivity_changes_opposite_actions(self):
+        """Check that VLAN removed and added back to the same port will be only added on the device"""
+        self.connectivity_runner.add_vlan_flow = self._create_add_vlan_flow(return_value="added")
+        self.connectivity_runner.remove_vlan_flow = self._create_remove_vlan_flow()
+        request = json.dumps({"driverRequest": {"actions": [
+            self._create_action(action_id="remove action", action_type="removeVlan", vlan_id="10"),
+            self._create_action(action_id="set action", action_type="setVlan", vlan_id="10"),
+        ]}})
+        # act
+        result = json.loads(self.connectivity_runner.apply_connectivity_changes(request=request))
+        # verify
+        self.assertEqual([(action_result["actionId"], action_result["success"])
+                          for action_result in result["driverResponse"]["actionResults"]],
+                         [("remove action", True), ("set action", True)])
+        self.connectivity_runner.add_vlan_flow.execute_flow.assert_called_once_with(vlan_range="10",
+                                                                                    port_mode="trunk",
+                                                                                    port_name="Switch/Chassis 0/Port 1",
+                                                                                    qnq=False,
+                                                                                    c_tag="")
+        self.connectivity_runner.remove_vlan_flow.execute_flow.assert_not_called()
+
+    def test_apply_connectivity_changes_results_are_request_scoped(self):
+        """Check that results of the previous request will not be merged into the next one with the same actionId"""
+        self.connectivity_runner.add_vlan_flow = self._create_add_vlan_flow(
+            side_effect=[Exception("failed action message"), "success action message"])
+        request = json.dumps({"driverRequest": {"actions": [
+            self._create_action(action_id="set action", action_type="setVlan", vlan_id="10"),
+        ]}})
+        runner_state = dict(vars(self.connectivity_runner))
+        # act
+        first_result = json.loads(self.connectivity_runner.apply_connectivity_changes(request=request))
+        second_result = json.loads(self.connectivity_runner.apply_connectivity_changes(request=request))
+        # verify
+        self.assertFalse(first_result["driverResponse"]["actionResults"][0]["success"])
+        self.assertTrue(second_result["driverResponse"]["actionResults"][0]["success"])
+        self.assertEqual(vars(self.connectivity_runner), runner_state)
+
+    def test_apply_connectivity_changes_idempotency_cache(self):
+        """Check that retried action with the same payload will not be applied on the device again"""
+        self.connectivity_runner._idempotency_cache = ConnectivityIdempotencyCache()
+        self.connectivity_runner.add_vlan_flow = self._create_add_vlan_flow(return_value="success action message")
+        request = json.dumps({"driverRequest": {"actions": [
+            self._create_action(action_id="set action", action_type="setVlan", vlan_id="10"),
+        ]}})
+        changed_request = json.dumps({"driverRequest": {"actions": [
+            self._create_action(action_id="set action", action_type="setVlan", vlan_id="20"),
+        ]}})
+        # act
+        first_result = self.connectivity_runner.apply_connectivity_changes(request=request)
+        second_result = self.connectivity_runner.apply_connectivity_changes(request=request)
+        self.connectivity_runner.apply_connectivity_changes(request=changed_request)
+        # verify
+        self.assertEqual(first_result, second_result)
+        self.assertEqual(self.connectivity_runner.add_vlan_flow.execute_flow.call_count, 2)
+
+    def test_apply_connectivity_changes_idempotency_cache_skips_failed(self):
+        """Check that failed action will be applied on the device again on retry"""
+        self.connectivity_runner._idempotency_cache = ConnectivityIdempotencyCache()
+        self.connectivity_runner.add_vlan_flow = self._create_add_vlan_flow(
+            side_effect=[Exception("failed action message"), "success action message"])
+        request = json.dumps({"driverRequest": {"actions": [
+            self._create_action(action_id="set action", action_type="setVlan", vlan_id="10"),
+        ]}})
+        # act
+        first_result = json.loads(self.connectivity_runner.apply_connectivity_changes(request=request))
+        second_result = json.loads(self.connectivity_runner.apply_connectivity_changes(request=request))
+        # verify
+        self.assertFalse(first_result["driverResponse"]["actionResults"][0]["success"])
+        self.assertTrue(second_result["driverResponse"]["actionResults"][0]["success"])
+        self.assertEqual(self.connectivity_runner.add_vlan_flow.execute_flow.call_count, 2)
+
+    @mock.patch("cloudshell.devices.runners.connectivity_runner.time.sleep")
+    def test_add_vlan_retries_transient_errors(self, sleep):
+        """Check that flow failed with transient error will be retried according to the retry policy"""
+        self.connectivity_runner.RETRY_POLICY = RetryPolicy(attempts=3, backoff=1, jitter=0)
+        self.connectivity_runner.CIRCUIT_BREAKER = DeviceCircuitBreaker()
+        self.connectivity_runner.add_vlan_flow = self._create_add_vlan_flow(
+            side_effect=[SessionReadTimeout(), socket.error(), "flow output"])
+        # act
+        result = self.connectivity_runner.add_vlan(vlan_id="10",
+                                                   full_name="Switch/Chassis 0/Port 1",
+                                                   port_mode="trunk",
+                                                   qnq=False,
+                                                   c_tag="")
+        # verify
+        self.assertEqual(result, (True, "flow output"))
+        self.assertEqual(self.connectivity_runner.add_vlan_flow.execute_flow.call_count, 3)
+        self.assertEqual(sleep.call_args_list, [mock.call(1), mock.call(2)])
+
+    @mock.patch("cloudshell.devices.runners.connectivity_runner.time.sleep")
+    def test_add_vlan_does_not_retry_permanent_errors(self, sleep):
+        """Check that flow failed with the device command error will not be retried"""
+        self.connectivity_runner.RETRY_POLICY = RetryPolicy(attempts=3)
+        self.connectivity_runner.CIRCUIT_BREAKER = DeviceCircuitBreaker()
+        self.connectivity_runner.add_vlan_flow = self._create_add_vlan_flow(
+            side_effect=CommandExecutionException("invalid command"))
+        # act
+        result = self.connectivity_runner.add_vlan(vlan_id="10",
+                                                   full_name="Switch/Chassis 0/Port 1",
+                                                   port_mode="trunk",
+                                                   qnq=False,
+                                                   c_tag="")
+        # verify
+        self.assertEqual(result, (False, "invalid command"))
+        self.assertEqual(self.connectivity_runner.add_vlan_flow.execute_flow.call_count, 1)
+        sleep.assert_not_called()
+
+    def test_apply_connectivity_changes_circuit_breaker(self):
+        """Check that VLAN flows will fail fast once the device is unreachable"""
+        self.connectivity_runner.CIRCUIT_BREAKER = DeviceCircuitBreaker(failure_threshold=2)
+        self.connectivity_runner.add_vlan_flow = self._create_add_vlan_flow(
+            side_effect=socket.error("connection refused"))
+        request = json.dumps({"driverRequest": {"actions": [
+            self._create_action(action_id="action {}".format(port), action_type="setVlan", vlan_id="10",
+                                port_name="Switch/Chassis 0/Port {}".format(port))
+            for port in range(5)
+        ]}})
+        # act
+        result = json.loads(self.connectivity_runner.apply_connectivity_changes(request=request))
+        # verify
+        action_results = result["driverResponse"]["actionResults"]
+        self.assertEqual(self.connectivity_runner.add_vlan_flow.execute_flow.call_count, 2)
+        self.assertFalse(any(action_result["success"] for action_result in action_results))
+        self.assertIn("Device Switch is unreachable", action_results[-1]["errorMessage"])
+
+    def test_apply_connectivity_changes_circuit_breaker_disabled(self):
+        """Check that VLAN flows will be executed for the each port if circuit breaker is not set"""
+        self.connectivity_runner.add_vlan_flow = self._create_add_vlan_flow(
+            side_effect=socket.error("connection refused"))
+        request = json.dumps({"driverRequest": {"actions": [
+            self._create_action(action_id="action {}".format(port), action_type="setVlan", vlan_id="10",
+                                port_name="Switch/Chassis 0/Port {}".format(port))
+            for port in range(5)
+        ]}})
+        # act
+        self.connectivity_runner.apply_connectivity_changes(request=request)
+        # verify
+        self.assertIsNone(ConnectivityRunner.CIRCUIT_BREAKER)
+        self.assertEqual(self.connectivity_runner.add_vlan_flow.execute_flow.call_count, 5)
+
+    def _create_reconciling_runner(self, port_vlans):
+        get_port_vlans_flow = mock.MagicMock(execute_flow=mock.MagicMock(return_value=port_vlans))
+
+        class ReconcilingConnectivityRunner(ConnectivityRunner):
+            RECONCILE_VLANS = True
+            add_vlan_flow = self._create_add_vlan_flow(return_value="added")
+            remove_vlan_flow = self._create_remove_vlan_flow(return_value="removed")
+
+            @property
+            def get_port_vlans_flow(self):
+                return get_port_vlans_flow
+
+        return ReconcilingConnectivityRunner(logger=self.logger, cli_handler=self.cli_handler)
+
+    def test_apply_connectivity_changes_reconcile_vlans(self):
+        """Check that only VLANs missing on the port will be added and only present ones will be removed"""
+        runner = self._create_reconciling_runner({"Switch/Chassis 0/Port 1": ("Trunk", "10-20,30"),
+                                                  "Switch/Chassis 0/Port 2": ("trunk", VlanSet.from_string("40"))})
+        request = json.dumps({"driverRequest": {"actions": [
+            self._create_action(action_id="remove action", action_type="removeVlan", vlan_id="30-31"),
+            self._create_action(action_id="set action", action_type="setVlan", vlan_id="15-25"),
+            self._create_action(action_id="set action 2", action_type="setVlan", vlan_id="40",
+                                port_name="Switch/Chassis 0/Port 2"),
+            self._create_action(action_id="set action 3", action_type="setVlan", vlan_id="50",
+                                port_name="Switch/Chassis 0/Port 3"),
+        ]}})
+        # act
+        result = json.loads(runner.apply_connectivity_changes(request=request))
+        # verify
+        self.assertTrue(all(action_result["success"] for action_result in result["driverResponse"]["actionResults"]))
+        runner.get_port_vlans_flow.execute_flow.assert_called_once_with(
+            port_names=["Switch/Chassis 0/Port 1", "Switch/Chassis 0/Port 2", "Switch/Chassis 0/Port 3"])
+        runner.remove_vlan_flow.execute_flow.assert_called_once_with(vlan_range="30",
+                                                                     port_name="Switch/Chassis 0/Port 1",
+                                                                     port_mode="trunk")
+        self.assertEqual(sorted(call[1]["vlan_range"] for call in runner.add_vlan_flow.execute_flow.call_args_list),
+                         ["21-25", "50"])
+
+    def test_apply_connectivity_changes_reconcile_vlans_port_mode(self):
+        """Check that VLAN present on the port will be added if port mode is different or unknown"""
+        runner = self._create_reconciling_runner({"Switch/Chassis 0/Port 1": ("trunk", "10"),
+                                                  "Switch/Chassis 0/Port 2": "20-30"})
+        request = json.dumps({"driverRequest": {"actions": [
+            self._create_action(action_id="set action", action_type="setVlan", vlan_id="10", mode="Access"),
+            self._create_action(action_id="set action 2", action_type="setVlan", vlan_id="20",
+                                port_name="Switch/Chassis 0/Port 2"),
+            self._create_action(action_id="remove action", action_type="removeVlan", vlan_id="40",
+                                port_name="Switch/Chassis 0/Port 2"),
+        ]}})
+        # act
+        result = json.loads(runner.apply_connectivity_changes(request=request))
+        # verify
+        self.assertTrue(all(action_result["success"] for action_result in result["driverResponse"]["actionResults"]))
+        self.assertEqual(sorted((call[1]["port_name"], call[1]["port_mode"], call[1]["vlan_range"])
+                                for call in runner.add_vlan_flow.execute_flow.call_args_list),
+                         [("Switch/Chassis 0/Port 1", "access", "10"), ("Switch/Chassis 0/Port 2", "trunk", "20")])
+        runner.remove_vlan_flow.execute_flow.assert_not_called()
+
+    def test_apply_connectivity_changes_reconcile_vlans_read_failed(self):
+        """Check that all requested VLANs will be configured if port VLANs can't be read"""
+        runner = self._create_reconciling_runner({})
+        runner.get_port_vlans_flow.execute_flow.side_effect = Exception("read failed")
+        request = json.dumps({"driverRequest": {"actions": [
+            self._create_action(action_id="set action", action_type="setVlan", vlan_id="15-25"),
+        ]}})
+        # act
+        runner.apply_connectivity_changes(request=request)
+        # verify
+        runner.add_vlan_flow.execute_flow.assert_called_once_with(vlan_range="15-25",
+                                                                  port_mode="trunk",
+                                                                  port_name="Switch/Chassis 0/Port 1",
+                                                                  qnq=False,
+                                                                  c_tag="")
+
+    def test_apply_connectivity_changes_request_timeout(self):
+        """Check that method will return once request timeout is over and report unfinished VLAN flows as failed"""
+        self.cli_handler.resource_config.sessions_concurrency_limit = "1"
+        self.connectivity_runner.REQUEST_TIMEOUT = 0.2
+        release_flow = threading.Event()
+        self.connectivity_runner.add_vlan_flow = self._create_add_vlan_flow(
+            side_effect=lambda **kwargs: release_flow.wait(5))
+        request = json.dumps({"driverRequest": {"actions": [
+            self._create_action(action_id="stuck action", action_type="setVlan", vlan_id="10"),
+            self._create_action(action_id="queued action", action_type="setVlan", vlan_id="10",
+                                port_name="Switch/Chassis 0/Port 2"),
+        ]}})
+        # act
+        start_time = time.time()
+        result = json.loads(self.connectivity_runner.apply_connectivity_changes(request=request))
+        elapsed_time = time.time() - start_time
+        release_flow.set()
+        # verify
+        self.assertLess(elapsed_time, 2)
+        stuck_result, queued_result = result["driverResponse"]["actionResults"]
+        self.assertFalse(stuck_result["success"])
+        self.assertIn("VLAN 10 on Switch/Chassis 0/Port 1 timed out, request timeout of 0.2s exceeded",
+                      stuck_result["errorMessage"])
+        self.assertFalse(queued_result["success"])
+        self.assertIn("VLAN 10 on Switch/Chassis 0/Port 2 was cancelled, request timeout of 0.2s exceeded",
+                      queued_result["errorMessage"])
+        self.assertEqual(self.connectivity_runner.add_vlan_flow.execute_flow.call_count, 1)
+
+    def test_apply_connectivity_changes_port_lock_timeout(self):
+        """Check that VLAN flow will not wait for the port locked by the other request after the deadline"""
+        self.cli_handler.resource_config.sessions_concurrency_limit = "1"
+        self.connectivity_runner.REQUEST_TIMEOUT = 0.2
+        self.connectivity_runner.PORT_LOCKS = KeyedLock()
+        self.connectivity_runner.add_vlan_flow = self._create_add_vlan_flow()
+        self.connectivity_runner.PORT_LOCKS.acquire("Switch/Chassis 0/Port 1")
+        request = json.dumps({"driverRequest": {"actions": [
+            self._create_action(action_id="locked action", action_type="setVlan", vlan_id="10"),
+            self._create_action(action_id="queued action", action_type="setVlan", vlan_id="10",
+                                port_name="Switch/Chassis 0/Port 2"),
+        ]}})
+        # act
+        result = json.loads(self.connectivity_runner.apply_connectivity_changes(request=request))
+        # verify
+        locked_result, queued_result = result["driverResponse"]["actionResults"]
+        # task waiting for the port lock is reported either by the worker or by the request on its deadline
+        self.assertFalse(locked_result["success"])
+        self.assertRegexpMatches(locked_result["errorMessage"], "VLAN 10 on Switch/Chassis 0/Port 1 "
+                                                                "(timed out|was cancelled), request timeout of 0.2s")
+        self.assertFalse(queued_result["success"])
+        self.assertIn("VLAN 10 on Switch/Chassis 0/Port 2 was cancelled, request timeout of 0.2s exceeded",
+                      queued_result["errorMessage"])
+        # worker stops waiting for the lock, only the lock of the other request is left
+        for _ in range(100):
+            if len(self.connectivity_runner.PORT_LOCKS) == 1:
+                break
+            time.sleep(0.01)
+        self.assertEqual(len(self.connectivity_runner.PORT_LOCKS), 1)
+        self.connectivity_runner.add_vlan_flow.execute_flow.assert_not_called()
+
+    @mock.patch("cloudshell.devices.runners.connectivity_runner.Thread")
+    def test_run_tasks_deadline_is_over(self, thread_class):
+        """Check that method will cancel all tasks without starting threads if deadline is already over"""
+        self.connectivity_runner.REQUEST_TIMEOUT = 10
+        results = ConnectivityActionResults()
+        task_list = [(mock.MagicMock(), (["10", "20-30"], "port 1"), ["some action id"])]
+        # act
+        self.connectivity_runner._run_tasks(task_list, results, deadline=time.time() - 1)
+        # verify
+        thread_class.assert_not_called()
+        self.assertEqual(results.get("some action id"),
+                         [(False, "VLAN 10,20-30 on port 1 was cancelled, request timeout of 10s exceeded")])
+
+    @mock.patch("cloudshell.devices.runners.connectivity_runner.time.sleep")
+    def test_add_vlan_does_not_retry_after_deadline(self, sleep):
+        """Check that flow will not be retried if the retry can't start before the request deadline"""
+        self.connectivity_runner.RETRY_POLICY = RetryPolicy(attempts=3, backoff=10, jitter=0)
+        self.connectivity_runner.CIRCUIT_BREAKER = DeviceCircuitBreaker()
+        self.connectivity_runner._worker_state.deadline = time.time() + 5
+        self.connectivity_runner.add_vlan_flow = self._create_add_vlan_flow(
+            side_effect=SessionReadTimeout("read timeout"))
+        # act
+        result = self.connectivity_runner.add_vlan(vlan_id="10",
+                                                   full_name="Switch/Chassis 0/Port 1",
+                                                   port_mode="trunk",
+                                                   qnq=False,
+                                                   c_tag="")
+        # verify
+        self.assertEqual(result, (False, "read timeout"))
+        sleep.assert_not_called()
+
+    def test_apply_connectivity_changes_pipelines_ports(self):
+        """Check that adds of the port will not wait for the removes of the other ports"""
+        self.cli_handler.resource_config.sessions_concurrency_limit = "2"
+        port_2_added = threading.Event()
+        executed_flows = []
+
+        def remove_vlan(vlan_range, port_name, port_mode):
+            # removal on the Port 1 is completed only after addition on the Port 2
+            executed_flows.append(("remove", port_name, port_2_added.wait(5)))
+
+        def add_vlan(vlan_range, port_mode, port_name, qnq, c_tag):
+            executed_flows.append(("add", port_name))
+            if port_name == "Switch/Chassis 0/Port 2":
+                port_2_added.set()
+
+        self.connectivity_runner.remove_vlan_flow = self._create_remove_vlan_flow(side_effect=remove_vlan)
+        self.connectivity_runner.add_vlan_flow = self._create_add_vlan_flow(side_effect=add_vlan)
+        request = json.dumps({"driverRequest": {"actions": [
+            self._create_action(action_id="remove action", action_type="removeVlan", vlan_id="10"),
+            self._create_action(action_id="set action", action_type="setVlan", vlan_id="20"),
+            self._create_action(action_id="set action 2", action_type="setVlan", vlan_id="20",
+                                port_name="Switch/Chassis 0/Port 2"),
+        ]}})
+        # act
+        self.connectivity_runner.apply_connectivity_changes(request=request)
+        # verify
+        self.assertEqual(executed_flows, [("add", "Switch/Chassis 0/Port 2"),
+                                          ("remove", "Switch/Chassis 0/Port 1", True),
+                                          ("add", "Switch/Chassis 0/Port 1")])
+
     def test_prop_cli_handler(self):
         class TestedClass(ConnectivityRunner):
             def add_vlan_flow(self):
@@ -421,3 +1104,70 @@ class TestConnectivityRunner(unittest.TestCase):
 
         self.assertIsNone(tested_class.add_vlan_flow)
         self.assertIsNone(tested_class.remove_vlan_flow)
+
+
+class TestPortTaskQueue(unittest.TestCase):
+    def test_cancel(self):
+        """Check that queue will drop not started tasks and return them with the tasks in progress"""
+        first_task = (mock.MagicMock(), ("10", "port 1"), ["action 1"])
+        second_task = (mock.MagicMock(), ("20", "port 1"), ["action 2"])
+        third_task = (mock.MagicMock(), ("30", "port 2"), ["action 3"])
+        task_queue = PortTaskQueue([first_task, second_task, third_task])
+        task_queue.get()
+        # act
+        not_started, in_progress = task_queue.cancel()
+        # verify
+        self.assertEqual(not_started, [second_task, third_task])
+        self.assertEqual(in_progress, [first_task])
+        self.assertTrue(task_queue.cancelled.is_set())
+        self.assertEqual(task_queue.cancel(), ([], []))
+        self.assertIsNone(task_queue.get())
+        task_queue.task_done("port 1")
+        self.assertIsNone(task_queue.get())
+
+    def test_cancel_report(self):
+        """Check that tasks will be reported only by the first cancel call"""
+        task = (mock.MagicMock(), ("10", "port 1"), ["action 1"])
+        task_queue = PortTaskQueue([task])
+        report = mock.MagicMock()
+        # act
+        task_queue.cancel(report)
+        task_queue.cancel(report)
+        # verify
+        report.assert_called_once_with([task], [])
+
+    def test_get(self):
+        """Check that queue will give out next task for the port only when previous one is done"""
+        first_task = (mock.MagicMock(), ("10", "port 1"), ["action 1"])
+        second_task = (mock.MagicMock(), ("20", "port 1"), ["action 2"])
+        third_task = (mock.MagicMock(), ("30", "port 2"), ["action 3"])
+        task_queue = PortTaskQueue([first_task, second_task, third_task])
+        # act
+        results = [task_queue.get(), task_queue.get()]
+        task_queue.task_done("port 1")
+        results.append(task_queue.get())
+        task_queue.task_done("port 2")
+        task_queue.task_done("port 1")
+        results.append(task_queue.get())
+        # verify
+        self.assertEqual(task_queue.ports_count, 2)
+        self.assertEqual(results, [("port 1", first_task, mock.ANY),
+                                   ("port 2", third_task, mock.ANY),
+                                   ("port 1", second_task, mock.ANY),
+                                   None])
+
+    @mock.patch("cloudshell.devices.runners.connectivity_runner.time.time")
+    def test_get_ready_time(self, time_mock):
+        """Check that next task of the port will be ready only since the previous one is done"""
+        time_mock.return_value = 10
+        task_queue = PortTaskQueue([(mock.MagicMock(), ("10", "port 1"), ["action 1"]),
+                                    (mock.MagicMock(), ("20", "port 1"), ["action 2"])])
+        _, _, first_ready_time = task_queue.get()
+        time_mock.return_value = 25
+        task_queue.task_done("port 1")
+        time_mock.return_value = 30
+        # act
+        _, _, second_ready_time = task_queue.get()
+        # verify
+        self.assertEqual(first_ready_time, 10)
+        self.assertEqual(second_ready_time, 25)
@@ -0,0 +1,191 @@
+import threading
+import time
+import unittest
+
+import mock
+
+from cloudshell.devices.runners.fleet_command_runner import DeviceTaskQueue, FleetCommandResult, \
+    FleetCommandRunner
+
+
+class TestFleetCommandResult(unittest.TestCase):
+    def test_str(self):
+        resource_config = mock.MagicMock(address="192.168.1.1")
+        resource_config.name = "Switch"
+        result = FleetCommandResult(resource_config=resource_config, success=True, output="", execution_time=0.5)
+        # act
+        result = str(result)
+        # verify
+        self.assertEqual(result, "Switch (192.168.1.1): success in 0.500s")
+
+
+class TestFleetCommandRunner(unittest.TestCase):
+    def setUp(self):
+        self.logger = mock.MagicMock()
+        self.cli_handler_factory = mock.MagicMock(side_effect=lambda resource_config: resource_config.address)
+        self.runner = FleetCommandRunner(logger=self.logger,
+                                         cli_handler_factory=self.cli_handler_factory,
+                                         concurrency_limit=3)
+
+    def _run(self, resource_configs, execute_flow, **kwargs):
+        with mock.patch("cloudshell.devices.runners.fleet_command_runner.RunCommandFlow") as run_command_flow_class:
+            run_command_flow_class.side_effect = lambda cli_handler, logger: mock.MagicMock(
+                execute_flow=lambda custom_command, is_config: execute_flow(cli_handler, custom_command, is_config))
+            return list(self.runner.run_custom_command(resource_configs, **kwargs))
+
+    def test_run_custom_command(self):
+        """Check that command will be executed on the each device with its own CLI handler"""
+        resource_configs = [mock.MagicMock(address="192.168.1.{}".format(number)) for number in range(5)]
+        # act
+        results = self._run(resource_configs,
+                            lambda cli_handler, command, is_config: "{} {} {}".format(cli_handler, command, is_config),
+                            custom_command="show version",
+                            is_config=True)
+        # verify
+        self.assertEqual(sorted(result.output for result in results),
+                         ["192.168.1.{} show version True".format(number) for number in range(5)])
+        self.assertTrue(all(result.success for result in results))
+
+    def test_run_custom_command_failed_device(self):
+        """Check that failure on the one device will not stop execution on the others"""
+        resource_configs = [mock.MagicMock(address="192.168.1.1"), mock.MagicMock(address="192.168.1.2")]
+
+        def execute_flow(cli_handler, command, is_config):
+            if cli_handler == "192.168.1.1":
+                raise Exception("Session is closed")
+            return "output"
+
+        # act
+        results = self._run(resource_configs, execute_flow, custom_command="show version")
+        # verify
+        results = {result.resource_config.address: result for result in results}
+        self.assertFalse(results["192.168.1.1"].success)
+        self.assertEqual(results["192.168.1.1"].output, "Failed to run custom command: Session is closed")
+        self.assertTrue(results["192.168.1.2"].success)
+
+    def test_run_custom_command_streams_results(self):
+        """Check that result of the fast device will be returned before the slow device finishes"""
+        resource_configs = [mock.MagicMock(address="slow"), mock.MagicMock(address="fast")]
+        slow_device_released = threading.Event()
+
+        def execute_flow(cli_handler, command, is_config):
+            if cli_handler == "slow":
+                slow_device_released.wait(5)
+            return cli_handler
+
+        with mock.patch("cloudshell.devices.runners.fleet_command_runner.RunCommandFlow") as run_command_flow_class:
+            run_command_flow_class.side_effect = lambda cli_handler, logger: mock.MagicMock(
+                execute_flow=lambda custom_command, is_config: execute_flow(cli_handler, custom_command, is_config))
+            results = self.runner.run_custom_command(resource_configs, custom_command="show version")
+            # act
+            first_result = next(results)
+            slow_device_released.set()
+            second_result = next(results)
+        # verify
+        self.assertEqual(first_result.output, "fast")
+        self.assertEqual(second_result.output, "slow")
+
+    def test_run_custom_command_concurrency_limits(self):
+        """Check that number of the commands executing globally and on the one device will be limited"""
+        resource_configs = ([mock.MagicMock(address="192.168.1.1") for _ in range(3)] +
+                            [mock.MagicMock(address="192.168.1.{}".format(number)) for number in range(2, 8)])
+        lock = threading.Lock()
+        running = {"total": 0, "max_total": 0, "device": 0, "max_device": 0}
+
+        def execute_flow(cli_handler, command, is_config):
+            with lock:
+                running["total"] += 1
+                running["max_total"] = max(running["max_total"], running["total"])
+                if cli_handler == "192.168.1.1":
+                    running["device"] += 1
+                    running["max_device"] = max(running["max_device"], running["device"])
+            time.sleep(0.01)
+            with lock:
+                running["total"] -= 1
+                if cli_handler == "192.168.1.1":
+                    running["device"] -= 1
+
+        # act
+        results = self._run(resource_configs, execute_flow, custom_command="show version")
+        # verify
+        self.assertEqual(len(results), 9)
+        self.assertLessEqual(running["max_total"], 3)
+        self.assertEqual(running["max_device"], 1)
+
+    def test_run_custom_command_busy_device_doesnt_block_workers(self):
+        """Check that the other devices will be executed in parallel while commands of the busy device wait"""
+        resource_configs = ([mock.MagicMock(address="busy") for _ in range(5)] +
+                            [mock.MagicMock(address="other 1"), mock.MagicMock(address="other 2")])
+        started = {"other 1": threading.Event(), "other 2": threading.Event()}
+
+        def execute_flow(cli_handler, command, is_config):
+            if cli_handler in started:
+                started[cli_handler].set()
+                return True
+            return all(event.wait(5) for event in started.values())
+
+        # act
+        results = self._run(resource_configs, execute_flow, custom_command="show version")
+        # verify
+        self.assertEqual(len(results), 7)
+        self.assertTrue(all(result.output is True for result in results))
+
+    def test_run_custom_command_stops_when_consumer_stops(self):
+        """Check that commands will not be started on the remaining devices if results are not read anymore"""
+        self.runner = FleetCommandRunner(logger=self.logger,
+                                         cli_handler_factory=self.cli_handler_factory,
+                                         concurrency_limit=1)
+        resource_configs = [mock.MagicMock(address="192.168.1.{}".format(number)) for number in range(5)]
+        executed = []
+        first_result_read = threading.Event()
+
+        def execute_flow(cli_handler, command, is_config):
+            executed.append(cli_handler)
+            if len(executed) > 1:
+                first_result_read.wait(5)
+
+        with mock.patch("cloudshell.devices.runners.fleet_command_runner.RunCommandFlow") as run_command_flow_class:
+            run_command_flow_class.side_effect = lambda cli_handler, logger: mock.MagicMock(
+                execute_flow=lambda custom_command, is_config: execute_flow(cli_handler, custom_command, is_config))
+            results = self.runner.run_custom_command(resource_configs, custom_command="show version")
+            # act
+            next(results)
+            results.close()
+            first_result_read.set()
+            time.sleep(0.05)
+        # verify
+        self.assertLessEqual(len(executed), 2)
+
+
+class TestDeviceTaskQueue(unittest.TestCase):
+    def test_get_skips_busy_device(self):
+        """Check that configuration of the device without free slot will be given out after the other devices"""
+        first, second, third = (mock.MagicMock(address="192.168.1.1"), mock.MagicMock(address="192.168.1.1"),
+                                mock.MagicMock(address="192.168.1.2"))
+        task_queue = DeviceTaskQueue([first, second, third], device_concurrency_limit=1)
+        # act
+        result = [task_queue.get(), task_queue.get()]
+        task_queue.task_done("192.168.1.1")
+        result.append(task_queue.get())
+        task_queue.task_done("192.168.1.1")
+        task_queue.task_done("192.168.1.2")
+        # verify
+        self.assertEqual(result, [first, third, second])
+        self.assertIsNone(task_queue.get())
+
+    def test_get_device_concurrency_limit(self):
+        """Check that configurations of the same device will be given out up to the device limit"""
+        resource_configs = [mock.MagicMock(address="192.168.1.1") for _ in range(3)]
+        task_queue = DeviceTaskQueue(resource_configs, device_concurrency_limit=2)
+        # act
+        result = [task_queue.get(), task_queue.get()]
+        # verify
+        self.assertEqual(result, resource_configs[:2])
+        self.assertEqual(list(task_queue._ready_devices), [])
+
+    def test_stop(self):
+        task_queue = DeviceTaskQueue([mock.MagicMock(address="192.168.1.1")], device_concurrency_limit=1)
+        # act
+        task_queue.stop()
+        # verify
+        self.assertIsNone(task_queue.get())
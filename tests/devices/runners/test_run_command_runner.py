@@ -49,7 +49,20 @@ class TestRunCommandRunner(unittest.TestCase):
             self.assertEqual(result, expected_res)
             run_command_flow_class.assert_called_once_with(cli_handler, self.logger)
             run_command_flow.execute_flow.assert_called_once_with(custom_command=custom_command,
-                                                                  is_config=True)
+                                                                  is_config=True,
+                                                                  pipelined=False)
+
+    @mock.patch("cloudshell.devices.runners.run_command_runner.RunCommandFlow")
+    def test_run_custom_config_command_pipelined(self, run_command_flow_class):
+        """Check that method will execute RunCommandFlow flow in the pipelined mode if it is enabled"""
+        custom_command = "test custom command"
+        self.runner.PIPELINE_CONFIG_COMMANDS = True
+        # act
+        self.runner.run_custom_config_command(custom_command=custom_command)
+        # verify
+        run_command_flow_class.return_value.execute_flow.assert_called_once_with(custom_command=custom_command,
+                                                                                 is_config=True,
+                                                                                 pipelined=True)
 
     def test_prop_cli_handler(self):
         self.assertEqual(self.cli_handler, self.runner.cli_handler)
@@ -3,6 +3,7 @@ import unittest
 import mock
 
 from cloudshell.devices.cli_handler_impl import CliHandlerImpl
+from cloudshell.devices.cli_transport_cache import TransportPreferenceCache
 
 
 class TestCliHandlerImpl(unittest.TestCase):
@@ -15,6 +16,7 @@ class TestCliHandlerImpl(unittest.TestCase):
         class TestedClass(CliHandlerImpl):
             enable_mode = ""
             config_mode = ""
+            TRANSPORT_PREFERENCE_CACHE = TransportPreferenceCache()
 
         self.cli_handler = TestedClass(cli=self.cli,
                                        resource_config=self.config,
@@ -54,6 +56,27 @@ class TestCliHandlerImpl(unittest.TestCase):
         self.assertEqual(result, decrypted_pass.Value)
         self.api.DecryptPassword.assert_called_once_with(self.config.password)
 
+    def test_password_is_shared_between_handlers(self):
+        """Check that password decrypted by one handler will be reused by the other one without API call"""
+        api = mock.MagicMock()
+        cli_handler = self.tested_class(cli=self.cli, resource_config=self.config, logger=self.logger, api=api)
+        expected_password = self.cli_handler.password
+        # act
+        result = cli_handler.password
+        # verify
+        self.assertEqual(result, expected_password)
+        api.DecryptPassword.assert_not_called()
+
+    def test_invalidate_password(self):
+        """Check that password will be decrypted again after invalidation"""
+        self.api.DecryptPassword.side_effect = [mock.MagicMock(Value="old password"),
+                                                mock.MagicMock(Value="new password")]
+        self.cli_handler.password
+        # act
+        self.cli_handler.invalidate_password()
+        # verify
+        self.assertEqual(self.cli_handler.password, "new password")
+
     def test_resource_address(self):
         """Check "resource_address" property"""
         # act
@@ -136,6 +159,27 @@ class TestCliHandlerImpl(unittest.TestCase):
         # verify
         self.assertEqual(result, [ssh_session, telnet_session])
 
+    def test_new_sessions_tries_connected_session_type_first(self):
+        """Check that in 'auto' mode session type which connected to the device last time will be tried first"""
+        ssh_on_session_start = mock.MagicMock()
+        self.cli_handler._ssh_session = mock.MagicMock(
+            side_effect=lambda: mock.MagicMock(session_type="SSH", on_session_start=ssh_on_session_start))
+        self.cli_handler._telnet_session = mock.MagicMock(
+            side_effect=lambda: mock.MagicMock(session_type="TELNET", on_session_start=None))
+        self.config.cli_connection_type = "auto"
+        self.config.address = "192.168.1.1"
+        self.config.cli_tcp_port = 23
+        ssh_session, telnet_session = self.cli_handler._new_sessions()
+        # act
+        telnet_session.on_session_start(telnet_session, self.logger)
+        result = self.cli_handler._new_sessions()
+        # verify
+        self.assertEqual([session.session_type for session in result], ["TELNET", "SSH"])
+        self.assertEqual(self.tested_class.TRANSPORT_PREFERENCE_CACHE.get(("192.168.1.1", 23)), "TELNET")
+        result[1].on_session_start(result[1], self.logger)
+        ssh_on_session_start.assert_called_once_with(result[1], self.logger)
+        self.assertEqual(self.tested_class.TRANSPORT_PREFERENCE_CACHE.get(("192.168.1.1", 23)), "SSH")
+
     def test_get_cli_service(self):
         """Check that method will use get_session for getting CLI session"""
         mode = mock.MagicMock()
@@ -150,6 +194,37 @@ class TestCliHandlerImpl(unittest.TestCase):
                                                                   mode,
                                                                   self.cli_handler._logger)
 
+    def test_warm_up_sessions(self):
+        """Check that method will open all sessions at once and return them to the pool in the command mode"""
+        command_mode = mock.MagicMock()
+        session_contexts = [mock.MagicMock() for _ in range(3)]
+        self.cli_handler.get_cli_service = mock.MagicMock(side_effect=session_contexts)
+        # act
+        result = self.cli_handler.warm_up_sessions(sessions_count=3, command_mode=command_mode)
+        # verify
+        self.assertEqual(result, 3)
+        self.cli_handler.get_cli_service.assert_has_calls([mock.call(command_mode)] * 3)
+        for session_context in session_contexts:
+            session_context.__enter__.assert_called_once_with()
+            session_context.__exit__.assert_called_once_with(None, None, None)
+
+    def test_warm_up_sessions_uses_enable_mode(self):
+        """Check that method will switch sessions into enable mode by default and skip failed sessions"""
+        opened_session_context = mock.MagicMock()
+        failed_session_context = mock.MagicMock()
+        failed_session_context.__enter__.side_effect = Exception("connection refused")
+        self.tested_class.enable_mode = mock.MagicMock()
+        self.cli_handler.get_cli_service = mock.MagicMock(side_effect=[opened_session_context,
+                                                                       failed_session_context])
+        # act
+        result = self.cli_handler.warm_up_sessions(sessions_count=2)
+        # verify
+        self.assertEqual(result, 1)
+        self.cli_handler.get_cli_service.assert_called_with(self.tested_class.enable_mode)
+        opened_session_context.__exit__.assert_called_once_with(None, None, None)
+        failed_session_context.__exit__.assert_not_called()
+        self.logger.warning.assert_called_once()
+
     def test_enable_and_config_mode_does_nothing(self):
         class TestedClass(CliHandlerImpl):
             @property
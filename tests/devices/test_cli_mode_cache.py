@@ -0,0 +1,125 @@
+import re
+import unittest
+
+import mock
+from cloudshell.cli.command_mode import CommandMode
+from cloudshell.cli.session.session_exceptions import CommandExecutionException
+from cloudshell.cli.session_pool_manager import SessionPoolManager
+
+from cloudshell.devices.cli_mode_cache import ModeCachingCLI, ModeCachingCliService
+
+
+class FakeSession(object):
+    session_type = "FAKE"
+    PROMPTS = {"default": "Switch>", "enable": "Switch#", "config": "Switch(config)#"}
+    COMMANDS = {("default", "enable"): "enable",
+                ("enable", "configure terminal"): "config",
+                ("enable", "disable"): "default",
+                ("config", "end"): "enable"}
+
+    def __init__(self):
+        self.mode = "default"
+        self.commands = []
+        self.new_session = True
+
+    def connect(self, prompt, logger):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def active(self):
+        return True
+
+    def reconnect(self, prompt, logger, timeout=None):
+        self.mode = "default"
+
+    def hardware_expect(self, command, expected_string, logger, action_map=None, error_map=None, **kwargs):
+        self.commands.append(command)
+        if command == "fail":
+            raise CommandExecutionException("FakeSession", "Command failed")
+        self.mode = self.COMMANDS.get((self.mode, command), self.mode)
+        return self.PROMPTS[self.mode]
+
+    def probe_for_prompt(self, expected_string, logger):
+        return self.hardware_expect("", expected_string, logger)
+
+    def match_prompt(self, prompt, match_string, logger):
+        return bool(re.search(prompt, match_string, re.DOTALL))
+
+
+class TestModeCachingCLI(unittest.TestCase):
+    def setUp(self):
+        self.default_mode = CommandMode(r"Switch>\s*$")
+        self.enable_mode = CommandMode(r"Switch#\s*$", enter_command="enable", exit_command="disable",
+                                       parent_mode=self.default_mode)
+        self.config_mode = CommandMode(r"Switch\(config\)#\s*$", enter_command="configure terminal",
+                                       exit_command="end", parent_mode=self.enable_mode)
+        self.session = FakeSession()
+        self.logger = mock.MagicMock()
+        self.cli = ModeCachingCLI(session_pool=SessionPoolManager(session_manager=mock.MagicMock(
+            new_session=mock.MagicMock(return_value=self.session),
+            existing_sessions_count=mock.MagicMock(return_value=0),
+            is_compatible=mock.MagicMock(return_value=True))))
+
+    def _checkout(self, command_mode, command=None):
+        with self.cli.get_session(self.session, command_mode, self.logger) as cli_service:
+            if command:
+                cli_service.send_command(command)
+
+    def test_get_session_skips_mode_transitions(self):
+        """Check that session already in the requested mode will not probe prompt and switch mode again"""
+        self._checkout(self.config_mode)
+        self.session.commands = []
+        # act
+        self._checkout(self.config_mode, "show running-config")
+        # verify
+        self.assertEqual(self.session.commands, ["show running-config"])
+
+    def test_get_session_switches_from_cached_mode(self):
+        """Check that session will be switched from the cached mode into requested one without prompt probe"""
+        self._checkout(self.config_mode)
+        self.session.commands = []
+        # act
+        self._checkout(self.enable_mode)
+        # verify
+        self.assertEqual(self.session.commands, ["end"])
+        self.assertEqual(self.session.mode, "enable")
+
+    def test_get_session_determines_mode_after_failed_command(self):
+        """Check that mode will be determined by the prompt after failed command"""
+        with self.assertRaises(CommandExecutionException):
+            self._checkout(self.config_mode, "fail")
+        self.session.commands = []
+        # act
+        self._checkout(self.config_mode)
+        # verify
+        self.assertEqual(self.session.commands, [""])
+
+    def test_get_session_determines_mode_after_command_leaving_mode(self):
+        """Check that mode will be determined by the prompt if command output doesn't end with the mode prompt"""
+        self._checkout(self.config_mode, "end")
+        self.session.commands = []
+        # act
+        self._checkout(self.config_mode)
+        # verify
+        self.assertEqual(self.session.commands, ["", "configure terminal"])
+        self.assertEqual(self.session.mode, "config")
+
+    def test_get_session_determines_mode_after_cache_ttl(self):
+        """Check that mode will be determined by the prompt if session wasn't used for a long time"""
+        self._checkout(self.config_mode)
+        self.session.commands = []
+        # act
+        with mock.patch.object(ModeCachingCliService, "COMMAND_MODE_CACHE_TTL", 0):
+            self._checkout(self.config_mode)
+        # verify
+        self.assertEqual(self.session.commands, [""])
+
+    def test_get_session_determines_mode_after_reconnect(self):
+        with self.cli.get_session(self.session, self.config_mode, self.logger) as cli_service:
+            # act
+            cli_service.reconnect()
+        # verify
+        self.assertEqual(self.session.commands[-3:], ["", "enable", "configure terminal"])
+        self.assertEqual(self.session.mode, "config")
@@ -0,0 +1,232 @@
+import threading
+import unittest
+
+import mock
+from cloudshell.cli.session_pool_manager import SessionPoolException
+
+from cloudshell.devices.cli_session_pool import CliSessionPoolRegistry
+
+
+class TestCliSessionPoolRegistry(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000
+        self.registry = CliSessionPoolRegistry(max_sessions=2, max_idle_time=60, timer=lambda: self.now)
+        self.logger = mock.MagicMock()
+
+    def _create_session(self):
+        return mock.MagicMock(__eq__=lambda this, other: this is other, cached_command_mode=None)
+
+    def _create_idle_session(self, pool):
+        session = pool.get_session(self._create_session(), "#", self.logger)
+        pool.return_session(session, self.logger)
+        return session
+
+    def test_get_pool_returns_same_pool_for_device(self):
+        pool = self.registry.get_pool(address="192.168.1.1", port=22, username="admin", cli_type="ssh")
+        # act
+        result = self.registry.get_pool(address="192.168.1.1", port=22, username="admin", cli_type="ssh",
+                                        max_pool_size=3)
+        # verify
+        self.assertIs(result, pool)
+        self.assertEqual(result.max_pool_size, 3)
+
+    def test_get_pool_returns_different_pools_for_different_devices(self):
+        pool = self.registry.get_pool(address="192.168.1.1", port=22, username="admin", cli_type="ssh")
+        # act
+        result = self.registry.get_pool(address="192.168.1.1", port=23, username="admin", cli_type="telnet")
+        # verify
+        self.assertIsNot(result, pool)
+
+    @mock.patch("cloudshell.devices.cli_session_pool.CLI")
+    def test_get_cli(self, cli_class):
+        # act
+        result = self.registry.get_cli(address="192.168.1.1", port=22, username="admin", cli_type="ssh")
+        # verify
+        self.assertEqual(result, cli_class.return_value)
+        cli_class.assert_called_once_with(
+            session_pool=self.registry.get_pool(address="192.168.1.1", port=22, username="admin", cli_type="ssh"))
+
+    @mock.patch("cloudshell.devices.cli_session_pool.ModeCachingCLI")
+    def test_get_cli_caching_command_mode(self, cli_class):
+        # act
+        result = self.registry.get_cli(address="192.168.1.1", port=22, username="admin", cli_type="ssh",
+                                       cache_command_mode=True)
+        # verify
+        self.assertEqual(result, cli_class.return_value)
+
+    def test_session_is_reused_between_commands(self):
+        pool = self.registry.get_pool(address="192.168.1.1", port=22, username="admin", cli_type="ssh")
+        session = self._create_session()
+        # act
+        first_session = pool.get_session(session, "#", self.logger)
+        pool.return_session(first_session, self.logger)
+        result = pool.get_session(session, "#", self.logger)
+        # verify
+        self.assertIs(result, session)
+        session.connect.assert_called_once_with("#", self.logger)
+        self.assertEqual(self.registry.open_sessions_count, 1)
+
+    def test_idle_session_is_closed(self):
+        pool = self.registry.get_pool(address="192.168.1.1", port=22, username="admin", cli_type="ssh")
+        session = pool.get_session(self._create_session(), "#", self.logger)
+        pool.return_session(session, self.logger)
+        self.now += 61
+        # act
+        self.registry.get_pool(address="192.168.1.2", port=22, username="admin", cli_type="ssh")
+        # verify
+        session.disconnect.assert_called_once_with()
+        self.assertEqual(pool.open_sessions_count, 0)
+        self.assertEqual(self.registry.open_sessions_count, 0)
+
+    def test_session_in_use_is_not_closed(self):
+        pool = self.registry.get_pool(address="192.168.1.1", port=22, username="admin", cli_type="ssh")
+        session = pool.get_session(self._create_session(), "#", self.logger)
+        self.now += 61
+        # act
+        self.registry.get_pool(address="192.168.1.1", port=22, username="admin", cli_type="ssh")
+        # verify
+        session.disconnect.assert_not_called()
+        self.assertEqual(self.registry.open_sessions_count, 1)
+
+    def test_removed_session_releases_slot(self):
+        pool = self.registry.get_pool(address="192.168.1.1", port=22, username="admin", cli_type="ssh")
+        session = pool.get_session(self._create_session(), "#", self.logger)
+        # act
+        pool.remove_session(session, self.logger)
+        # verify
+        session.disconnect.assert_called_once_with()
+        self.assertEqual(self.registry.open_sessions_count, 0)
+
+    def test_failed_connection_releases_slot(self):
+        pool = self.registry.get_pool(address="192.168.1.1", port=22, username="admin", cli_type="ssh")
+        session = self._create_session()
+        session.connect.side_effect = Exception("connection refused")
+        # act
+        with self.assertRaises(Exception):
+            pool.get_session(session, "#", self.logger)
+        # verify
+        self.assertEqual(self.registry.open_sessions_count, 0)
+
+    def test_idle_session_of_other_pool_is_closed_when_limit_reached(self):
+        first_pool = self.registry.get_pool(address="192.168.1.1", port=22, username="admin", cli_type="ssh",
+                                            max_pool_size=2)
+        first_session = first_pool.get_session(self._create_session(), "#", self.logger)
+        second_session = first_pool.get_session(self._create_session(), "#", self.logger)
+        first_pool.return_session(first_session, self.logger)
+        second_pool = self.registry.get_pool(address="192.168.1.2", port=22, username="admin", cli_type="ssh")
+        # act
+        result = second_pool.get_session(self._create_session(), "#", self.logger)
+        # verify
+        first_session.disconnect.assert_called_once_with()
+        second_session.disconnect.assert_not_called()
+        result.connect.assert_called_once_with("#", self.logger)
+        self.assertEqual(self.registry.open_sessions_count, 2)
+
+    def test_limit_of_open_sessions(self):
+        first_pool = self.registry.get_pool(address="192.168.1.1", port=22, username="admin", cli_type="ssh",
+                                            max_pool_size=2)
+        first_pool.get_session(self._create_session(), "#", self.logger)
+        first_pool.get_session(self._create_session(), "#", self.logger)
+        second_pool = self.registry.get_pool(address="192.168.1.2", port=22, username="admin", cli_type="ssh",
+                                             pool_timeout=0)
+        session = self._create_session()
+        # act
+        with self.assertRaisesRegexp(SessionPoolException, "2 sessions are already open"):
+            second_pool.get_session(session, "#", self.logger)
+        # verify
+        session.connect.assert_not_called()
+
+    def test_session_returned_while_waiting_for_slot_is_reused(self):
+        pool = self.registry.get_pool(address="192.168.1.1", port=22, username="admin", cli_type="ssh",
+                                      max_pool_size=3, pool_timeout=10)
+        first_session = pool.get_session(self._create_session(), "#", self.logger)
+        pool.get_session(self._create_session(), "#", self.logger)
+        results = []
+        thread = threading.Thread(target=lambda: results.append(pool.get_session(first_session, "#", self.logger)))
+        thread.start()
+        while not pool._opening_count:
+            thread.join(0.01)
+        # act
+        pool.return_session(first_session, self.logger)
+        thread.join(5)
+        # verify
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(results, [first_session])
+        first_session.connect.assert_called_once_with("#", self.logger)
+        self.assertEqual(self.registry.open_sessions_count, 2)
+
+    def test_probe_idle_sessions(self):
+        """Check that session idle longer than the interval will be probed and kept in the pool if it is alive"""
+        pool = self.registry.get_pool(address="192.168.1.1", port=22, username="admin", cli_type="ssh")
+        session = self._create_idle_session(pool)
+        self.now += 30
+        # act
+        result = self.registry.probe_idle_sessions(min_idle_time=30, timeout=5)
+        # verify
+        self.assertEqual(result, 0)
+        session.hardware_expect.assert_called_once_with("", expected_string=".+", logger=self.registry._logger,
+                                                        timeout=5)
+        session.disconnect.assert_not_called()
+        self.assertIs(pool.get_session(session, "#", self.logger), session)
+
+    def test_probe_idle_sessions_skips_recently_used_sessions(self):
+        pool = self.registry.get_pool(address="192.168.1.1", port=22, username="admin", cli_type="ssh")
+        session = self._create_idle_session(pool)
+        self.now += 30
+        self.registry.probe_idle_sessions(min_idle_time=30)
+        self.now += 10
+        # act
+        self.registry.probe_idle_sessions(min_idle_time=30)
+        # verify
+        session.hardware_expect.assert_called_once()
+
+    def test_probe_idle_sessions_closes_stale_session(self):
+        """Check that session which doesn't respond will be closed before any command checks it out"""
+        pool = self.registry.get_pool(address="192.168.1.1", port=22, username="admin", cli_type="ssh")
+        session = self._create_idle_session(pool)
+        session.hardware_expect.side_effect = Exception("Socket closed by timeout")
+        self.now += 30
+        # act
+        result = self.registry.probe_idle_sessions(min_idle_time=30)
+        # verify
+        self.assertEqual(result, 1)
+        session.disconnect.assert_called_once_with()
+        self.assertEqual(self.registry.open_sessions_count, 0)
+
+    def test_probe_idle_sessions_doesnt_prevent_idle_eviction(self):
+        """Check that probes will not refresh idle time, so unused sessions are still closed"""
+        pool = self.registry.get_pool(address="192.168.1.1", port=22, username="admin", cli_type="ssh")
+        session = self._create_idle_session(pool)
+        self.now += 30
+        self.registry.probe_idle_sessions(min_idle_time=30)
+        self.now += 31
+        # act
+        self.registry.probe_idle_sessions(min_idle_time=30)
+        # verify
+        session.disconnect.assert_called_once_with()
+
+    def test_probe_idle_sessions_clears_cached_command_mode(self):
+        """Check that cached mode will be cleared if device left it by itself"""
+        pool = self.registry.get_pool(address="192.168.1.1", port=22, username="admin", cli_type="ssh")
+        session = self._create_idle_session(pool)
+        session.cached_command_mode = (mock.MagicMock(prompt=r"\(config\)#\s*$"), self.now)
+        session.hardware_expect.return_value = "Switch#"
+        self.now += 30
+        # act
+        self.registry.probe_idle_sessions(min_idle_time=30)
+        # verify
+        self.assertIsNone(session.cached_command_mode)
+
+    def test_start_keepalive(self):
+        """Check that idle sessions will be probed in the background until keepalive is stopped"""
+        probed = threading.Event()
+        self.registry.probe_idle_sessions = mock.MagicMock(side_effect=lambda interval, timeout: probed.set())
+        # act
+        self.registry.start_keepalive(interval=0.01, timeout=5)
+        self.registry.start_keepalive(interval=0.01, timeout=5)
+        # verify
+        self.assertTrue(probed.wait(5))
+        self.assertEqual(len([thread for thread in threading.enumerate()
+                              if thread.name == "CLI sessions keepalive"]), 1)
+        self.registry.stop_keepalive()
+        self.registry.probe_idle_sessions.assert_called_with(0.01, 5)
@@ -0,0 +1,89 @@
+import unittest
+
+import mock
+
+from cloudshell.devices.cli_transport_cache import TransportPreferenceCache
+
+
+class TestTransportPreferenceCache(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000
+        self.cache = TransportPreferenceCache(ttl=60, timer=lambda: self.now)
+        self.device = ("192.168.1.1", 22)
+
+    def test_get(self):
+        self.cache.record_success(self.device, "TELNET")
+        # act
+        result = self.cache.get(self.device)
+        # verify
+        self.assertEqual(result, "TELNET")
+        self.assertIsNone(self.cache.get(("192.168.1.2", 22)))
+
+    def test_get_expired(self):
+        """Check that preference will be dropped after TTL, so all session types are tried in default order again"""
+        self.cache.record_success(self.device, "TELNET")
+        self.now += 60
+        # act
+        result = self.cache.get(self.device)
+        # verify
+        self.assertIsNone(result)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_get_expired_after_successes_of_preferred_type(self):
+        """Check that successes of the preferred type don't prolong the preference"""
+        self.cache.record_success(self.device, "TELNET")
+        self.now += 30
+        self.cache.record_success(self.device, "TELNET")
+        self.now += 30
+        # act
+        result = self.cache.get(self.device)
+        # verify
+        self.assertIsNone(result)
+
+    def test_record_success_of_other_type(self):
+        self.cache.record_success(self.device, "TELNET")
+        self.now += 30
+        self.cache.record_success(self.device, "SSH")
+        self.now += 30
+        # act
+        result = self.cache.get(self.device)
+        # verify
+        self.assertEqual(result, "SSH")
+
+    def test_record_failure_of_preferred_type(self):
+        self.cache.record_success(self.device, "TELNET")
+        # act
+        self.cache.record_failure(self.device, "TELNET")
+        # verify
+        self.assertIsNone(self.cache.get(self.device))
+
+    def test_record_failure_of_other_type(self):
+        self.cache.record_success(self.device, "TELNET")
+        # act
+        self.cache.record_failure(self.device, "SSH")
+        # verify
+        self.assertEqual(self.cache.get(self.device), "TELNET")
+
+    def test_order_sessions(self):
+        ssh_session = mock.MagicMock(session_type="SSH")
+        telnet_session = mock.MagicMock(session_type="TELNET")
+        self.cache.record_success(self.device, "TELNET")
+        # act
+        result = self.cache.order_sessions(self.device, [ssh_session, telnet_session])
+        # verify
+        self.assertEqual(result, [telnet_session, ssh_session])
+
+    def test_order_sessions_without_preference(self):
+        ssh_session = mock.MagicMock(session_type="SSH")
+        telnet_session = mock.MagicMock(session_type="TELNET")
+        # act
+        result = self.cache.order_sessions(self.device, [ssh_session, telnet_session])
+        # verify
+        self.assertEqual(result, [ssh_session, telnet_session])
+
+    def test_clear(self):
+        self.cache.record_success(self.device, "TELNET")
+        # act
+        self.cache.clear()
+        # verify
+        self.assertIsNone(self.cache.get(self.device))
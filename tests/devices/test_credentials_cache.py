@@ -0,0 +1,57 @@
+import unittest
+
+import mock
+
+from cloudshell.devices.credentials_cache import DecryptedPasswordCache
+
+
+class TestDecryptedPasswordCache(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000
+        self.cache = DecryptedPasswordCache(ttl=60, max_size=2, timer=lambda: self.now)
+        self.api = mock.MagicMock()
+        self.api.DecryptPassword.side_effect = lambda value: mock.MagicMock(Value="decrypted {}".format(value))
+
+    def test_decrypt_password(self):
+        """Check that password will be decrypted with the API only once"""
+        self.cache.decrypt_password(self.api, "encrypted")
+        # act
+        result = self.cache.decrypt_password(mock.MagicMock(), "encrypted")
+        # verify
+        self.assertEqual(result, "decrypted encrypted")
+        self.api.DecryptPassword.assert_called_once_with("encrypted")
+
+    def test_decrypt_password_expired(self):
+        self.cache.decrypt_password(self.api, "encrypted")
+        self.now += 60
+        # act
+        result = self.cache.decrypt_password(self.api, "encrypted")
+        # verify
+        self.assertEqual(result, "decrypted encrypted")
+        self.assertEqual(self.api.DecryptPassword.call_count, 2)
+
+    def test_decrypt_password_evicts_least_recently_used(self):
+        self.cache.decrypt_password(self.api, "first")
+        self.cache.decrypt_password(self.api, "second")
+        self.cache.decrypt_password(self.api, "first")
+        # act
+        self.cache.decrypt_password(self.api, "third")
+        # verify
+        self.assertEqual(len(self.cache), 2)
+        self.cache.decrypt_password(self.api, "first")
+        self.assertEqual(self.api.DecryptPassword.call_count, 3)
+
+    def test_invalidate(self):
+        self.cache.decrypt_password(self.api, "encrypted")
+        # act
+        self.cache.invalidate("encrypted")
+        # verify
+        self.cache.decrypt_password(self.api, "encrypted")
+        self.assertEqual(self.api.DecryptPassword.call_count, 2)
+
+    def test_clear(self):
+        self.cache.decrypt_password(self.api, "encrypted")
+        # act
+        self.cache.clear()
+        # verify
+        self.assertEqual(len(self.cache), 0)
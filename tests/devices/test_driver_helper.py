@@ -26,6 +26,40 @@ class TestDriverHelper(unittest.TestCase):
         session_pool_manager_class.assert_called_once_with(max_pool_size=session_pool_size,
                                                            pool_timeout=pool_timeout)
 
+    @mock.patch("cloudshell.devices.driver_helper.SessionPoolManager")
+    @mock.patch("cloudshell.devices.driver_helper.ModeCachingCLI")
+    def test_get_cli_caching_command_mode(self, cli_class, session_pool_manager_class):
+        """Check that method will return CLI caching command mode if it is enabled"""
+        # act
+        result = driver_helper.get_cli(session_pool_size=10, cache_command_mode=True)
+        # verify
+        self.assertEqual(result, cli_class.return_value)
+        cli_class.assert_called_once_with(session_pool=session_pool_manager_class.return_value)
+
+    @mock.patch("cloudshell.devices.driver_helper.SESSION_POOL_REGISTRY")
+    def test_get_shared_cli(self, session_pool_registry):
+        """Check that method will return CLI with the device session pool from the process-wide registry"""
+        resource_config = mock.MagicMock(address="192.168.1.1",
+                                         cli_tcp_port="22",
+                                         user="admin",
+                                         cli_connection_type="ssh")
+        logger = mock.MagicMock()
+        # act
+        result = driver_helper.get_shared_cli(resource_config=resource_config,
+                                              session_pool_size=10,
+                                              pool_timeout=50,
+                                              logger=logger)
+        # verify
+        self.assertEqual(result, session_pool_registry.get_cli.return_value)
+        session_pool_registry.get_cli.assert_called_once_with(address="192.168.1.1",
+                                                              port="22",
+                                                              username="admin",
+                                                              cli_type="ssh",
+                                                              max_pool_size=10,
+                                                              pool_timeout=50,
+                                                              logger=logger,
+                                                              cache_command_mode=False)
+
     @mock.patch("cloudshell.devices.driver_helper.LoggingSessionContext")
     def test_get_logger_with_thread_id(self, logging_session_context_class):
         """Check that method will use LoggingSessionContext to return child logger with same handlers as main one"""
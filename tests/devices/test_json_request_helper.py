@@ -1,8 +1,10 @@
+import json
 from unittest import TestCase
 
 import mock
 
-from cloudshell.devices.json_request_helper import JsonRequestDeserializer
+from cloudshell.devices.json_request_helper import JsonRequestDeserializer, ConnectivityRequestDecoder, \
+    ConnectivityAction, ActionTarget
 
 
 class TestJsonRequestDeserializer(TestCase):
@@ -73,4 +75,90 @@ class TestJsonRequestDeserializer(TestCase):
         """Check that method will return same primitive for the primitive object"""
         test_obj = "test_primitive"
         returned_obj = self.tested_class._create_obj_by_type(test_obj)
-        self.assertEqual(returned_obj, test_obj)
\ No newline at end of file
+        self.assertEqual(returned_obj, test_obj)
+
+class TestConnectivityRequestDecoder(TestCase):
+    def setUp(self):
+        self.decoder = ConnectivityRequestDecoder(["type", "actionId",
+                                                   ("connectionParams", "mode"),
+                                                   ("actionTarget", "fullAddress")])
+
+    @staticmethod
+    def _create_request(*actions):
+        return json.dumps({"driverRequest": {"actions": list(actions)}})
+
+    @staticmethod
+    def _create_action():
+        return {"actionId": "some action id",
+                "type": "setVlan",
+                "connectionId": "some connection id",
+                "actionTarget": {"fullName": "Switch/Chassis 0/Port 1", "fullAddress": "192.168.1.1/0/1"},
+                "connectionParams": {"vlanId": "10-20", "mode": "Trunk", "type": "setVlanParameter",
+                                     "vlanServiceAttributes": [{"attributeName": "QnQ",
+                                                                "attributeValue": "False",
+                                                                "type": "vlanServiceAttribute"}]},
+                "connectorAttributes": [],
+                "unknownField": "some value"}
+
+    def test_decode(self):
+        """Check that method will return action records with the request data"""
+        # act
+        actions = self.decoder.decode(self._create_request(self._create_action()))
+        # verify
+        self.assertEqual(len(actions), 1)
+        action = actions[0]
+        self.assertIsInstance(action, ConnectivityAction)
+        self.assertEqual(action.actionId, "some action id")
+        self.assertEqual(action.type, "setVlan")
+        self.assertEqual(action.connectionId, "some connection id")
+        self.assertEqual(action.actionTarget.fullName, "Switch/Chassis 0/Port 1")
+        self.assertEqual(action.connectionParams.vlanId, "10-20")
+        self.assertEqual(action.connectionParams.mode, "Trunk")
+        self.assertEqual(action.connectionParams.vlanServiceAttributes[0].attributeName, "QnQ")
+        self.assertEqual(action.connectionParams.vlanServiceAttributes[0].attributeValue, "False")
+        self.assertEqual(action.connectorAttributes, [])
+        self.assertEqual(action.customActionAttributes, [])
+        self.assertFalse(hasattr(action, "unknownField"))
+        self.assertFalse(hasattr(action, "__dict__"))
+
+    def test_decode_no_driver_request(self):
+        """Check that method will return None if request doesn't contain driver request actions"""
+        for request in ("{}", "[]", "null", '{"driverRequest": {}}', '{"driverRequest": null}'):
+            self.assertIsNone(self.decoder.decode(request))
+
+    def test_decode_invalid_json(self):
+        """Check that method will raise ValueError if request is not a valid json"""
+        with self.assertRaises(ValueError):
+            self.decoder.decode("{driverRequest")
+
+    def test_decode_missing_field(self):
+        """Check that method will raise ValueError with the name of the missing mandatory field"""
+        for key, nested_key, missing_field in (("actionId", None, "actionId"),
+                                               ("type", None, "type"),
+                                               ("connectionParams", None, "connectionParams"),
+                                               ("connectionParams", "mode", "mode"),
+                                               ("actionTarget", "fullAddress", "fullAddress")):
+            action = self._create_action()
+            if nested_key is None:
+                del action[key]
+            else:
+                del action[key][nested_key]
+
+            with self.assertRaisesRegexp(ValueError, "Mandatory field {} is missing in "
+                                                     "ApplyConnectivityChanges request json".format(missing_field)):
+                self.decoder.decode(self._create_request(self._create_action(), action))
+
+    def test_decode_not_object_nested_field(self):
+        """Check that method will report nested object as missing if it is not a json object"""
+        action = self._create_action()
+        action["actionTarget"] = None
+
+        with self.assertRaisesRegexp(ValueError, "Mandatory field actionTarget is missing"):
+            self.decoder.decode(self._create_request(action))
+
+    def test_record_repr(self):
+        action_target = ActionTarget({"fullName": "port", "fullAddress": "address"})
+        # act
+        result = repr(action_target)
+        # verify
+        self.assertEqual(result, "ActionTarget(fullName='port', fullAddress='address', type=None)")
@@ -1,6 +1,15 @@
+import datetime
+import threading
 import unittest
 
+import jsonpickle
 import mock
+from cloudshell.core.driver_response import DriverResponse
+from cloudshell.core.driver_response_root import DriverResponseRoot
+from cloudshell.networking.apply_connectivity.models.connectivity_result import ConnectivitySuccessResponse, \
+    ConnectivityErrorResponse
+from cloudshell.shell.core.interfaces.save_restore import OrchestrationSaveResult, OrchestrationSavedArtifactInfo, \
+    OrchestrationRestoreRules, OrchestrationSavedArtifact
 
 from cloudshell.devices import networking_utils
 
@@ -22,18 +31,18 @@ class TestNetworkingUtils(unittest.TestCase):
             self.assertFalse(result)
 
     def test_validate_vlan_range_returns_true(self):
-        networking_utils.validate_vlan_number = mock.MagicMock(return_value=True)
         # act
-        result = networking_utils.validate_vlan_range(vlan_range="38,40-45")
-        # verify
-        self.assertTrue(result)
+        for val in ("38,40-45", "1-4000", "45-40"):
+            result = networking_utils.validate_vlan_range(vlan_range=val)
+            # verify
+            self.assertTrue(result)
 
     def test_validate_vlan_range_returns_false(self):
-        networking_utils.validate_vlan_number = mock.MagicMock(return_value=False)
         # act
-        result = networking_utils.validate_vlan_range(vlan_range="38,40-45")
-        # verify
-        self.assertFalse(result)
+        for val in ("38,40-4001", "0", "10-20-30", "10,", "some str"):
+            result = networking_utils.validate_vlan_range(vlan_range=val)
+            # verify
+            self.assertFalse(result)
 
     def test_serialize_to_json(self):
         data = {"key1": "val1"}
@@ -43,6 +52,187 @@ class TestNetworkingUtils(unittest.TestCase):
         self.assertEqual(result, '{"key1": "val1"}')
 
 
+class TestSerializeToJson(unittest.TestCase):
+    @staticmethod
+    def _create_action(action_id, port_name):
+        return mock.MagicMock(type="setVlan", actionId=action_id, actionTarget=mock.MagicMock(fullName=port_name))
+
+    def _create_driver_response_root(self):
+        driver_response = DriverResponse()
+        driver_response.actionResults = [
+            ConnectivitySuccessResponse(self._create_action("action 1", "Switch/Chassis 0/Port 1"),
+                                        "Add Vlan 10-20 configuration successfully completed"),
+            ConnectivityErrorResponse(self._create_action(u"action 2", u"Switch/Chassis 0/Port \u00e9"),
+                                      "Add Vlan 30 configuration failed.\nAdd Vlan configuration details:\n"
+                                      "\"error\" \xc3\xa9 \t \\"),
+        ]
+        driver_response_root = DriverResponseRoot()
+        driver_response_root.driverResponse = driver_response
+        return driver_response_root
+
+    @staticmethod
+    def _create_save_result(saved_artifact=None):
+        saved_artifact_info = OrchestrationSavedArtifactInfo(
+            resource_name="switch",
+            created_date=datetime.datetime(2017, 1, 2, 3, 4, 5, 6),
+            restore_rules=OrchestrationRestoreRules(requires_same_resource=True,
+                                                    additional_rules={"rule": "value", "count": 5}),
+            saved_artifact=saved_artifact or OrchestrationSavedArtifact(artifact_type="tftp",
+                                                                        identifier="//192.168.1.2/switch-running"))
+        return OrchestrationSaveResult(saved_artifacts_info=saved_artifact_info)
+
+    def _assert_same_as_jsonpickle(self, result):
+        expected = str(jsonpickle.encode(result, unpicklable=False))
+        # act
+        json = networking_utils.serialize_to_json(result)
+        # verify
+        self.assertEqual(json, expected)
+
+    def test_driver_response(self):
+        self._assert_same_as_jsonpickle(self._create_driver_response_root())
+
+    def test_empty_driver_response(self):
+        driver_response_root = DriverResponseRoot()
+        driver_response_root.driverResponse = DriverResponse()
+        self._assert_same_as_jsonpickle(driver_response_root)
+
+    def test_orchestration_save_result(self):
+        self._assert_same_as_jsonpickle(self._create_save_result())
+
+    def test_fallback_to_jsonpickle(self):
+        """Check that values unknown to the response encoder are encoded the same way as jsonpickle does"""
+        class CustomSavedArtifact(OrchestrationSavedArtifact):
+            pass
+
+        driver_response_root = self._create_driver_response_root()
+        driver_response_root.driverResponse.actionResults.append(
+            driver_response_root.driverResponse.actionResults[0])
+        not_utf8_response = self._create_driver_response_root()
+        not_utf8_response.driverResponse.actionResults[0].infoMessage = "\xff\xfe"
+
+        for result in (self._create_save_result(CustomSavedArtifact(artifact_type="ftp", identifier="path")),
+                       self._create_save_result(OrchestrationSavedArtifact(artifact_type={"some": "dict"},
+                                                                           identifier=set())),
+                       driver_response_root,
+                       not_utf8_response):
+            self._assert_same_as_jsonpickle(result)
+
+    def test_connectivity_responses_without_networking_package(self):
+        """Check that encoder will handle the other responses if cloudshell-networking is not installed"""
+        module_name = "cloudshell.networking.apply_connectivity.models.connectivity_result"
+        encoder = networking_utils.ResponseJsonEncoder()
+        # act
+        with mock.patch.dict("sys.modules", {module_name: None}):
+            response_types = encoder.response_types
+        # verify
+        self.assertEqual(response_types, networking_utils.ResponseJsonEncoder.RESPONSE_TYPES)
+        self.assertTrue(encoder.is_supported(self._create_save_result()))
+        self.assertFalse(encoder.is_supported(self._create_driver_response_root().driverResponse.actionResults[0]))
+
+
+class TestVlanSet(unittest.TestCase):
+    def test_from_string(self):
+        # act
+        vlan_set = networking_utils.VlanSet.from_string("21-23,10-15,19,12")
+        # verify
+        self.assertEqual(vlan_set.to_range_list(), ["10-15", "19", "21-23"])
+        self.assertEqual(len(vlan_set), 10)
+        self.assertIn(19, vlan_set)
+        self.assertNotIn(20, vlan_set)
+
+    def test_from_string_reversed_range(self):
+        # act
+        vlan_set = networking_utils.VlanSet.from_string("12-10")
+        # verify
+        self.assertEqual(list(vlan_set), [10, 11, 12])
+
+    def test_from_string_invalid_vlan_number(self):
+        with self.assertRaisesRegexp(ValueError, "Wrong VLAN number detected 4001"):
+            networking_utils.VlanSet.from_string("10,4001")
+
+    def test_from_string_invalid_vlan_range(self):
+        for val in ("0-10", "10-20-30", "10-"):
+            with self.assertRaisesRegexp(ValueError, "Wrong VLANs range detected {}".format(val)):
+                networking_utils.VlanSet.from_string(val)
+
+    def test_ranges_merges_overlapping_and_adjacent_ranges(self):
+        # act
+        vlan_set = networking_utils.VlanSet.from_string("10-20,15-30,31,1,4000,3999")
+        # verify
+        self.assertEqual(vlan_set.ranges(), [(1, 1), (10, 31), (3999, 4000)])
+        self.assertEqual(str(vlan_set), "1,10-31,3999-4000")
+
+    def test_set_operations(self):
+        first = networking_utils.VlanSet.from_string("10-20")
+        second = networking_utils.VlanSet.from_string("15-25")
+        # act
+        union = first | second
+        intersection = first & second
+        difference = first - second
+        # verify
+        self.assertEqual(union, networking_utils.VlanSet.from_string("10-25"))
+        self.assertEqual(intersection, networking_utils.VlanSet.from_string("15-20"))
+        self.assertEqual(difference, networking_utils.VlanSet.from_string("10-14"))
+        self.assertEqual(networking_utils.VlanSet.union(first, second, difference), union)
+        self.assertFalse(difference - first)
+        self.assertTrue(difference)
+
+    def test_empty_set(self):
+        # act
+        vlan_set = networking_utils.VlanSet()
+        # verify
+        self.assertFalse(vlan_set)
+        self.assertEqual(len(vlan_set), 0)
+        self.assertEqual(vlan_set.to_range_list(), [])
+
+
+class TestKeyedLock(unittest.TestCase):
+    def test_lock_is_removed_after_release(self):
+        keyed_lock = networking_utils.KeyedLock()
+        # act
+        with keyed_lock.lock("port 1"):
+            with keyed_lock.lock("port 2"):
+                locks_count = len(keyed_lock)
+        # verify
+        self.assertEqual(locks_count, 2)
+        self.assertEqual(len(keyed_lock), 0)
+
+    def test_lock_serializes_same_key(self):
+        keyed_lock = networking_utils.KeyedLock()
+        events = []
+
+        def locked_append(key, value):
+            with keyed_lock.lock(key):
+                events.append(value)
+
+        # act
+        with keyed_lock.lock("port 1"):
+            same_key_thread = threading.Thread(target=locked_append, args=("port 1", "same key"))
+            other_key_thread = threading.Thread(target=locked_append, args=("port 2", "other key"))
+            same_key_thread.start()
+            other_key_thread.start()
+            other_key_thread.join()
+            events.append("released")
+        same_key_thread.join()
+        # verify
+        self.assertEqual(events, ["other key", "released", "same key"])
+        self.assertEqual(len(keyed_lock), 0)
+
+    def test_acquire_timeout(self):
+        keyed_lock = networking_utils.KeyedLock()
+        keyed_lock.acquire("port 1")
+        # act
+        with keyed_lock.lock("port 2"):
+            acquired = keyed_lock.acquire("port 1", timeout=0.01)
+        # verify
+        self.assertFalse(acquired)
+        self.assertEqual(len(keyed_lock), 1)
+        keyed_lock.release("port 1")
+        self.assertTrue(keyed_lock.acquire("port 1", timeout=0))
+        keyed_lock.release("port 1")
+        self.assertEqual(len(keyed_lock), 0)
+
+
 class TestUrlParser(unittest.TestCase):
     def setUp(self):
         self.url_data = {
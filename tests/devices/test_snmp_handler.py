@@ -1,9 +1,11 @@
 import unittest
 
 import mock
+from cloudshell.snmp.snmp_parameters import SNMPV2ReadParameters
 
 from cloudshell.devices.snmp_handler import SnmpContextManager
 from cloudshell.devices.snmp_handler import SnmpHandler
+from cloudshell.devices.snmp_state import SnmpStateRegistry
 
 
 class TestSnmpContextManager(unittest.TestCase):
@@ -39,6 +41,65 @@ class TestSnmpContextManager(unittest.TestCase):
         # verify
         self.disable_flow.execute_flow.assert_called_once_with(self.snmp_parameters)
 
+    @mock.patch("cloudshell.devices.snmp_handler.QualiSnmp")
+    def test_snmp_state_registry(self, quali_snmp_class):
+        """Check that SNMP will be enabled and disabled only by the first and the last users of the device"""
+        snmp_state_registry = SnmpStateRegistry(linger_time=0)
+        snmp_parameters = SNMPV2ReadParameters(ip="192.168.1.1", snmp_read_community="public")
+        snmp_cm = SnmpContextManager(enable_flow=self.enable_flow,
+                                     disable_flow=self.disable_flow,
+                                     snmp_parameters=snmp_parameters,
+                                     logger=self.logger,
+                                     snmp_state_registry=snmp_state_registry)
+        other_snmp_cm = SnmpContextManager(enable_flow=self.enable_flow,
+                                           disable_flow=self.disable_flow,
+                                           snmp_parameters=SNMPV2ReadParameters(ip="192.168.1.1",
+                                                                                snmp_read_community="public"),
+                                           logger=self.logger,
+                                           snmp_state_registry=snmp_state_registry)
+        # act
+        with snmp_cm:
+            with other_snmp_cm:
+                pass
+            self.disable_flow.execute_flow.assert_not_called()
+        # verify
+        self.enable_flow.execute_flow.assert_called_once_with(snmp_parameters)
+        self.disable_flow.execute_flow.assert_called_once_with(snmp_parameters)
+
+    @mock.patch("cloudshell.devices.snmp_handler.QualiSnmp")
+    def test_snmp_state_registry_releases_on_error(self, quali_snmp_class):
+        """Check that user will be unregistered if SNMP service can't be created"""
+        snmp_state_registry = mock.MagicMock()
+        quali_snmp_class.side_effect = Exception("SNMP error")
+        snmp_cm = SnmpContextManager(enable_flow=self.enable_flow,
+                                     disable_flow=self.disable_flow,
+                                     snmp_parameters=self.snmp_parameters,
+                                     logger=self.logger,
+                                     snmp_state_registry=snmp_state_registry)
+        # act
+        with self.assertRaisesRegexp(Exception, "SNMP error"):
+            with snmp_cm:
+                pass
+        # verify
+        snmp_state_registry.acquire.assert_called_once_with(snmp_state_registry.get_device_key.return_value,
+                                                            snmp_cm._enable_snmp)
+        snmp_state_registry.release.assert_called_once_with(snmp_state_registry.get_device_key.return_value,
+                                                            mock.ANY)
+        disable = snmp_state_registry.release.call_args[0][1]
+        disable()
+        self.disable_flow.execute_flow.assert_called_once_with(self.snmp_parameters)
+
+    def test_get_disable_function_without_disable_flow(self):
+        """Check that registry gets no disable function if there is no disable flow"""
+        snmp_cm = SnmpContextManager(enable_flow=self.enable_flow,
+                                     disable_flow=None,
+                                     snmp_parameters=self.snmp_parameters,
+                                     logger=self.logger)
+        # act
+        result = snmp_cm._get_disable_function()
+        # verify
+        self.assertIsNone(result)
+
 
 class TestSnmpHandler(unittest.TestCase):
     def setUp(self):
@@ -113,7 +174,8 @@ class TestSnmpHandler(unittest.TestCase):
         snmp_context_manager_class.assert_called_once_with(self.snmp.enable_flow,
                                                            self.snmp.disable_flow,
                                                            self.snmp._snmp_parameters,
-                                                           self.snmp._logger)
+                                                           self.snmp._logger,
+                                                           snmp_state_registry=self.snmp.SNMP_STATE_REGISTRY)
 
     def test_create_enable_and_disable_flow_does_nothing(self):
         class TestedClass(SnmpHandler):
@@ -0,0 +1,150 @@
+import threading
+import unittest
+
+import mock
+from cloudshell.snmp.snmp_parameters import SNMPV2WriteParameters, SNMPV3Parameters
+
+from cloudshell.devices.snmp_state import SnmpStateRegistry
+
+
+class TestSnmpStateRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = SnmpStateRegistry(linger_time=0)
+        self.enable = mock.MagicMock()
+        self.disable = mock.MagicMock()
+        self.key = ("192.168.1.1", 161, "SNMPV2WriteParameters", "private", None)
+
+    def test_get_device_key(self):
+        v2_parameters = SNMPV2WriteParameters(ip="192.168.1.1", snmp_write_community="private")
+        v3_parameters = SNMPV3Parameters(ip="192.168.1.1", snmp_user="admin", snmp_password="password",
+                                         snmp_private_key="key")
+        # act
+        v2_key = self.registry.get_device_key(v2_parameters)
+        v3_key = self.registry.get_device_key(v3_parameters)
+        # verify
+        self.assertEqual(v2_key, ("192.168.1.1", v2_parameters.port, "SNMPV2WriteParameters", "private", None))
+        self.assertEqual(v3_key, ("192.168.1.1", v3_parameters.port, "SNMPV3Parameters", None, "admin"))
+
+    def test_acquire_enables_snmp_once(self):
+        self.registry.acquire(self.key, self.enable)
+        # act
+        self.registry.acquire(self.key, self.enable)
+        # verify
+        self.enable.assert_called_once_with()
+
+    def test_release_disables_snmp_after_last_user(self):
+        self.registry.acquire(self.key, self.enable)
+        self.registry.acquire(self.key, self.enable)
+        # act
+        self.registry.release(self.key, self.disable)
+        self.disable.assert_not_called()
+        self.registry.release(self.key, self.disable)
+        # verify
+        self.disable.assert_called_once_with()
+        self.registry.acquire(self.key, self.enable)
+        self.assertEqual(self.enable.call_count, 2)
+
+    def test_acquire_failed_enable(self):
+        """Check that failed enable will not register user, so the next one tries to enable SNMP again"""
+        self.enable.side_effect = [Exception("CLI error"), None]
+        with self.assertRaisesRegexp(Exception, "CLI error"):
+            self.registry.acquire(self.key, self.enable)
+        # act
+        self.registry.acquire(self.key, self.enable)
+        # verify
+        self.assertEqual(self.enable.call_count, 2)
+
+    def test_acquire_without_enable_flow(self):
+        self.registry.acquire(self.key, None)
+        # act
+        self.registry.release(self.key, self.disable)
+        # verify
+        self.disable.assert_called_once_with()
+
+    def test_release_keeps_snmp_enabled_during_linger_time(self):
+        """Check that SNMP will not be reconfigured if the next user comes during the linger time"""
+        self.registry.linger_time = 5
+        self.registry.acquire(self.key, self.enable)
+        self.registry.release(self.key, self.disable)
+        # act
+        self.registry.acquire(self.key, self.enable)
+        self.registry.linger_time = 0
+        self.registry.release(self.key, self.disable)
+        # verify
+        self.enable.assert_called_once_with()
+        self.disable.assert_called_once_with()
+
+    def test_release_disables_snmp_after_linger_time(self):
+        disabled = threading.Event()
+        self.disable.side_effect = lambda: disabled.set()
+        self.registry.linger_time = 0.01
+        self.registry.acquire(self.key, self.enable)
+        # act
+        self.registry.release(self.key, self.disable)
+        # verify
+        self.assertTrue(disabled.wait(5))
+        self.registry.acquire(self.key, self.enable)
+        self.assertEqual(self.enable.call_count, 2)
+
+    def test_failed_disable_after_linger_time_is_logged(self):
+        logger = mock.MagicMock()
+        self.registry = SnmpStateRegistry(linger_time=0.01, logger=logger)
+        failed = threading.Event()
+
+        def disable():
+            failed.set()
+            raise Exception("CLI error")
+
+        self.registry.acquire(self.key, self.enable)
+        # act
+        self.registry.release(self.key, disable)
+        # verify
+        self.assertTrue(failed.wait(5))
+        self.registry.acquire(self.key, self.enable)
+        self.assertEqual(self.enable.call_count, 2)
+        logger.exception.assert_called_once_with("Failed to disable SNMP")
+
+    def test_acquire_without_enable_flow_doesnt_mark_snmp_enabled(self):
+        """Check that user with enable flow enables SNMP even if the device is used by the user without it"""
+        self.registry.acquire(self.key, None)
+        # act
+        self.registry.acquire(self.key, self.enable)
+        # verify
+        self.enable.assert_called_once_with()
+
+    def test_release_drops_unused_state(self):
+        self.registry.acquire(self.key, self.enable)
+        # act
+        self.registry.release(self.key, self.disable)
+        # verify
+        self.assertEqual(len(self.registry), 0)
+
+    def test_linger_timer_is_daemon(self):
+        self.registry.linger_time = 60
+        self.registry.acquire(self.key, self.enable)
+        self.registry.release(self.key, self.disable)
+        timer = self.registry._devices[self.key].linger_timer
+        self.addCleanup(timer.cancel)
+        # verify
+        self.assertTrue(timer.daemon)
+        self.disable.assert_not_called()
+
+    def test_flush_disables_lingering_devices(self):
+        self.registry.linger_time = 60
+        self.registry.acquire(self.key, self.enable)
+        self.registry.release(self.key, self.disable)
+        timer = self.registry._devices[self.key].linger_timer
+        # act
+        self.registry.flush()
+        # verify
+        self.disable.assert_called_once_with()
+        self.assertFalse(timer.is_alive() and not timer.finished.is_set())
+        self.assertEqual(len(self.registry), 0)
+
+    def test_flush_skips_used_devices(self):
+        self.registry.acquire(self.key, self.enable)
+        # act
+        self.registry.flush()
+        # verify
+        self.disable.assert_not_called()
+        self.assertEqual(len(self.registry), 1)
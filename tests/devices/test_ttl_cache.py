@@ -0,0 +1,60 @@
+import unittest
+
+from cloudshell.devices.ttl_cache import TTLCache
+
+
+class TestTTLCache(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000
+        self.cache = TTLCache(ttl=60, max_size=2, timer=lambda: self.now)
+
+    def test_get(self):
+        self.cache.set("key", "value")
+        # act
+        result = self.cache.get("key")
+        # verify
+        self.assertEqual(result, "value")
+        self.assertEqual(self.cache.get("other key", "default"), "default")
+
+    def test_get_expired(self):
+        self.cache.set("key", "value")
+        self.now += 60
+        # act
+        result = self.cache.get("key")
+        # verify
+        self.assertIsNone(result)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_set_evicts_least_recently_used(self):
+        self.cache.set("first", 1)
+        self.cache.set("second", 2)
+        self.cache.get("first")
+        # act
+        self.cache.set("third", 3)
+        # verify
+        self.assertEqual(len(self.cache), 2)
+        self.assertIsNone(self.cache.get("second"))
+        self.assertEqual(self.cache.get("first"), 1)
+
+    def test_set_evicts_expired(self):
+        self.cache.set("first", 1)
+        self.now += 60
+        # act
+        self.cache.set("second", 2)
+        # verify
+        self.assertEqual(len(self.cache), 1)
+
+    def test_pop(self):
+        self.cache.set("key", "value")
+        # act
+        result = self.cache.pop("key")
+        # verify
+        self.assertEqual(result, "value")
+        self.assertEqual(len(self.cache), 0)
+        self.assertIsNone(self.cache.pop("key"))
+
+    def test_default_limits(self):
+        cache = TTLCache()
+        # verify
+        self.assertEqual(cache._ttl, TTLCache.DEFAULT_TTL)
+        self.assertEqual(cache._max_size, TTLCache.DEFAULT_MAX_SIZE)